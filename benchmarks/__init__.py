@@ -0,0 +1,3 @@
+"""
+Benchmarks de RadComp: motor de cálculo y latencia de rerun de la página.
+"""
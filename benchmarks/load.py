@@ -0,0 +1,212 @@
+"""
+Prueba de carga de main.py: N sesiones headless concurrentes (AppTest, una por hilo, como
+las sesiones de un servidor Streamlit) recorren guiones de interacción realistas: cambio de
+modo, de órgano, activación de LQL con dosis altas por fracción, intervalo de re-irradiación
+y dosis del esquema nuevo.
+
+Informa la latencia de rerun (p50 / p99), el throughput (reruns por segundo en total) y la
+memoria residente por sesión ((RSS con todas las sesiones vivas − RSS de referencia) / N).
+Con presupuestos (--max-p99, --max-session-mb, ...) termina con código 1 si se superan.
+
+Uso:
+    python -m benchmarks load --sessions 8 --steps 20
+    python -m benchmarks load --sessions 16 --max-p99 2.0 --max-session-mb 40 -o load.json
+"""
+import gc
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+from benchmarks.suite import ROOT
+
+MODES = ("Standard Comparison", "Re-irradiation", "Plan Table")
+ACTIONS = ("mode", "organ", "lql", "interval", "dose")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def resident_memory():
+    """
+    Memoria residente actual del proceso en bytes (Linux: /proc; si no, el pico de getrusage).
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _new_session(timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(ROOT / "main.py"), default_timeout=timeout)
+    at.secrets["GOOGLE_ANALYTICS_ID"] = ""
+    return at
+
+
+def _widget(elements, label):
+    return next((w for w in elements if w.label.startswith(label)), None)
+
+
+class Session:
+    """
+    Una sesión de usuario con su guion de interacción (reproducible por semilla).
+    """
+
+    def __init__(self, index: int, organs, timeout: float, seed: int = 0):
+        self.index = index
+        self.organs = organs
+        self.rng = random.Random(seed * 10_007 + index)
+        self.at = _new_session(timeout)
+        self.latencies = []
+        self.errors = []
+
+    def _run(self):
+        started = time.perf_counter()
+        self.at.run()
+        self.latencies.append(time.perf_counter() - started)
+        if self.at.exception:
+            self.errors.append(self.at.exception[0].message)
+
+    def _mode(self, mode):
+        radio = _widget(self.at.sidebar.radio, "Calculation Mode")
+        if radio.value != mode:
+            radio.set_value(mode)
+            self._run()
+
+    def start(self):
+        self._run()
+
+    def step(self, action: str):
+        at, rng = self.at, self.rng
+        if action == "mode":
+            _widget(at.sidebar.radio, "Calculation Mode").set_value(rng.choice(MODES))
+        elif action == "organ":
+            _widget(at.sidebar.selectbox, "Select Organ").set_value(rng.choice(self.organs))
+        elif action == "lql":
+            # Dosis alta por fracción para que aparezca la casilla LQL y se active/desactive
+            self._mode(rng.choice(MODES[:2]))
+            at.number_input(key="frac_a").set_value(rng.choice((1, 3, 5)))
+            at.number_input(key="dose_a").set_value(rng.uniform(20.0, 60.0))
+            self._run()
+            checkbox = next((c for c in at.checkbox if c.key == "lql_a"), None)
+            if checkbox is None:
+                return
+            checkbox.set_value(not checkbox.value)
+        elif action == "interval":
+            self._mode("Re-irradiation")
+            recovery = _widget(at.sidebar.radio, "Biological Recovery")
+            if not recovery.value.startswith("Partial"):
+                recovery.set_value("Partial recovery (time-based model)")
+                self._run()
+            _widget(at.sidebar.slider, "Time interval").set_value(rng.randint(0, 60))
+        else:
+            self._mode(rng.choice(MODES[:2]))
+            at.number_input(key="dose_b").set_value(rng.choice((20.0, 25.0, 30.0, 35.0, 40.0)))
+        self._run()
+
+    def script(self, steps: int):
+        offset = self.rng.randrange(len(ACTIONS))
+        for i in range(steps):
+            self.step(ACTIONS[(offset + i) % len(ACTIONS)])
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run_load(sessions: int = 8, steps: int = 20, timeout: float = 120.0, seed: int = 0):
+    """
+    Ejecuta la prueba de carga y devuelve el dict de resultados.
+    """
+    sys.path.insert(0, str(ROOT))
+    from radcomp.engine import clinical_data
+
+    organs = list(clinical_data)
+    # Calentamiento: imports, base de restricciones y cachés de proceso fuera de la medida
+    warmup = Session(-1, organs, timeout, seed)
+    warmup.start()
+    warmup.script(len(ACTIONS))
+    del warmup
+    gc.collect()
+    baseline_rss = resident_memory()
+
+    users = [Session(i, organs, timeout, seed) for i in range(sessions)]
+    barrier = threading.Barrier(sessions)
+    failures = []
+
+    def drive(session):
+        try:
+            barrier.wait()
+            session.start()
+            session.script(steps)
+        except Exception as exc:  # El hilo no debe morir en silencio
+            failures.append(f"session {session.index}: {type(exc).__name__}: {exc}")
+
+    threads = [threading.Thread(target=drive, args=(s,), name=f"load-{s.index}") for s in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Todas las sesiones siguen vivas (estado, historia, editores): memoria por sesión
+    gc.collect()
+    session_bytes = max(resident_memory() - baseline_rss, 0) / sessions
+    latencies = [t for s in users for t in s.latencies]
+    errors = failures + [f"session {s.index}: {e}" for s in users for e in s.errors]
+    return {
+        "sessions": sessions,
+        "steps": steps,
+        "reruns": len(latencies),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_p50_s": _percentile(latencies, 50),
+        "latency_p99_s": _percentile(latencies, 99),
+        "latency_max_s": max(latencies, default=float("nan")),
+        "latency_mean_s": statistics.fmean(latencies) if latencies else float("nan"),
+        "baseline_rss_mb": baseline_rss / 2**20,
+        "session_rss_mb": session_bytes / 2**20,
+        "errors": errors,
+    }
+
+
+def check_budgets(result: dict, max_p50=None, max_p99=None, max_session_mb=None, min_throughput=None):
+    """
+    Presupuestos superados, como lista de mensajes (vacía = todo dentro).
+    """
+    violations = []
+    for value, budget, text in (
+        (result["latency_p50_s"], max_p50, "p50 rerun latency {:.3f} s > {:.3f} s"),
+        (result["latency_p99_s"], max_p99, "p99 rerun latency {:.3f} s > {:.3f} s"),
+        (result["session_rss_mb"], max_session_mb, "memory per session {:.1f} MB > {:.1f} MB"),
+    ):
+        if budget is not None and value > budget:
+            violations.append(text.format(value, budget))
+    if min_throughput is not None and result["throughput_rps"] < min_throughput:
+        violations.append(f"throughput {result['throughput_rps']:.2f} reruns/s < {min_throughput:.2f}")
+    if result["errors"]:
+        violations.append(f"{len(result['errors'])} session errors (first: {result['errors'][0]})")
+    return violations
+
+
+def print_report(result: dict, violations):
+    print(
+        f"sessions {result['sessions']:d} · reruns {result['reruns']:d} in {result['elapsed_s']:.1f} s "
+        f"({result['throughput_rps']:.2f} reruns/s)\n"
+        f"rerun latency p50 {result['latency_p50_s'] * 1e3:.0f} ms · p99 {result['latency_p99_s'] * 1e3:.0f} ms · "
+        f"max {result['latency_max_s'] * 1e3:.0f} ms\n"
+        f"resident memory {result['baseline_rss_mb']:.0f} MB baseline + {result['session_rss_mb']:.1f} MB per session",
+        file=sys.stderr,
+    )
+    for violation in violations:
+        print(f"BUDGET EXCEEDED: {violation}", file=sys.stderr)
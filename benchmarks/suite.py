@@ -0,0 +1,308 @@
+"""
+Suite de benchmarks del motor de cálculo y de la latencia de rerun de main.py.
+
+Uso:
+    python -m benchmarks run [--output results.json] [--only batch] [--repeat 7]
+    python -m benchmarks compare benchmarks/baseline.json results.json [--threshold 0.2]
+    python -m benchmarks run --compare            # contra benchmarks/baseline.json
+    python -m benchmarks load --sessions 8        # sesiones concurrentes (benchmarks.load)
+
+Cada benchmark devuelve el tiempo por operación (mediana y mínimo de varias repeticiones).
+La comparación usa el mínimo (menos sensible al ruido de la máquina) y marca como regresión
+todo benchmark que supere al baseline en más de `threshold` (fracción, 0.2 = +20 %);
+en ese caso termina con código 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, ops: int = 1):
+    """
+    Registra un benchmark. La función recibe `ops` y devuelve un callable sin argumentos
+    que ejecuta `ops` operaciones (la preparación queda fuera de la medida).
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops)
+        return setup
+    return register
+
+
+# -------------------------------------------------------------------------
+# Motor escalar y vectorizado
+# -------------------------------------------------------------------------
+@benchmark("scalar_lq", ops=100_000)
+def _scalar_lq(ops):
+    from radcomp.engine import biology_calculation
+
+    def run():
+        for i in range(ops):
+            biology_calculation(45.0 + (i & 7), 25, 3.0, False)
+    return run
+
+
+@benchmark("scalar_lql", ops=100_000)
+def _scalar_lql(ops):
+    from radcomp.engine import biology_calculation
+
+    def run():
+        for i in range(ops):
+            biology_calculation(54.0 + (i & 7), 3, 3.0, True)
+    return run
+
+
+def _batch_inputs(ops, lql):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    return (
+        rng.uniform(0, 80, ops),
+        rng.integers(1, 40, ops).astype(np.float64),
+        rng.uniform(0.5, 20, ops),
+        rng.random(ops) < 0.5 if lql else False,
+    )
+
+
+@benchmark("batch_lq", ops=1_000_000)
+def _batch_lq(ops):
+    from radcomp.vectorized import biology_calculation_batch
+
+    args = _batch_inputs(ops, lql=False)
+    return lambda: biology_calculation_batch(*args)
+
+
+@benchmark("batch_lql_mixed", ops=1_000_000)
+def _batch_lql(ops):
+    from radcomp.vectorized import biology_calculation_batch
+
+    args = _batch_inputs(ops, lql=True)
+    return lambda: biology_calculation_batch(*args)
+
+
+# -------------------------------------------------------------------------
+# Re-irradiación
+# -------------------------------------------------------------------------
+@benchmark("reirr_cumulative_bed", ops=100_000)
+def _reirr_cumulative(ops):
+    from radcomp.engine import biology_calculation, cumulative_bed, eqd2_from_bed, recovery_factor
+
+    def run():
+        for i in range(ops):
+            bed_a = biology_calculation(45.0, 25, 2.0)[0]
+            bed_b = biology_calculation(30.0, 10, 2.0)[0]
+            _, bed = cumulative_bed(bed_a, bed_b, recovery_factor(i % 30), "Partial", "rt1_only")
+            eqd2_from_bed(bed, 2.0)
+    return run
+
+
+def _courses(n):
+    return [
+        {"total_dose": 30.0 + k, "fractions": 10, "interval_months": 9, "overlap": "Partial"}
+        for k in range(n)
+    ]
+
+
+@benchmark("reirr_history_full_20", ops=1_000)
+def _history_full(ops):
+    from radcomp.courses import CourseHistory
+
+    courses = _courses(20)
+
+    def run():
+        for _ in range(ops):
+            history = CourseHistory(2.0)
+            history.sync(courses)
+            history.contributions()
+    return run
+
+
+@benchmark("reirr_history_edit_last_20", ops=1_000)
+def _history_edit(ops):
+    from radcomp.courses import CourseHistory
+
+    history = CourseHistory(2.0)
+    history.sync(_courses(20))
+    history.total_bed
+
+    def run():
+        for i in range(ops):
+            history.update(19, total_dose=20.0 + (i & 1))
+            history.contributions()
+    return run
+
+
+# -------------------------------------------------------------------------
+# Rerun completo de la página (AppTest, sin navegador)
+# -------------------------------------------------------------------------
+def _app(mode):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(ROOT / "main.py"), default_timeout=60)
+    at.secrets["GOOGLE_ANALYTICS_ID"] = ""
+    at.run()
+    if mode != "Standard Comparison":
+        at.sidebar.radio[0].set_value(mode).run()
+    return at
+
+
+def _rerun(mode, ops):
+    at = _app(mode)
+    state = {"i": 0}
+
+    def run():
+        for _ in range(ops):
+            state["i"] += 1
+            at.number_input(key="dose_b").set_value(30.0 + (state["i"] & 3))
+            at.run()
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+    return run
+
+
+@benchmark("page_rerun_standard", ops=5)
+def _page_standard(ops):
+    return _rerun("Standard Comparison", ops)
+
+
+@benchmark("page_rerun_reirradiation", ops=5)
+def _page_reirr(ops):
+    return _rerun("Re-irradiation", ops)
+
+
+# -------------------------------------------------------------------------
+# Ejecución y comparación
+# -------------------------------------------------------------------------
+def run_benchmarks(only=None, repeat: int = 7):
+    """
+    Ejecuta los benchmarks (filtrados por subcadena) y devuelve el dict de resultados.
+    """
+    results = {}
+    for name, (setup, ops) in BENCHMARKS.items():
+        if only and not any(o in name for o in only):
+            continue
+        run = setup(ops)
+        run()  # Calentamiento (imports, cachés, JIT de numpy)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - start) / ops)
+        results[name] = {
+            "ops": ops,
+            "repeat": repeat,
+            "median_s": statistics.median(times),
+            "min_s": min(times),
+        }
+        print(f"{name:32s} {results[name]['median_s'] * 1e6:12.3f} µs/op", file=sys.stderr)
+
+    import numpy as np
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2):
+    """
+    Compara dos ejecuciones. Devuelve una lista de filas
+    (name, baseline_s, current_s, ratio, regression).
+    """
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = cur["min_s"] / base["min_s"]
+        rows.append((name, base["min_s"], cur["min_s"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def _print_comparison(rows, threshold):
+    print(f"{'benchmark':32s} {'baseline µs':>14s} {'current µs':>14s} {'ratio':>8s}")
+    for name, base, cur, ratio, regression in rows:
+        flag = f"  REGRESSION (> +{threshold:.0%})" if regression else ""
+        print(f"{name:32s} {base * 1e6:14.3f} {cur * 1e6:14.3f} {ratio:8.2f}{flag}")
+    return any(row[4] for row in rows)
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks", description="RadComp benchmark suite.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="Run the benchmarks and write JSON results")
+    run_parser.add_argument("--output", "-o", help="JSON output file (default: stdout)")
+    run_parser.add_argument("--only", action="append", help="Only benchmarks containing this text (repeatable)")
+    run_parser.add_argument("--repeat", type=int, default=7, help="Timed repetitions per benchmark")
+    run_parser.add_argument("--compare", metavar="BASELINE", nargs="?", const=str(DEFAULT_BASELINE),
+                            help="Compare against a baseline after running (default: benchmarks/baseline.json)")
+    run_parser.add_argument("--threshold", type=float, default=0.2, help="Regression threshold (0.2 = +20%%)")
+
+    cmp_parser = sub.add_parser("compare", help="Compare two JSON result files")
+    cmp_parser.add_argument("baseline", help="Baseline JSON")
+    cmp_parser.add_argument("current", help="Current JSON")
+    cmp_parser.add_argument("--threshold", type=float, default=0.2, help="Regression threshold (0.2 = +20%%)")
+
+    load_parser = sub.add_parser("load", help="Drive concurrent headless sessions and check latency/memory budgets")
+    load_parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions")
+    load_parser.add_argument("--steps", type=int, default=20, help="Interactions per session")
+    load_parser.add_argument("--seed", type=int, default=0, help="Seed of the interaction scripts")
+    load_parser.add_argument("--timeout", type=float, default=120.0, help="Timeout of a single rerun (s)")
+    load_parser.add_argument("--output", "-o", help="JSON output file (default: stdout)")
+    load_parser.add_argument("--max-p50", type=float, help="Budget for the p50 rerun latency (s)")
+    load_parser.add_argument("--max-p99", type=float, help="Budget for the p99 rerun latency (s)")
+    load_parser.add_argument("--max-session-mb", type=float, help="Budget for the resident memory per session (MB)")
+    load_parser.add_argument("--min-throughput", type=float, help="Minimum total reruns per second")
+
+    args = parser.parse_args(argv)
+    sys.path.insert(0, str(ROOT))
+
+    if args.command == "load":
+        from benchmarks.load import check_budgets, print_report, run_load
+
+        if args.sessions < 1 or args.steps < 0:
+            parser.exit(2, "benchmarks: error: --sessions must be ≥ 1 and --steps ≥ 0\n")
+        result = run_load(args.sessions, args.steps, args.timeout, args.seed)
+        violations = check_budgets(result, args.max_p50, args.max_p99, args.max_session_mb, args.min_throughput)
+        print_report(result, violations)
+        text = json.dumps(result | {"violations": violations}, indent=2)
+        if args.output:
+            Path(args.output).write_text(text + "\n", encoding="utf-8")
+        else:
+            print(text)
+        return int(bool(violations))
+
+    if args.command == "run":
+        current = run_benchmarks(args.only, args.repeat)
+        text = json.dumps(current, indent=2)
+        if args.output:
+            Path(args.output).write_text(text + "\n", encoding="utf-8")
+        else:
+            print(text)
+        if args.compare:
+            return int(_print_comparison(compare(_load(args.compare), current, args.threshold), args.threshold))
+        return 0
+
+    rows = compare(_load(args.baseline), _load(args.current), args.threshold)
+    return int(_print_comparison(rows, args.threshold))
@@ -1,6 +1,31 @@
 import streamlit as st
+import pandas as pd
 import plotly.graph_objects as go
 
+from radcomp.engine import (
+    clinical_data,
+    overlap_penalty,
+    eqd2_from_bed,
+    tolerance_verdict,
+)
+from radcomp.constraints import load_database
+from radcomp.courses import CourseHistory
+from radcomp.plan import evaluate_plan
+from radcomp.optimizer import optimize_rt2
+from radcomp.isoeffect import fractionation_table, MAX_FRACTIONS
+from radcomp.grids import eqd2_grid, grid_d_max
+from radcomp.uncertainty import monte_carlo
+from radcomp.recovery import RECOVERY_MODELS, MODEL_LABELS, get_model, recovery_curve
+from radcomp.repair import DEFAULT_HALF_TIME, g_factor, repopulation_bed
+from radcomp.charts import CHART_TEMPLATE, dose_bar_figure, frontier_figure, scenario_figure
+from radcomp.vectorized import biology_calculation_batch
+from radcomp.models import BED_MODELS, compare_models, usc_alpha_beta
+from radcomp.ntcp import outcome_model, uniform_outcomes
+from radcomp.cache import get_cache, normalize, shared_cache
+from radcomp import metrics
+
+# Medición del rerun completo (sin coste si RADCOMP_METRICS no está activo)
+rerun_started = metrics.start()
 
 # 1. Page Configuration (Metadata for SEO)
 st.set_page_config(
@@ -29,206 +54,13 @@ if ga_id:
         unsafe_allow_html=True
     )
 
+if metrics.ENABLED and "metrics_session" not in st.session_state:
+    st.session_state.metrics_session = True
+    metrics.count("sessions")
+
 st.title("RadComp")
 st.info("A clinical tool for BED , EQD2  and Reirradiation calculations based on QUANTEC and international standards")
 
-# 2. International Clinical Database (QUANTEC & Global References)
-# ===============================================================
-# Valores para variable limit type
-# ===================================================================
-# "Dmax"          → dosis máxima puntual
-# "Dmean"         → dosis media
-# "Vx"            → volumen que recibe ≥ x Gy
-# "Surrogate"     → aproximación BED/EQD2 de una métrica no BED
-# "None"          → no aplica (α/β only)
-# ====================================================================
-
-clinical_data = {
-
-    # =========================
-    # Generic (α/β only)
-    # =========================
-    "OARs (General)": {
-        "ab": 3.0,
-        "source": "Radiobiology convention",
-        "limit": None,
-        "limit_type": "None"
-    },
-    "Tumor (General)": {
-        "ab": 10.0,
-        "source": "Radiobiology convention",
-        "limit": None,
-        "limit_type": "None"
-    },
-
-    # =========================
-    # Central Nervous System
-    # =========================
-    "Spinal Cord": {
-        "ab": 2.0,
-        "source": "QUANTEC 2010",
-        "limit": 52.0,
-        "limit_type": "Dmax"
-    },
-    "Brainstem": {
-        "ab": 2.1,
-        "source": "QUANTEC 2010",
-        "limit": 54.0,
-        "limit_type": "Dmax"
-    },
-    "Brain (Healthy Tissue)": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 60.0,
-        "limit_type": "Surrogate"
-    },
-
-    # =========================
-    # Thorax
-    # =========================
-    "Heart": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 26,
-        "limit_type": "Dmean"
-    },
-    "Lung (Healthy Tissue)": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 20.0,
-        "limit_type": "V20"  # "note": "Surrogate EQD2 approximation"
-    },
-
-    # =========================
-    # Abdomen / Pelvis
-    # =========================
-    "Liver": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 30.0,
-        "limit_type": "Dmean"
-    },
-    "Kidney": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 18.0,
-        "limit_type": "Dmean"
-    },
-    "Small Bowel": {
-        "ab": 10.0,
-        "source": " QUANTEC",
-        "limit": 54.0,
-        "limit_type": "Dmax"
-    },
-    "Esophagus": {
-        "ab": 10.0,
-        "source": "Emami / QUANTEC",
-        "limit": 34.0,
-        "limit_type": "Dmean"
-    },
-    "Rectum": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010 ",
-        "limit": 79.0,
-        "limit_type": "Dmax"
-    },
-    "Bladder": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 79.0,
-        "limit_type": "Dmax"
-    },
-
-    # =========================
-    # Salivary glands
-    # =========================
-    "Parotid Glands": {
-        "ab": 3.0,
-        "source": "QUANTEC 2010",
-        "limit": 25.0,
-        "limit_type": "Dmean"
-    },
-
-    # =========================
-    # Tumors (α/β only)
-    # =========================
-    "Prostate (Tumor)": {
-        "ab": 1.5,
-        "source": "Fowler et al.",
-        "limit": None,
-        "limit_type": "None"
-    },
-    "Breast (Tumor)": {
-        "ab": 4.0,
-        "source": "START Trials",
-        "limit": None,
-        "limit_type": "None"
-    },
-    "Lung (NSCLC)": {
-        "ab": 10.0,
-        "source": "Radiobiology convention",
-        "limit": None,
-        "limit_type": "None"
-    },
-}
-
-# variable de penalizacion para tener en cuenta la superposicion de zonas de dosis
-overlap_penalty = {
-    "None": 0.0,
-    "Partial": 0.15,
-    "High": 0.30
-}
-
-
-# -------------------------------------------------------------------------
-# Helper functions
-# -------------------------------------------------------------------------
-def biology_calculation(total_dose: float, fractions: int, ab: float, use_lql: bool = False):
-    """
-    Calcula BED y EQD2 con validación de seguridad.
-    Soporta corrección LQL (Astrahan 2008) para dosis altas si use_lql=True.
-    """
-    if fractions <= 0 or ab <= 0:
-        return 0.0, 0.0, 0.0
-
-    d = total_dose / fractions  # Dosis por fracción
-
-    # --- MODELO LQL (Linear-Quadratic-Linear) ---
-    # Astrahan (2008): El umbral de transición (dT) es 2 * (alpha/beta)
-    dt = 2 * ab
-
-    if use_lql and d > dt:
-        # Corrección para altas dosis (SBRT/SRS)
-        # Parte A: Contribución hasta el umbral (Curva LQ)
-        term_hq = dt * (1 + (dt / ab))
-
-        # Parte B: Contribución lineal más allá del umbral
-        term_lin = (d - dt) * (1 + ((2 * dt) / ab))
-
-        # BED por fracción sumando ambas partes
-        bed_per_frac = term_hq + term_lin
-        bed = bed_per_frac * fractions
-    else:
-        # --- MODELO LQ ESTÁNDAR (Clásico) ---
-        bed = total_dose * (1 + (d / ab))
-
-    # Cálculo de EQD2 (Normalizado a 2Gy por fracción)
-    # Se usa la fórmula estándar derivada del BED calculado
-    eqd2 = bed / (1 + (2 / ab))
-
-    return bed, eqd2, d
-
-
-def recovery_factor(months):
-    if months < 6:
-        return 0.0
-    elif months < 12:
-        return 0.25
-    elif months < 24:
-        return 0.50
-    else:
-        return 0.65
-
 
 # -------------------------------------------------------------------------
 # Sidebar
@@ -236,11 +68,12 @@ def recovery_factor(months):
 
 # 3. Sidebar: Biological Configuration and Robustness Logic
 # ===============================================================================
+sidebar_started = metrics.start()
 with st.sidebar:
     st.header("⚙️ Calculation Settings")
     mode = st.radio(
         "Calculation Mode",
-        ["Standard Comparison", "Re-irradiation"],
+        ["Standard Comparison", "Re-irradiation", "Plan Table"],
         index=0
     )
     selection = st.selectbox(
@@ -273,6 +106,31 @@ with st.sidebar:
         st.info("The standard reference source no longer applies due to manual override.")
 
     st.caption(f"Suggested Dose Limit: {limit_ref} Gy {limit_type_ref} ")
+
+    # Todas las restricciones del órgano (base versionada, cargada una vez por proceso)
+    constraint_db = load_database()
+    organ_constraints = constraint_db.organs[selection]["constraints"]
+    if organ_constraints:
+        with st.expander(f"📋 All constraints ({len(organ_constraints)})"):
+            st.dataframe(
+                pd.DataFrame({
+                    "Regime": ["EQD2" if c["fractions"] is None else f"{c['fractions']} fx" for c in organ_constraints],
+                    "Metric": [c["limit_type"] for c in organ_constraints],
+                    "Limit (Gy)": [c["limit"] for c in organ_constraints],
+                    "Volume": [
+                        f"≤ {c['volume_limit']:g} {c['volume_unit']}" if "volume_limit" in c else ""
+                        for c in organ_constraints
+                    ],
+                    "Endpoint": [c.get("endpoint", "") for c in organ_constraints],
+                    "Source": [c.get("source", "") for c in organ_constraints],
+                }),
+                hide_index=True,
+            )
+            st.caption(
+                "EQD2 limits apply to any fractionation after conversion; limits with a number of "
+                f"fractions are physical-dose limits for that regime. Database: {constraint_db.name} "
+                f"v{constraint_db.version}."
+            )
     ab = ab_user
 
     if mode == "Re-irradiation":
@@ -286,16 +144,26 @@ with st.sidebar:
                 "Partial recovery (time-based model)"
             ]
         )
+        recovery_model = st.selectbox(
+            "Recovery model",
+            list(RECOVERY_MODELS),
+            format_func=lambda name: MODEL_LABELS[name],
+            disabled=(recovery_mode == "No recovery (full BED summation)"),
+            help="Step: published 0/25/50/65 % levels. Piecewise-linear: continuous curve through the "
+                 "same levels. Exponential: smooth curve (T½ = 6 months) saturating at 65 %; it does not "
+                 "pass through the published levels (32.5 % at 6 months vs 25 %)."
+        )
         interval_months = st.slider(
             "Time interval between RT1 and RT2 (months)",
-            0, 24, 12, disabled=(recovery_mode == "No recovery (full BED summation)")
+            0, 60, 12, disabled=(recovery_mode == "No recovery (full BED summation)")
         )
-        st.caption("For intervals longer than 24 months, select the maximum value " "(model saturation assumption).")
+        st.caption("All recovery models saturate at 65 % (the step model from 24 months on).")
 
         overlap = st.selectbox(
             "Overlap with previous high-dose region",
             ["None", "Partial", "High"]
         )
+        overlap_application = "cumulative"
         if overlap != "None":
             overlap_application = st.radio(
                 "How should the overlap penalty be applied?",
@@ -357,258 +225,1010 @@ with st.sidebar:
         "Overlap adjustments are model-based assumptions and do not replace "
         "volumetric dose evaluation or clinical judgment."
          )
-# ----------------------------------------------------------------------------------------------------------------
-# 4. Main Layout: Comparative View
-# -------------------------------------------------------------------------------------------------------------------
-col1, col2 = st.columns(2)
-# ------------------- Schedule A / RT1 -------------------
-with (col1):
-    title_a = "Schedule A (Reference)"
-    if mode == "Re-irradiation":
-        title_a = "Previous Radiation Course (RT1)"
+metrics.stop("sidebar", sidebar_started)
 
-    st.subheader(title_a)
 
-    total_dose_a = st.number_input("Total Dose A (Gy)", min_value=0.0, value=45.0, key="dose_a")
-    fractions_a = st.number_input("Number of Fractions A", min_value=1, value=25, key="frac_a")
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_monte_carlo(courses, ab, limit, recovery, overlap_application, distributions, n_samples, seed,
+                       recovery_model="step"):
+    # Resultado reproducible (semilla fija): se reutiliza mientras no cambien las entradas
+    return monte_carlo(courses, ab, limit, recovery, overlap_application, distributions, n_samples, seed,
+                       recovery_model=recovery_model)
 
-    # --- LOGICA DUAL DE UMBRAL INTELIGENTE ---
-    d_check_a = total_dose_a / fractions_a if fractions_a > 0 else 0
-    astrahan_threshold = 2 * ab  # Umbral dinámico dT
-    use_lql_a = False
 
-    if d_check_a > astrahan_threshold:
+# Resultados compartidos entre sesiones (LRU + TTL, radcomp.cache): los esquemas estándar
+# que evalúan muchos usuarios se calculan y se dibujan una sola vez por proceso
+@shared_cache("schedule")
+def schedule_biology(total_dose, fractions, ab, model="lq", params=None, g=1.0, repopulation=0.0):
+    # BED, EQD2 y dosis por fracción de un esquema (modelo del registro), con las correcciones temporales
+    bed, eqd2, dose_per_fraction = (
+        float(v) for v in biology_calculation_batch(total_dose, fractions, ab, g=g, model=model, params=params)
+    )
+    if repopulation:
+        bed = max(bed - repopulation, 0.0)
+        eqd2 = eqd2_from_bed(bed, ab)
+    return bed, eqd2, dose_per_fraction
+
+
+cached_dose_bar_figure = shared_cache("dose_chart", maxsize=256)(dose_bar_figure)
+reirradiation_cache = get_cache("reirradiation")
+
+
+SCENARIO_COLUMNS = pd.DataFrame({
+    "Scenario": pd.Series(dtype="str"),
+    "Total Dose (Gy)": pd.Series(dtype="float"),
+    "Fractions": pd.Series(dtype="int"),
+    "LQL": pd.Series(dtype="bool"),
+})
+
+
+def save_scenarios(scenarios):
+    # Nueva base del editor (solo al añadir o vaciar): se cambia su clave para descartar las
+    # ediciones ya incluidas en ella. Las filas editadas no vuelven a `data`: con filas
+    # dinámicas la identidad del editor depende de sus datos y se volvería a montar.
+    st.session_state["scenarios"] = scenarios
+    st.session_state["scenario_rows"] = scenarios
+    st.session_state["scenario_version"] = st.session_state.get("scenario_version", 0) + 1
+
+
+def scenario_labels(scenarios):
+    # Etiquetas únicas (el eje es categórico): se numeran las vacías y las repetidas
+    labels, seen = [], {}
+    for i, (label, dose, fractions) in enumerate(
+        zip(scenarios["Scenario"], scenarios["Total Dose (Gy)"], scenarios["Fractions"]), start=1
+    ):
+        label = label.strip() if isinstance(label, str) and label.strip() else f"#{i}: {dose:g} Gy / {fractions:g} fx"
+        seen[label] = seen.get(label, 0) + 1
+        labels.append(label if seen[label] == 1 else f"{label} ({seen[label]})")
+    return labels
+
+
+def model_inputs(schedule, use_lql):
+    # Modelo de dosis altas del esquema (registro radcomp.models) y sus parámetros.
+    # Sin la corrección activada el esquema usa LQ; devuelve (modelo, parámetros).
+    if not use_lql:
+        return "lq", {}
+    key = schedule.lower()
+    model = st.selectbox(
+        f"High-dose model {schedule}", [name for name in BED_MODELS if name != "lq"],
+        format_func=lambda name: BED_MODELS[name].label, key=f"model_{key}",
+    )
+    params = {}
+    for name, (default, unit, description) in BED_MODELS[model].params.items():
+        value = st.number_input(
+            f"{description} ({unit})", value=default, min_value=0.0, key=f"{model}_{name}_{key}",
+        )
+        if value is not None:
+            params[name] = value
+    if model == "usc":
+        usc_ab = usc_alpha_beta(
+            **{name: params.get(name, default) for name, (default, _, _) in BED_MODELS["usc"].params.items()}
+        )
         st.caption(
-            f"⚠️ High Dose/Fx: Exceeds LQ validity for **{selection}**. "
-            f"Consider enabling the LQL correction for improved accuracy."
+            f"USC uses its own α/β = {usc_ab:.2f} Gy (from α, D0 and Dq, continuous at the transition dose) "
+            "for its LQ part and for EQD2; the organ's α/β is not used."
         )
-        use_lql_a = st.checkbox(
-            "Enable LQL Correction (Astrahan 2008)",
-            value=False,
-            key="lql_a",
-            help=f"Standard LQ overestimates cell kill when dose per fraction > {astrahan_threshold:.1f} Gy for ***{selection}***."
-
+    return model, params
+
+
+def delivery_time_inputs(schedule, selection):
+    # Entradas opcionales de tiempo de entrega y repoblación de un esquema.
+    # Devuelve (factor G, BED perdido por repoblación); (1.0, 0.0) = entrega instantánea sin repoblación.
+    tissue = clinical_data[selection]
+    repopulation = tissue.get("repopulation")
+    key = schedule.lower()
+    with st.expander("⏱️ Delivery time & repopulation"):
+        beam_on_time = st.number_input(
+            f"Beam-on time per fraction {schedule} (min)", min_value=0.0, value=0.0, step=1.0,
+            key=f"beam_on_time_{key}",
+            help="Time over which each fraction is delivered. 0 = instantaneous delivery (standard LQ).",
         )
-
-    bed_a, eqd2_a, dose_per_frac_a = biology_calculation(total_dose_a, fractions_a,ab,use_lql_a)  # asi se pueden guardar los valores de una tupla
-
-    st.metric("Dose per Fraction A", f"{dose_per_frac_a:.2f} Gy")
-    st.metric("BED A", f"{bed_a:.2f} Gy")
-    st.metric("EQD2 A", f"{eqd2_a:.2f} Gy")
-    st.metric("Alpha/Beta Ratio", f"{ab:.2f}")
-    if use_lql_a:
-        st.caption("✅ LQL Model Active")
-        st.warning(
-            "⚠️ **Clinical Caution: Less Conservative Model**\n\n"
-            "You are using the **LQL Model (Astrahan 2008)**, which corrects the overestimation of the standard LQ model.\n"
-            "**Note:** Resulting biological doses (BED/EQD2) are **lower** than standard LQ values. "
-            "Do not escalate physical dose solely based on this reduction without clinical justification."
+        col_segments, col_gap = st.columns(2)
+        segments = col_segments.number_input(
+            f"Segments / arcs {schedule}", min_value=1, value=1, key=f"segments_{key}",
+            help="Number of equal beam-on segments per fraction.",
+        )
+        gap = col_gap.number_input(
+            f"Gap between segments {schedule} (min)", min_value=0.0, value=0.0, key=f"gap_{key}",
         )
-# ------------------- Schedule B / RT2 -------------------
-with col2:
-    title_b = "Schedule B (New)"
+        # La clave incluye el órgano para que el valor por defecto siga al tejido seleccionado
+        half_time = st.number_input(
+            f"Repair half-time {schedule} (h)", min_value=0.05, max_value=24.0,
+            value=float(tissue.get("repair_half_time", DEFAULT_HALF_TIME)), key=f"half_time_{key}_{selection}",
+            help="Mono-exponential repair half-time of the tissue (Lea-Catcheside G factor).",
+        )
+        overall_time = 0.0
+        if repopulation:
+            overall_time = st.number_input(
+                f"Overall treatment time {schedule} (days)", min_value=0.0, value=0.0, key=f"overall_time_{key}",
+                help=f"Repopulation starts after Tk = {repopulation['tk']:g} days "
+                     f"(Tpot = {repopulation['tpot']:g} days, α = {repopulation['alpha']:g} Gy⁻¹).",
+            )
+        else:
+            st.caption(f"No repopulation parameters are defined for {selection}.")
+
+    g = float(g_factor(beam_on_time, half_time, segments, gap)) if beam_on_time > 0 else 1.0
+    loss = float(repopulation_bed(overall_time, **repopulation)) if overall_time > 0 else 0.0
+    if g != 1.0 or loss:
+        st.caption(f"⏱️ G factor = {g:.3f} · Repopulation = −{loss:.2f} Gy BED")
+    return g, loss
+
+
+# ----------------------------------------------------------------------------------------------------------------
+# Calculation panel (fragment)
+# ----------------------------------------------------------------------------------------------------------------
+# Los esquemas, el análisis de re-irradiación y el gráfico dependen de las entradas del panel:
+# al cambiar una de ellas solo se vuelve a ejecutar este fragmento, no toda la página
+# (configuración, Analytics, barra lateral, aviso legal y contacto).
+# Los cambios en la barra lateral sí provocan una ejecución completa.
+@st.fragment
+def calculation_panel(mode, selection, ab, limit_ref, limit_type_ref, reirr_settings=None):
+    panel_started = metrics.start()
     if mode == "Re-irradiation":
-        title_b = "Planned Radiation Course (RT2)"
+        recovery_mode = reirr_settings["recovery_mode"]
+        recovery_model = reirr_settings["recovery_model"]
+        interval_months = reirr_settings["interval_months"]
+        overlap = reirr_settings["overlap"]
+        overlap_application = reirr_settings["overlap_application"]
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # 4. Main Layout: Comparative View
+    # -------------------------------------------------------------------------------------------------------------------
+    col1, col2 = st.columns(2)
+    # ------------------- Schedule A / RT1 -------------------
+    with (col1):
+        title_a = "Schedule A (Reference)"
+        if mode == "Re-irradiation":
+            title_a = "Previous Radiation Course (RT1)"
+
+        st.subheader(title_a)
+
+        total_dose_a = st.number_input("Total Dose A (Gy)", min_value=0.0, value=45.0, key="dose_a")
+        fractions_a = st.number_input("Number of Fractions A", min_value=1, value=25, key="frac_a")
+
+        # --- LOGICA DUAL DE UMBRAL INTELIGENTE ---
+        d_check_a = total_dose_a / fractions_a if fractions_a > 0 else 0
+        astrahan_threshold = 2 * ab  # Umbral dinámico dT
+        use_lql_a = False
+
+        if d_check_a > astrahan_threshold:
+            st.caption(
+                f"⚠️ High Dose/Fx: Exceeds LQ validity for **{selection}**. "
+                f"Consider enabling the LQL correction for improved accuracy."
+            )
+            use_lql_a = st.checkbox(
+                "Enable LQL Correction (Astrahan 2008)",
+                value=False,
+                key="lql_a",
+                help=f"Standard LQ overestimates cell kill when dose per fraction > {astrahan_threshold:.1f} Gy for ***{selection}***."
+
+            )
+
+        model_a, model_params_a = model_inputs("A", use_lql_a)
+        g_a, repopulation_a = delivery_time_inputs("A", selection)
+
+        with metrics.section("biology_calculation"):
+            bed_a, eqd2_a, dose_per_frac_a = schedule_biology(
+                total_dose_a, fractions_a, ab, model_a, model_params_a, g_a, repopulation_a
+            )
+
+        st.metric("Dose per Fraction A", f"{dose_per_frac_a:.2f} Gy")
+        st.metric("BED A", f"{bed_a:.2f} Gy")
+        st.metric("EQD2 A", f"{eqd2_a:.2f} Gy")
+        st.metric("Alpha/Beta Ratio", f"{ab:.2f}")
+        if use_lql_a:
+            st.caption(f"✅ {BED_MODELS[model_a].label} Model Active")
+            st.warning(
+                "⚠️ **Clinical Caution: Less Conservative Model**\n\n"
+                f"You are using the **{BED_MODELS[model_a].label}** model, which corrects the overestimation of the standard LQ model.\n"
+                "**Note:** Resulting biological doses (BED/EQD2) are **lower** than standard LQ values. "
+                "Do not escalate physical dose solely based on this reduction without clinical justification."
+            )
+    # ------------------- Schedule B / RT2 -------------------
+    with col2:
+        title_b = "Schedule B (New)"
+        if mode == "Re-irradiation":
+            title_b = "Planned Radiation Course (RT2)"
+
+        st.subheader(title_b)
+        total_dose_b = st.number_input("Total Dose B (Gy)", min_value=0.0, value=30.0, key="dose_b")
+        fractions_b = st.number_input("Number of Fractions B", min_value=1, value=10, key="frac_b")
+
+        # --- LOGICA DUAL DE UMBRAL INTELIGENTE ---
+        d_check_b = total_dose_b / fractions_b if fractions_b > 0 else 0
+        # astrahan_threshold ya calculado arriba
+        use_lql_b = False
+
+        if d_check_b > astrahan_threshold:
+            st.caption(
+                f"⚠️ High Dose/Fx: Exceeds LQ validity for **{selection}**. "
+                f"Consider enabling the LQL correction for improved accuracy."
+            )
+            use_lql_b = st.checkbox(
+                "Enable LQL Correction (Astrahan 2008)",
+                value=False,
+                key="lql_b",
+                help=f"Standard LQ overestimates cell kill when dose per fraction > {astrahan_threshold:.1f} Gy for ***{selection}***."
+            )
 
-    st.subheader(title_b)
-    total_dose_b = st.number_input("Total Dose B (Gy)", min_value=0.0, value=30.0, key="dose_b")
-    fractions_b = st.number_input("Number of Fractions B", min_value=1, value=10, key="frac_b")
+        model_b, model_params_b = model_inputs("B", use_lql_b)
+        g_b, repopulation_b = delivery_time_inputs("B", selection)
 
-    # --- LOGICA DUAL DE UMBRAL INTELIGENTE ---
-    d_check_b = total_dose_b / fractions_b if fractions_b > 0 else 0
-    # astrahan_threshold ya calculado arriba
-    use_lql_b = False
+        with metrics.section("biology_calculation"):
+            bed_b, eqd2_b, dose_per_frac_b = schedule_biology(
+                total_dose_b, fractions_b, ab, model_b, model_params_b, g_b, repopulation_b
+            )
 
-    if d_check_b > astrahan_threshold:
+        st.metric("Dose per Fraction B", f"{dose_per_frac_b:.2f} Gy")
+        st.metric("BED B", f"{bed_b:.2f} Gy")
+        st.metric("EQD2 B", f"{eqd2_b:.2f} Gy")
+        st.metric("Alpha/Beta Ratio", f"{ab:.2f}")
+        if use_lql_b:
+            st.caption(f"✅ {BED_MODELS[model_b].label} Model Active")
+            st.warning(
+                "⚠️ **Clinical Caution: Less Conservative Model**\n\n"
+                f"You are using the **{BED_MODELS[model_b].label}** model, which corrects the overestimation of the standard LQ model.\n"
+                "**Note:** Resulting biological doses (BED/EQD2) are **lower** than standard LQ values. "
+                "Do not escalate physical dose solely based on this reduction without clinical justification."
+            )
+
+    # --- MODEL COMPARISON ---
+    # Todos los modelos del registro sobre los dos esquemas en una sola llamada vectorizada
+    with st.expander("🧪 Compare dose-response models (LQ, LQL, LQ-L, USC)"):
+        param_names = set(model_params_a) | set(model_params_b)
+        comparison = compare_models(
+            [total_dose_a, total_dose_b], [fractions_a, fractions_b], ab, g=[g_a, g_b],
+            params={
+                name: [model_params_a.get(name, float("nan")), model_params_b.get(name, float("nan"))]
+                for name in param_names
+            },
+        )
+        st.dataframe(
+            pd.DataFrame({
+                "Model": [BED_MODELS[name].label for name in comparison],
+                "EQD2 A (Gy)": [eqd2[0] for _, eqd2 in comparison.values()],
+                "EQD2 B (Gy)": [eqd2[1] for _, eqd2 in comparison.values()],
+                "BED A (Gy)": [bed[0] for bed, _ in comparison.values()],
+                "BED B (Gy)": [bed[1] for bed, _ in comparison.values()],
+            }),
+            hide_index=True,
+            width="stretch",
+            column_config={
+                col: st.column_config.NumberColumn(format="%.2f")
+                for col in ("EQD2 A (Gy)", "EQD2 B (Gy)", "BED A (Gy)", "BED B (Gy)")
+            },
+        )
         st.caption(
-            f"⚠️ High Dose/Fx: Exceeds LQ validity for **{selection}**. "
-            f"Consider enabling the LQL correction for improved accuracy."
+            "Without repopulation. LQ-L uses each schedule's transition dose when set (default 2·α/β) "
+            "and USC the parameters entered above (default: NSCLC, Park 2008)."
         )
-        use_lql_b = st.checkbox(
-            "Enable LQL Correction (Astrahan 2008)",
-            value=False,
-            key="lql_b",
-            help=f"Standard LQ overestimates cell kill when dose per fraction > {astrahan_threshold:.1f} Gy for ***{selection}***."
+
+    # -------------------------------------------------------------------------
+    # Intermediate courses (re-irradiation with more than two courses)
+    # -------------------------------------------------------------------------
+    reirr_started = metrics.start()
+    if mode == "Re-irradiation":
+        with st.expander("➕ Intermediate Radiation Courses (between RT1 and RT2)"):
+            st.caption(
+                "Add the courses delivered between RT1 and the planned course, in chronological order. "
+                "Each interval is measured from the previous course and the overlap refers to the dose "
+                "accumulated so far. The sidebar interval and overlap settings apply to the planned course (RT2)."
+            )
+            intermediate_courses = st.data_editor(
+                pd.DataFrame({
+                    "Total Dose (Gy)": pd.Series(dtype="float"),
+                    "Fractions": pd.Series(dtype="int"),
+                    "LQL": pd.Series(dtype="bool"),
+                    "Interval (months)": pd.Series(dtype="float"),
+                    "Overlap": pd.Series(dtype="str"),
+                }),
+                num_rows="dynamic",
+                key="intermediate_courses",
+                hide_index=True,
+                column_config={
+                    "Total Dose (Gy)": st.column_config.NumberColumn(min_value=0.0, default=30.0),
+                    "Fractions": st.column_config.NumberColumn(min_value=1, step=1, default=10),
+                    "LQL": st.column_config.CheckboxColumn(default=False, help="Enable LQL Correction (Astrahan 2008)"),
+                    "Interval (months)": st.column_config.NumberColumn(
+                        min_value=0.0, default=12.0, help="Time since the previous course"
+                    ),
+                    "Overlap": st.column_config.SelectboxColumn(options=list(overlap_penalty), default="None"),
+                },
+            )
+
+        # Lista ordenada de cursos: RT1, cursos intermedios y RT2 (planificado)
+        courses = [{
+            "total_dose": total_dose_a, "fractions": fractions_a, "use_lql": use_lql_a,
+            "model": model_a, "model_params": model_params_a, "g": g_a, "repopulation": repopulation_a,
+        }]
+        for row in intermediate_courses.dropna(subset=["Total Dose (Gy)", "Fractions"]).to_dict("records"):
+            courses.append({
+                "total_dose": float(row["Total Dose (Gy)"]),
+                "fractions": int(row["Fractions"]),
+                "use_lql": bool(row["LQL"]) if pd.notna(row["LQL"]) else False,
+                "interval_months": float(row["Interval (months)"]) if pd.notna(row["Interval (months)"]) else 0.0,
+                "overlap": row["Overlap"] if row["Overlap"] in overlap_penalty else "None",
+            })
+        courses.append({
+            "total_dose": total_dose_b,
+            "fractions": fractions_b,
+            "use_lql": use_lql_b,
+            "model": model_b,
+            "model_params": model_params_b,
+            "g": g_b,
+            "repopulation": repopulation_b,
+            "interval_months": interval_months,
+            "overlap": overlap,
+        })
+
+        # Acumulado compartido entre sesiones por (cursos, α/β, recuperación, solapamiento). En un fallo
+        # se usa la historia de la sesión: al editar un curso solo se recalcula desde ese curso
+        recovery = recovery_mode != "No recovery (full BED summation)"
+
+        def accumulate():
+            history = st.session_state.setdefault("course_history", CourseHistory(ab))
+            history.set_params(
+                ab=ab, recovery=get_model(recovery_model) if recovery else None, overlap_application=overlap_application,
+            )
+            history.sync(courses)
+            return {
+                "bed": tuple(history.bed),
+                "eqd2": tuple(history.eqd2),
+                "rec": tuple(history.rec),
+                "running_bed": tuple(history.running_bed()),
+                "total_bed": history.total_bed,
+                "contributions": tuple(history.contributions()),
+            }
+
+        accumulation = reirradiation_cache.get_or_set(
+            normalize((courses, ab, recovery_model if recovery else None, overlap_application)), accumulate
         )
 
-    bed_b, eqd2_b, dose_per_frac_b = biology_calculation(total_dose_b, fractions_b, ab,use_lql_b)
-
-    st.metric("Dose per Fraction B", f"{dose_per_frac_b:.2f} Gy")
-    st.metric("BED B", f"{bed_b:.2f} Gy")
-    st.metric("EQD2 B", f"{eqd2_b:.2f} Gy")
-    st.metric("Alpha/Beta Ratio", f"{ab:.2f}")
-    if use_lql_b:
-        st.caption("✅ LQL Model Active")
-        st.warning(
-            "⚠️ **Clinical Caution: Less Conservative Model**\n\n"
-            "You are using the **LQL Model (Astrahan 2008)**, which corrects the overestimation of the standard LQ model.\n"
-            "**Note:** Resulting biological doses (BED/EQD2) are **lower** than standard LQ values. "
-            "Do not escalate physical dose solely based on this reduction without clinical justification."
+    # -------------------------------------------------------------------------
+    # Re-irradiation Analysis
+    # -------------------------------------------------------------------------
+    if mode == "Re-irradiation":
+
+        st.divider()
+        st.subheader("🔁 Cumulative Biological Dose Assessment")
+
+        if recovery_mode == "No recovery (full BED summation)":
+            rec = 0.0
+            st.warning(
+                """
+                **Conservative assumption applied**
+
+                - No biological recovery from previous irradiation is assumed.
+                - 100% of the BED from RT1 is carried forward.
+
+                This conservative approach is commonly used for critical organs
+                and risk-averse clinical decision-making.
+                """
+            )
+        else:
+            rec = get_model(recovery_model)(interval_months)
+
+            # Las dos siguientes lineas de codigo solo se usan para mostrar los porcentajes en la info
+            recovery_percentage = round(rec * 100)
+            remaining_percentage = 100 - recovery_percentage
+
+            st.info(
+                f"""
+                       **Biological recovery model active**
+
+                       - Recovery model: **{MODEL_LABELS[recovery_model]}**
+                       - Time interval between treatments: **{interval_months} months**
+                       - Assumed biological recovery from RT1: **{recovery_percentage}%**
+                       - Remaining biological effect from RT1: **{remaining_percentage}%**
+
+                       The BED contribution from the previous irradiation course is
+                       reduced according to this recovery assumption before being
+                       combined with the new treatment.
+                       """
+            )
+
+            with st.expander("📈 Recovery curve"):
+                recovery_fig = go.Figure()
+                for name in RECOVERY_MODELS:
+                    curve_months, curve_recovery = recovery_curve(name)
+                    recovery_fig.add_trace(go.Scatter(
+                        x=curve_months,
+                        y=curve_recovery * 100,
+                        mode="lines",
+                        name=MODEL_LABELS[name],
+                        line=dict(width=3 if name == recovery_model else 1.5),
+                        opacity=1.0 if name == recovery_model else 0.45,
+                        hovertemplate="%{x:.1f} months<br>%{y:.1f} %<extra></extra>",
+                    ))
+                recovery_fig.add_trace(go.Scatter(
+                    x=[interval_months],
+                    y=[rec * 100],
+                    mode="markers",
+                    marker=dict(size=11, color="#d62728"),
+                    name="Current interval",
+                ))
+                recovery_fig.update_layout(
+                    xaxis_title="Interval between courses (months)",
+                    yaxis_title="Recovered BED from previous courses (%)",
+                    height=350,
+                    margin=dict(t=20, b=40),
+                )
+                st.plotly_chart(recovery_fig, width="stretch")
+        # Recuperación por intervalo y penalización por solapamiento (solo si ambas dosis son > 0)
+        # se aplican curso a curso en CourseHistory
+        bed_cumulative = accumulation["total_bed"]
+        eqd2_cumulative = eqd2_from_bed(bed_cumulative, ab)
+
+        col3, col4 = st.columns(2)
+        with col3:
+            st.metric("Cumulative BED", f"{bed_cumulative:.2f} Gy")
+        with col4:
+            st.metric("Cumulative EQD2", f"{eqd2_cumulative:.2f} Gy")
+
+        if len(courses) > 2:
+            st.dataframe(
+                pd.DataFrame({
+                    "Course": [f"RT{k + 1}" for k in range(len(courses) - 1)] + ["RT (Planned)"],
+                    "BED (Gy)": accumulation["bed"],
+                    "EQD2 (Gy)": accumulation["eqd2"],
+                    "Recovery Applied (%)": [r * 100 for r in accumulation["rec"]],
+                    "Cumulative BED (Gy)": accumulation["running_bed"],
+                }),
+                hide_index=True,
+                width="stretch",
+            )
+
+        if limit_ref is None:
+            if "Tumor" in selection:
+                st.info(
+                    "Target volume selected. No upper dose constraint applies, "
+                    "as dose escalation may be clinically intended."
+                )
+            else:
+                st.info(
+                    "No dose constraint applies for the selected structure. "
+                    "Cumulative dose comparison is not performed."
+                )
+        else:
+            ratio, verdict = tolerance_verdict(eqd2_cumulative, limit_ref)
+
+            st.caption(
+                f"⚠️ Comparison performed using cumulative EQD2 against "
+                f"reported {limit_type_ref} {selection} tolerance.")
+
+            if verdict == "within":
+                st.success("Within reported cumulative tolerance (model-based)")
+            elif verdict == "borderline":
+                st.warning("Borderline cumulative dose – caution advised")
+            else:
+                st.error("Above reported cumulative tolerance – high risk")
+
+        # NTCP / TCP con la dosis acumulada como dosis uniforme (gEUD = EQD2)
+        outcome_kind, outcome_params = outcome_model(selection)
+        if outcome_kind:
+            probability = uniform_outcomes([selection], eqd2_cumulative)[0]
+            st.metric(
+                "Uniform-dose NTCP (LKB)" if outcome_kind == "ntcp" else "Uniform-dose TCP (logistic)",
+                f"{probability * 100:.1f} %",
+                help=(
+                    f"{outcome_params.get('endpoint', '')} · "
+                    + (f"n = {outcome_params['n']}, m = {outcome_params['m']}, TD50 = {outcome_params['td50']} Gy"
+                       if outcome_kind == "ntcp" else
+                       f"TCD50 = {outcome_params['tcd50']} Gy, γ50 = {outcome_params['gamma50']}")
+                    + f" ({outcome_params.get('source', '')}). Assumes the cumulative EQD2 is delivered "
+                    "uniformly to the whole organ; use `python -m radcomp.ntcp` with the DVH for the gEUD."
+                ),
+            )
+
+        # --- UNCERTAINTY (MONTE CARLO) ---
+        if st.toggle("🎲 Uncertainty analysis (Monte Carlo)", key="show_uncertainty"):
+            st.caption(
+                "α/β, the recovery of each interval and the overlap penalty of each course pair are "
+                "sampled around their point estimates and propagated through the cumulative calculation."
+            )
+            mc_col1, mc_col2, mc_col3 = st.columns(3)
+            with mc_col1:
+                mc_samples = st.selectbox(
+                    "Samples", [10_000, 100_000, 1_000_000], index=1, key="mc_samples",
+                    format_func=lambda n: f"{n:,}"
+                )
+                mc_seed = st.number_input("Random seed", min_value=0, value=0, step=1, key="mc_seed")
+            with mc_col2:
+                mc_ab_sigma = st.slider(
+                    "α/β spread (log-SD)", 0.0, 0.5, 0.25, 0.05, key="mc_ab_sigma",
+                    help="Lognormal distribution with median equal to the selected α/β."
+                )
+                mc_rec_width = st.slider(
+                    "Recovery ± (fraction)", 0.0, 0.3, 0.15, 0.05, key="mc_rec_width",
+                    help="Triangular distribution centred on the model recovery for each interval."
+                )
+            with mc_col3:
+                mc_overlap_width = st.slider(
+                    "Overlap penalty ± (fraction)", 0.0, 0.2, 0.10, 0.05, key="mc_overlap_width",
+                    help="Triangular distribution centred on the selected overlap penalty."
+                )
+
+            mc = cached_monte_carlo(
+                courses, ab, limit_ref,
+                recovery_mode != "No recovery (full BED summation)",
+                overlap_application,
+                {
+                    "ab": {"dist": "lognormal", "sigma": mc_ab_sigma},
+                    "recovery": {"dist": "triangular", "half_width": mc_rec_width},
+                    "overlap": {"dist": "triangular", "half_width": mc_overlap_width},
+                },
+                mc_samples, int(mc_seed), recovery_model,
+            )
+            eqd2_bands = mc["eqd2_percentiles"]
+            mc_col4, mc_col5, mc_col6, mc_col7 = st.columns(4)
+            mc_col4.metric("Cumulative EQD2 – P5", f"{eqd2_bands[5]:.2f} Gy")
+            mc_col5.metric("Cumulative EQD2 – Median", f"{eqd2_bands[50]:.2f} Gy")
+            mc_col6.metric("Cumulative EQD2 – P95", f"{eqd2_bands[95]:.2f} Gy")
+            if mc["p_above"] is not None:
+                mc_col7.metric("P(above tolerance)", f"{mc['p_above'] * 100:.1f} %")
+                st.caption(
+                    f"Within: {mc['p_within'] * 100:.1f} % · Borderline: {mc['p_borderline'] * 100:.1f} % · "
+                    f"Above: {mc['p_above'] * 100:.1f} % of {mc['n_samples']:,} samples."
+                )
+
+        st.caption(
+            "⚠️ Cumulative dose estimates are model-based and do not replace "
+            "DVH analysis or voxel-level dose accumulation."
         )
+    metrics.stop("reirradiation", reirr_started)
 
-# -------------------------------------------------------------------------
-# Re-irradiation Analysis
-# -------------------------------------------------------------------------
-if mode == "Re-irradiation":
+    # --- VISUALIZATION SECTION ---
 
     st.divider()
-    st.subheader("🔁 Cumulative Biological Dose Assessment")
+    st.subheader("📊 Visual Biological Analysis")
+    figure_started = metrics.start()
 
-    if recovery_mode == "No recovery (full BED summation)":
-        effective_bed_a = bed_a
-        st.warning(
-            """
-            **Conservative assumption applied**
+    # 1. Preparación de datos según el modo
+    if mode == "Re-irradiation":
+        # Usamos la dosis efectiva de cada curso (con recuperación y penalización)
+        # para que el "stack" sume exactamente el acumulado.
+        contributions = accumulation["contributions"]
+        intermediate_colors = ['#2ca02c', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+        plot_series = [("RT1 (Remaining Dose)", contributions[0], '#1f77b4')]
+        for k, value in enumerate(contributions[1:-1]):
+            plot_series.append(
+                (f"RT{k + 2} (Remaining Dose)", value, intermediate_colors[k % len(intermediate_colors)])
+            )
+        plot_series.append(("RT2 (New Dose)" if len(courses) == 2 else "Planned RT (New Dose)",
+                            contributions[-1], '#ff7f0e'))
 
-            - No biological recovery from previous irradiation is assumed.
-            - 100% of the BED from RT1 is carried forward.
+        # Calculamos el EQD2 efectivo de cada curso a partir de su BED efectivo
+        plot_series = [(label, [value, eqd2_from_bed(value, ab)], color) for label, value, color in plot_series]
 
-            This conservative approach is commonly used for critical organs
-            and risk-averse clinical decision-making.
-            """
-        )
+        current_barmode = 'stack'
+        y_axis_label = "Accumulated Dose (Gy)"
     else:
-        rec = recovery_factor(interval_months)
-        effective_bed_a = bed_a * (1 - rec)
+        # Modo estándar: comparativa lateral simple
+        plot_series = [
+            ("Schedule A (Ref)", [bed_a, eqd2_a], '#1f77b4'),
+            ("Schedule B (New)", [bed_b, eqd2_b], '#ff7f0e'),
+        ]
 
-        # Las dos siguientes lineas de codigo solo se usan para mostrar los porcentajes en la info
-        recovery_percentage = int(rec * 100)
-        remaining_percentage = 100 - recovery_percentage
+        current_barmode = 'group'
+        y_axis_label = "Dose (Gy)"
 
-        st.info(
-            f"""
-                   **Biological recovery model active**
+    # 2. Creación del gráfico: plantilla y layout cacheados; la figura se comparte entre sesiones
+    fig = cached_dose_bar_figure(plot_series, current_barmode, y_axis_label)
+    metrics.stop("figure", figure_started)
 
-                   - Time interval between treatments: **{interval_months} months**
-                   - Assumed biological recovery from RT1: **{recovery_percentage}%**
-                   - Remaining biological effect from RT1: **{remaining_percentage}%**
+    with metrics.section("plotly_chart"):
+        st.plotly_chart(fig, width="stretch")
 
-                   The BED contribution from the previous irradiation course is
-                   reduced according to this recovery assumption before being
-                   combined with the new treatment.
-                   """
+    # --- SCENARIO COMPARISON ---
+    # Los escenarios se guardan en la sesión y se calculan todos juntos (vectorizado) con el α/β actual
+    if st.toggle("📚 Compare saved scenarios", key="show_scenarios"):
+        st.caption(
+            f"Schedules evaluated with α/β = {ab:.2f} for **{selection}**. "
+            "Add the current schedules or paste rows (label, total dose, fractions) from a spreadsheet."
+        )
+        scen_col1, scen_col2 = st.columns(2)
+        if scen_col1.button("➕ Add current schedules", key="add_scenarios"):
+            save_scenarios(pd.concat([
+                st.session_state.get("scenario_rows", SCENARIO_COLUMNS),
+                pd.DataFrame({
+                    "Scenario": [f"{total_dose_a:g} Gy / {fractions_a} fx", f"{total_dose_b:g} Gy / {fractions_b} fx"],
+                    "Total Dose (Gy)": [total_dose_a, total_dose_b],
+                    "Fractions": [fractions_a, fractions_b],
+                    "LQL": [use_lql_a, use_lql_b],
+                }),
+            ], ignore_index=True))
+        if scen_col2.button("🗑️ Clear scenarios", key="clear_scenarios"):
+            save_scenarios(SCENARIO_COLUMNS)
+
+        scenarios = st.data_editor(
+            st.session_state.get("scenarios", SCENARIO_COLUMNS),
+            num_rows="dynamic",
+            key=f"scenario_editor_{st.session_state.get('scenario_version', 0)}",
+            hide_index=True,
+            width="stretch",
+            column_config={
+                "Total Dose (Gy)": st.column_config.NumberColumn(min_value=0.0),
+                "Fractions": st.column_config.NumberColumn(min_value=1, step=1),
+                "LQL": st.column_config.CheckboxColumn(default=False, help="Enable LQL Correction (Astrahan 2008)"),
+            },
         )
-    # Validación de dosis para aplicar penalización
-    # Solo existe riesgo biológico por solapamiento si AMBAS dosis son > 0
-    has_overlap_risk = total_dose_a > 0 and total_dose_b > 0
+        # Filas actuales (base + ediciones) para el siguiente "Add", sin tocar la base del editor
+        st.session_state["scenario_rows"] = scenarios
 
-    if overlap != "None" and has_overlap_risk:
-            penalty_factor = 1 + overlap_penalty[overlap]
+        valid = scenarios.dropna(subset=["Total Dose (Gy)", "Fractions"])
+        if valid.empty:
+            st.info("No scenarios saved yet.")
+        else:
+            bed_s, eqd2_s, _ = biology_calculation_batch(
+                valid["Total Dose (Gy)"].to_numpy(dtype=float), valid["Fractions"].to_numpy(dtype=float), ab,
+                valid["LQL"].fillna(False).to_numpy(dtype=bool),
+            )
+            limit_label = f"{limit_type_ref} limit ({limit_ref} Gy EQD2)" if limit_ref is not None else ""
+            st.plotly_chart(
+                scenario_figure(scenario_labels(valid), bed_s, eqd2_s, limit_ref, limit_label), width="stretch"
+            )
 
-            if overlap_application == "cumulative":
-                # Modelo conservador: penaliza la suma total
-                bed_cumulative = (effective_bed_a + bed_b) * penalty_factor
-            else:
-                # Modelo estándar: penaliza solo la dosis remanente de RT1
-                bed_cumulative = (effective_bed_a * penalty_factor) + bed_b
-    else:
-            # Si una dosis es 0 o el usuario eligió "None", no se aplica penalización
-            bed_cumulative = effective_bed_a + bed_b
+    # --- EQD2 MAP (d × N) ---
+    # Solo se calcula si el usuario lo activa; la malla se guarda en caché por α/β, modelo y resolución
+    if st.toggle("🗺️ Show EQD2 map (dose per fraction × number of fractions)", key="show_eqd2_map"):
+        map_col1, map_col2 = st.columns(2)
+        with map_col1:
+            map_resolution = st.select_slider(
+                "Map resolution", ["Low", "Medium", "High"], value="Medium", key="map_resolution"
+            )
+        with map_col2:
+            map_lql = st.checkbox(
+                "Use LQL model (Astrahan 2008)", value=use_lql_a or use_lql_b, key="map_lql"
+            )
 
-    eqd2_cumulative = bed_cumulative / (1 + (2 / ab))
+        d_values, n_values, eqd2_map = eqd2_grid(
+            ab, map_lql, grid_d_max(dose_per_frac_a, dose_per_frac_b), MAX_FRACTIONS,
+            {"Low": 80, "Medium": 160, "High": 320}[map_resolution],
+        )
 
-    col3, col4 = st.columns(2)
-    with col3:
-        st.metric("Cumulative BED", f"{bed_cumulative:.2f} Gy")
-    with col4:
-        st.metric("Cumulative EQD2", f"{eqd2_cumulative:.2f} Gy")
+        map_fig = go.Figure(go.Heatmap(
+            x=d_values,
+            y=n_values,
+            z=eqd2_map,
+            colorscale="Viridis",
+            colorbar=dict(title="EQD2 (Gy)"),
+            hovertemplate="d = %{x:.2f} Gy<br>N = %{y}<br>EQD2 = %{z:.1f} Gy<extra></extra>",
+        ))
+        if limit_ref is not None:
+            # Isolínea del límite de tolerancia del órgano
+            map_fig.add_trace(go.Contour(
+                x=d_values,
+                y=n_values,
+                z=eqd2_map,
+                contours=dict(start=limit_ref, end=limit_ref, size=1, coloring="none", showlabels=True),
+                line=dict(color="#d62728", width=2),
+                showscale=False,
+                hoverinfo="skip",
+                name=f"{limit_type_ref} limit ({limit_ref} Gy)",
+                showlegend=True,
+            ))
+        map_fig.add_vline(
+            x=astrahan_threshold, line_dash="dash", line_color="white",
+            annotation_text="d_T = 2·α/β", annotation_font_color="white",
+        )
+        map_fig.add_trace(go.Scatter(
+            x=[dose_per_frac_a, dose_per_frac_b],
+            y=[fractions_a, fractions_b],
+            mode="markers+text",
+            text=["A", "B"] if mode != "Re-irradiation" else ["RT1", "RT2"],
+            textposition="top center",
+            textfont=dict(color="white"),
+            marker=dict(size=12, color=['#1f77b4', '#ff7f0e'], line=dict(color="white", width=2)),
+            name="Current schedules",
+        ))
+        map_fig.update_layout(
+            template=CHART_TEMPLATE,
+            xaxis_title="Dose per Fraction (Gy)",
+            yaxis_title="Number of Fractions",
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+            margin=dict(l=20, r=20, t=60, b=20),
+            height=500
+        )
+        st.plotly_chart(map_fig, width="stretch")
 
-    if limit_ref is None:
-        if "Tumor" in selection:
-            st.info(
-                "Target volume selected. No upper dose constraint applies, "
-                "as dose escalation may be clinically intended."
+    # --- ISOEFFECTIVE FRACTIONATION ---
+    with st.expander("🎯 Isoeffective Fractionation Table"):
+        st.caption(
+            "Total dose needed in each number of fractions to reach the same biological effect, "
+            f"using α/β = {ab:.2f} for **{selection}**."
+        )
+        iso_col1, iso_col2 = st.columns(2)
+        with iso_col1:
+            target_source = st.radio(
+                "Isoeffect target",
+                [f"EQD2 of {title_a}", "Custom EQD2"],
+                key="iso_target_source",
             )
-        else:
+            if target_source == "Custom EQD2":
+                target_eqd2 = st.number_input("Target EQD2 (Gy)", min_value=0.0, value=60.0, key="iso_target")
+            else:
+                target_eqd2 = eqd2_a
+        with iso_col2:
+            iso_lql = st.checkbox(
+                "Use LQL model (Astrahan 2008)",
+                value=use_lql_a,
+                key="iso_lql",
+                help=f"Linear above d_T = {astrahan_threshold:.1f} Gy per fraction.",
+            )
+
+        # Tabla calculada una sola vez por (objetivo, α/β, modelo) y guardada en caché
+        table = fractionation_table(target_eqd2, ab, iso_lql)
+        st.dataframe(
+            pd.DataFrame({
+                "Fractions": table["fractions"],
+                "Dose per Fraction (Gy)": table["dose_per_fraction"],
+                "Total Dose (Gy)": table["total_dose"],
+                "BED (Gy)": table["bed"],
+                "EQD2 (Gy)": table["eqd2"],
+                "Model": ["LQL" if lql else "LQ" for lql in table["lql_region"]],
+            }).style.format(precision=2),
+            hide_index=True,
+            width="stretch",
+            height=300,
+        )
+        if fractions_b <= MAX_FRACTIONS:
             st.info(
-                "No dose constraint applies for the selected structure. "
-                "Cumulative dose comparison is not performed."
+                f"Isoeffective dose in **{fractions_b}** fractions (as {title_b}): "
+                f"**{table['total_dose'][fractions_b - 1]:.2f} Gy** "
+                f"({table['dose_per_fraction'][fractions_b - 1]:.2f} Gy per fraction)"
             )
-    else:
-        ratio = eqd2_cumulative / limit_ref
+    metrics.stop("calculation_panel", panel_started)
 
-        st.caption(
-            f"⚠️ Comparison performed using cumulative EQD2 against "
-            f"reported {limit_type_ref} {selection} tolerance.")
 
-        if ratio < 0.9:
-            st.success("Within reported cumulative tolerance (model-based)")
-        elif ratio < 1.0:
-            st.warning("Borderline cumulative dose – caution advised")
-        else:
-            st.error("Above reported cumulative tolerance – high risk")
+# ----------------------------------------------------------------------------------------------------------------
+# Plan table (fragment): todas las estructuras del plan en una sola evaluación vectorizada
+# ----------------------------------------------------------------------------------------------------------------
+PLAN_VERDICT_LABELS = {"within": "✅ Within", "borderline": "⚠️ Borderline", "above": "⛔ Above", None: "—"}
+
+
+def default_plan():
+    # Ejemplo de re-irradiación torácica; cada fila usa la métrica del límite de su órgano
+    return pd.DataFrame({
+        "Structure": ["Spinal Cord", "Esophagus", "Heart", "GTV"],
+        "Organ": ["Spinal Cord", "Esophagus", "Heart", "Lung (NSCLC)"],
+        "α/β": pd.Series([None] * 4, dtype="float"),
+        "RT1 Dose (Gy)": [40.0, 30.0, 15.0, 60.0],
+        "RT1 Fx": [25, 25, 25, 30],
+        "RT1 LQL": [False] * 4,
+        "RT2 Dose (Gy)": [24.0, 16.0, 6.0, 50.0],
+        "RT2 Fx": [10, 10, 10, 5],
+        "RT2 LQL": [False, False, False, True],
+        "Interval (months)": [12.0] * 4,
+        "Overlap": ["Partial", "None", "None", "High"],
+    })
+
+
+@st.fragment
+def plan_panel():
+    panel_started = metrics.start()
+    st.subheader("🗂️ Whole-Plan Evaluation")
+    st.caption(
+        "One row per OAR or target. Each structure uses the α/β and limit of its reference organ "
+        "(override α/β in the table). Enter the physical dose of the metric that matches the organ's "
+        "limit type (Dmax, Dmean or the Vx dose level); leave RT2 empty for a single course."
+    )
 
+    plan_col1, plan_col2, plan_col3 = st.columns(3)
+    with plan_col1:
+        plan_recovery = st.toggle("Time-based recovery", value=True, key="plan_recovery")
+    with plan_col2:
+        plan_recovery_model = st.selectbox(
+            "Recovery model", list(RECOVERY_MODELS), format_func=lambda name: MODEL_LABELS[name],
+            disabled=not plan_recovery, key="plan_recovery_model"
+        )
+    with plan_col3:
+        plan_overlap_application = st.selectbox(
+            "Overlap penalty applied to", ["cumulative", "rt1_only"], key="plan_overlap_application",
+            format_func=lambda x: "Cumulative dose (RT1 + RT2)" if x == "cumulative" else "First treatment (RT1) only"
+        )
+
+    plan = st.data_editor(
+        default_plan(),
+        num_rows="dynamic",
+        key="plan_table",
+        hide_index=True,
+        width="stretch",
+        column_config={
+            "Organ": st.column_config.SelectboxColumn(options=list(clinical_data), required=True),
+            "α/β": st.column_config.NumberColumn(min_value=0.5, max_value=20.0, help="Empty = database value"),
+            "RT1 Dose (Gy)": st.column_config.NumberColumn(min_value=0.0),
+            "RT1 Fx": st.column_config.NumberColumn(min_value=1, step=1),
+            "RT1 LQL": st.column_config.CheckboxColumn(default=False),
+            "RT2 Dose (Gy)": st.column_config.NumberColumn(min_value=0.0),
+            "RT2 Fx": st.column_config.NumberColumn(min_value=1, step=1),
+            "RT2 LQL": st.column_config.CheckboxColumn(default=False),
+            "Interval (months)": st.column_config.NumberColumn(min_value=0.0, help="Time between RT1 and RT2"),
+            "Overlap": st.column_config.SelectboxColumn(options=list(overlap_penalty), default="None"),
+        },
+    )
+
+    rows = plan.dropna(subset=["Organ", "RT1 Dose (Gy)", "RT1 Fx"]).to_dict("records")
+    if not rows:
+        st.info("Add at least one structure with an organ, RT1 dose and RT1 fractions.")
+        metrics.stop("plan_panel", panel_started)
+        return
+
+    items = []
+    for row in rows:
+        has_rt2 = pd.notna(row["RT2 Dose (Gy)"]) and pd.notna(row["RT2 Fx"])
+        items.append({
+            "organ": row["Organ"],
+            "ab": float(row["α/β"]) if pd.notna(row["α/β"]) else None,
+            "total_dose_a": float(row["RT1 Dose (Gy)"]),
+            "fractions_a": int(row["RT1 Fx"]),
+            "lql_a": bool(row["RT1 LQL"]) if pd.notna(row["RT1 LQL"]) else False,
+            "total_dose_b": float(row["RT2 Dose (Gy)"]) if has_rt2 else 0.0,
+            "fractions_b": int(row["RT2 Fx"]) if has_rt2 else 1,
+            "lql_b": bool(row["RT2 LQL"]) if has_rt2 and pd.notna(row["RT2 LQL"]) else False,
+            # Sin recuperación o sin intervalo → suma completa de BED
+            "interval_months": (
+                float(row["Interval (months)"])
+                if plan_recovery and has_rt2 and pd.notna(row["Interval (months)"]) else None
+            ),
+            "overlap": row["Overlap"] if has_rt2 and row["Overlap"] in overlap_penalty else "None",
+        })
+
+    with metrics.section("plan_evaluation"):
+        result = evaluate_plan(items, plan_recovery_model, plan_overlap_application)
+
+    results = pd.DataFrame({
+        "Structure": [row["Structure"] if pd.notna(row["Structure"]) else row["Organ"] for row in rows],
+        "Organ": result["organ"],
+        "α/β": result["ab"],
+        "Limit (Gy)": result["limit"],
+        "Limit Type": [clinical_data[o]["limit_type"] for o in result["organ"]],
+        "EQD2 RT1 (Gy)": result["eqd2_a"],
+        "EQD2 RT2 (Gy)": result["eqd2_b"],
+        "Recovery (%)": result["rec"] * 100,
+        "Cumulative BED (Gy)": result["bed_cumulative"],
+        "Cumulative EQD2 (Gy)": result["eqd2_cumulative"],
+        "% of Limit": result["ratio"] * 100,
+        "Verdict": [PLAN_VERDICT_LABELS[v] for v in result["verdict"]],
+        "NTCP/TCP (%)": uniform_outcomes(result["organ"], result["eqd2_cumulative"]) * 100,
+    }).sort_values("% of Limit", ascending=False, na_position="last")
+
+    verdicts = result["verdict"]
+    sum_col1, sum_col2, sum_col3 = st.columns(3)
+    sum_col1.metric("Structures", len(rows))
+    sum_col2.metric("Borderline", verdicts.count("borderline"))
+    sum_col3.metric("Above tolerance", verdicts.count("above"))
+
+    st.dataframe(
+        results,
+        hide_index=True,
+        width="stretch",
+        column_config={
+            col: st.column_config.NumberColumn(format="%.2f")
+            for col in ("α/β", "Limit (Gy)", "EQD2 RT1 (Gy)", "EQD2 RT2 (Gy)", "Cumulative BED (Gy)", "Cumulative EQD2 (Gy)")
+        } | {
+            "Recovery (%)": st.column_config.NumberColumn(format="%.0f %%"),
+            "% of Limit": st.column_config.NumberColumn(format="%.1f %%"),
+            "NTCP/TCP (%)": st.column_config.NumberColumn(
+                format="%.1f %%",
+                help="LKB NTCP (OARs) or logistic TCP (targets) with the cumulative EQD2 as a uniform dose",
+            ),
+        },
+    )
     st.caption(
-        "⚠️ Cumulative dose estimates are model-based and do not replace "
-        "DVH analysis or voxel-level dose accumulation."
+        "⚠️ Cumulative EQD2 is compared with each organ's default limit (see the constraint list in the "
+        "sidebar). Estimates are model-based and do not replace DVH analysis. NTCP/TCP assume a uniform "
+        "dose; run `python -m radcomp.ntcp` on the exported DVH for gEUD-based values."
     )
 
-# --- VISUALIZATION SECTION ---
+    if st.toggle("🎯 Optimize RT2 schedule", key="show_optimizer"):
+        with metrics.section("rt2_optimizer"):
+            rt2_optimizer(rows, items, result, plan_recovery_model, plan_overlap_application)
+    metrics.stop("plan_panel", panel_started)
 
-st.divider()
-st.subheader("📊 Visual Biological Analysis")
 
-# 1. Preparación de datos según el modo
-if mode == "Re-irradiation":
-    # Usamos la dosis efectiva de RT1 (con recuperación y penalización)
-    # y la dosis de RT2 para mostrar el acumulado.
+def rt2_optimizer(rows, items, result, recovery_model, overlap_application):
+    """
+    Esquema de RT2 que maximiza el EQD2 del blanco sin superar el límite de ningún OAR.
+    La dosis RT2 de cada estructura en la tabla se toma como proporción de la del blanco.
+    """
+    names = [row["Structure"] if pd.notna(row["Structure"]) else row["Organ"] for row in rows]
+    targets = [i for i, limit in enumerate(result["limit"]) if pd.isna(limit)]
+    if not targets:
+        st.info("Add a target structure (an organ without a dose limit, e.g. a GTV) to optimize RT2.")
+        return
+
+    opt_col1, opt_col2, opt_col3, opt_col4 = st.columns(4)
+    with opt_col1:
+        target = st.selectbox("Target", targets, format_func=lambda i: names[i], key="optimizer_target")
+    with opt_col2:
+        max_fractions = st.number_input("Max fractions", 1, MAX_FRACTIONS, 30, key="optimizer_max_fractions")
+    with opt_col3:
+        max_dose_per_fraction = st.number_input(
+            "Max dose per fraction (Gy)", min_value=0.5, value=None, step=0.5, key="optimizer_max_dpf",
+            help="Empty = no cap"
+        )
+    with opt_col4:
+        dose_step = st.number_input("Dose rounding (Gy)", 0.0, 5.0, 0.1, step=0.1, key="optimizer_dose_step")
+
+    target_dose = items[target]["total_dose_b"]
+    if target_dose <= 0:
+        st.info("Enter the target's RT2 dose: the RT2 dose of every OAR is scaled relative to it.")
+        return
+    oars = [i for i in range(len(items)) if i not in targets]
+    if not oars:
+        st.info("Add at least one OAR with a dose limit.")
+        return
+
+    # Cada OAR recibe la misma proporción de la prescripción que en la tabla del plan
+    oar_items = [items[i] | {"dose_ratio": items[i]["total_dose_b"] / target_dose} for i in oars]
+    try:
+        frontier = optimize_rt2(
+            oar_items, float(result["ab"][target]), items[target]["lql_b"], int(max_fractions),
+            recovery_model, overlap_application, max_dose_per_fraction, dose_step or None,
+        )
+    except ValueError as exc:
+        st.warning(str(exc))
+        return
+
+    best = frontier["best"]
+    if best is None:
+        st.error(
+            "⛔ No feasible RT2 schedule: at least one OAR has no remaining tolerance after RT1 "
+            "(or every candidate rounds to 0 Gy)."
+        )
+        return
+
+    binding = [names[oars[b]] if b >= 0 else "Dose per fraction cap" for b in frontier["binding"].tolist()]
+    best_col1, best_col2, best_col3 = st.columns(3)
+    best_col1.metric(
+        "Best RT2 schedule",
+        f"{frontier['total_dose'][best]:.1f} Gy / {frontier['fractions'][best]} fx",
+        f"{frontier['dose_per_fraction'][best]:.2f} Gy per fraction", delta_color="off",
+    )
+    best_col2.metric(f"{names[target]} EQD2 (RT2)", f"{frontier['target_eqd2'][best]:.2f} Gy")
+    best_col3.metric("Limiting structure", binding[best])
 
-    # Calculamos el EQD2 efectivo de RT1 para que el "stack" sea matemáticamente correcto
-    effective_eqd2_a = effective_bed_a / (1 + (2 / ab))
+    st.plotly_chart(
+        frontier_figure(frontier["fractions"], frontier["total_dose"], frontier["target_eqd2"], best),
+        width="stretch",
+    )
+    st.dataframe(
+        pd.DataFrame({
+            "RT2 Fx": frontier["fractions"],
+            "Max Total Dose (Gy)": frontier["total_dose"],
+            "Dose per Fraction (Gy)": frontier["dose_per_fraction"],
+            "Target EQD2 (Gy)": frontier["target_eqd2"],
+            "Limiting Structure": binding,
+            "Feasible": frontier["feasible"],
+        }),
+        hide_index=True,
+        width="stretch",
+        column_config={
+            col: st.column_config.NumberColumn(format="%.2f")
+            for col in ("Max Total Dose (Gy)", "Dose per Fraction (Gy)", "Target EQD2 (Gy)")
+        },
+    )
+    st.caption(
+        "Each OAR receives the same fraction of the target's RT2 dose as entered in the plan table, "
+        "with the same number of fractions. RT2 is assumed to be delivered without time corrections."
+    )
 
-    label_a = "RT1 (Remaining Dose)"
-    label_b = "RT2 (New Dose)"
 
-    plot_values_a = [effective_bed_a, effective_eqd2_a]
-    plot_values_b = [bed_b, eqd2_b]
+reirr_settings = None
+if mode == "Re-irradiation":
+    reirr_settings = {
+        "recovery_mode": recovery_mode,
+        "recovery_model": recovery_model,
+        "interval_months": interval_months,
+        "overlap": overlap,
+        "overlap_application": overlap_application,
+    }
 
-    current_barmode = 'stack'
-    y_axis_label = "Accumulated Dose (Gy)"
+if mode == "Plan Table":
+    plan_panel()
 else:
-    # Modo estándar: comparativa lateral simple
-    label_a = "Schedule A (Ref)"
-    label_b = "Schedule B (New)"
-
-    plot_values_a = [bed_a, eqd2_a]
-    plot_values_b = [bed_b, eqd2_b]
-
-    current_barmode = 'group'
-    y_axis_label = "Dose (Gy)"
-
-# 2. Creación del gráfico
-fig = go.Figure()
-
-# Añadir Parte A (Base en Re-irrad o Izquierda en Estándar)
-fig.add_trace(go.Bar(
-    x=['BED (Gy)', 'EQD2 (Gy)'],
-    y=plot_values_a,
-    name=label_a,
-    marker_color='#1f77b4',
-    text=[f"{v:.1f}" for v in plot_values_a],
-    textposition='auto',
-))
-
-# Añadir Parte B (Tope en Re-irrad o Derecha en Estándar)
-fig.add_trace(go.Bar(
-    x=['BED (Gy)', 'EQD2 (Gy)'],
-    y=plot_values_b,
-    name=label_b,
-    marker_color='#ff7f0e',
-    text=[f"{v:.1f}" for v in plot_values_b],
-    textposition='auto',
-))
-
-# 3. Estilo del Layout
-fig.update_layout(
-    barmode=current_barmode,
-    template='plotly_white',
-    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-    yaxis_title=y_axis_label,
-    margin=dict(l=20, r=20, t=60, b=20),
-    height=450
-)
-
-st.plotly_chart(fig, width="stretch")
+    calculation_panel(mode, selection, ab, limit_ref, limit_type_ref, reirr_settings)
 
 # Legal Disclaimer Section
 
@@ -644,3 +1264,5 @@ I am open to collaborations and professional opportunities in Medical Physics an
 
 *Developed by a Clinical Medical Physicist*
 """)
+
+metrics.stop("rerun", rerun_started)
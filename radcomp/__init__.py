@@ -0,0 +1,3 @@
+"""
+RadComp: motor de cálculo radiobiológico (BED, EQD2 y re-irradiación).
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from radcomp.cli import main
+
+sys.exit(main())
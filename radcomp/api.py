@@ -0,0 +1,265 @@
+"""
+API HTTP/JSON local para verificaciones por lotes (sin dependencias externas).
+Servidor asíncrono (asyncio) con HTTP/1.1 keep-alive; cada lote se vectoriza con NumPy
+y se calcula fuera del bucle de eventos.
+
+Endpoints:
+    GET  /health
+    GET  /organs                 → clinical_data
+    GET  /constraints            → base de restricciones completa (radcomp.constraints)
+    GET  /models                 → modelos de dosis-efecto y sus parámetros (radcomp.models)
+    POST /bed                    {"items": [{"total_dose", "fractions", "ab" | "organ", "use_lql",
+                                             "model", "model_params" (opcionales, sustituyen a use_lql),
+                                             "beam_on_time", "segments", "gap", "overall_time",
+                                             "repair_half_time" (opcionales, radcomp.repair)}]}
+    POST /reirradiation          {"items": [{"organ" | "ab", "total_dose_a", "fractions_a", "lql_a",
+                                             "total_dose_b", "fractions_b", "lql_b",
+                                             "interval_months" (null = sin recuperación),
+                                             "overlap", "overlap_application",
+                                             "beam_on_time_a|b", "overall_time_a|b", ... (opcionales)}],
+                                  "recovery_model": "step" | "linear" | "exponential"}
+    POST /tolerance              {"items": [{"organ", "eqd2"}]}
+    POST /delivered              {"items": [{"doses": [Gy por fracción], "ab" | "organ",
+                                             "use_lql" (bool o lista por fracción),
+                                             "dates" (opcional, ISO por fracción)}]}
+
+Uso:
+    python -m radcomp.api --port 8765
+    curl -s localhost:8765/bed -d '{"items": [{"total_dose": 45, "fractions": 25, "organ": "Spinal Cord"}]}'
+"""
+import argparse
+import asyncio
+import json
+import math
+
+import numpy as np
+
+from radcomp.constraints import load_database
+from radcomp.engine import clinical_data
+from radcomp.models import BED_MODELS
+from radcomp.plan import (
+    VERDICTS,
+    ab_column,
+    check_schedule,
+    evaluate_plan,
+    item_column,
+    item_time_corrections,
+    limit_column,
+    organ_column,
+)
+from radcomp.repair import apply_repopulation
+from radcomp.vectorized import biology_calculation_batch, tolerance_ratio_batch
+
+MAX_BODY = 64 * 1024 * 1024  # 64 MB por petición
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+# -------------------------------------------------------------------------
+# Cálculos por lotes
+# -------------------------------------------------------------------------
+def _items(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get("items"), list):
+        raise ValueError("payload must be an object with an 'items' list")
+    for i, item in enumerate(payload["items"]):
+        if not isinstance(item, dict):
+            raise ValueError(f"items[{i}]: must be an object")
+    return payload["items"]
+
+
+def _floats(values):
+    # JSON no admite NaN ni ±Infinity: se devuelve null
+    return [v if math.isfinite(v) else None for v in values.tolist()]
+
+
+def _model_columns(items):
+    """
+    Modelo de cada elemento ("model" o LQ / LQL según "use_lql") y sus parámetros
+    como columnas (NaN = valor por defecto del modelo). Sin "model" se devuelve use_lql.
+    """
+    use_lql = item_column(items, "use_lql", False, bool)
+    if not any(item.get("model") for item in items):
+        return use_lql, None
+    params = [item.get("model_params") or {} for item in items]
+    if not all(isinstance(p, dict) for p in params):
+        raise ValueError("'model_params' must be an object")
+    names = {name for p in params for name in p}
+    return (
+        np.array([item.get("model") or ("lql" if lql else "lq") for item, lql in zip(items, use_lql.tolist())]),
+        {name: np.array([p.get(name, np.nan) for p in params], dtype=np.float64) for name in names},
+    )
+
+
+def bed_batch(payload):
+    items = _items(payload)
+    ab, organs = ab_column(items)
+    g, repopulation = item_time_corrections(items, organs)
+    model, params = _model_columns(items)
+    fractions = item_column(items, "fractions")
+    check_schedule({"ab": ab, "fractions": fractions})
+    bed, eqd2, d = biology_calculation_batch(
+        item_column(items, "total_dose"), fractions, ab, g=g, model=model, params=params,
+    )
+    if np.any(repopulation):
+        bed, eqd2 = apply_repopulation(bed, ab, repopulation)
+    return {"bed": _floats(bed), "eqd2": _floats(eqd2), "dose_per_fraction": _floats(d)}
+
+
+def reirradiation_batch(payload):
+    items = _items(payload)
+    result = evaluate_plan(items, payload.get("recovery_model") or "step")
+    columns = ("bed_a", "eqd2_a", "bed_b", "eqd2_b", "effective_bed_a", "bed_cumulative", "eqd2_cumulative")
+    response = {key: _floats(result[key]) for key in columns + ("ratio",)}
+    response["verdict"] = result["verdict"]
+    return response
+
+
+def tolerance_batch(payload):
+    items = _items(payload)
+    organs = organ_column(items)
+    if any(o is None for o in organs):
+        raise ValueError("each item needs 'organ'")
+    ratio, code = tolerance_ratio_batch(item_column(items, "eqd2"), limit_column(organs))
+    return {
+        "limit": [clinical_data[o]["limit"] for o in organs],
+        "limit_type": [clinical_data[o]["limit_type"] for o in organs],
+        "ratio": _floats(ratio),
+        "verdict": [VERDICTS[c] for c in code.tolist()],
+    }
+
+
+def delivered_batch(payload):
+    # pandas solo se importa para este endpoint (radcomp.delivery agrega con DataFrames)
+    import pandas as pd
+
+    from radcomp.delivery import aggregate_frame
+
+    items = _items(payload)
+    frames = []
+    for i, item in enumerate(items):
+        doses = item.get("doses")
+        if not isinstance(doses, list) or not doses:
+            raise ValueError(f"items[{i}]: 'doses' must be a non-empty list")
+        columns = {"patient": str(i), "dose": doses, "organ": item.get("organ") or "", "ab": item.get("ab")}
+        for key, column in (("use_lql", "lql"), ("dates", "date")):
+            value = item.get(key)
+            if isinstance(value, list) and len(value) != len(doses):
+                raise ValueError(f"items[{i}]: '{key}' must have one value per dose")
+            if value is not None:
+                columns[column] = value
+        frames.append(pd.DataFrame(columns))
+    result = aggregate_frame(pd.concat(frames, ignore_index=True))
+    columns = ("total_dose", "max_dose_per_fraction", "bed", "eqd2", "uniform_bed", "uniform_eqd2",
+               "repopulation_bed", "overall_time")
+    return {"fractions": result["fractions"].tolist(), **{key: _floats(result[key].to_numpy()) for key in columns}}
+
+
+ROUTES = {
+    ("GET", "/health"): lambda _: {"status": "ok"},
+    ("GET", "/organs"): lambda _: clinical_data,
+    ("GET", "/constraints"): lambda _: {
+        "name": load_database().name, "version": load_database().version, "organs": load_database().organs,
+    },
+    ("GET", "/models"): lambda _: {
+        name: {
+            "label": model.label,
+            "params": {
+                param: {"default": default, "unit": unit, "description": description}
+                for param, (default, unit, description) in model.params.items()
+            },
+        }
+        for name, model in BED_MODELS.items()
+    },
+    ("POST", "/bed"): bed_batch,
+    ("POST", "/reirradiation"): reirradiation_batch,
+    ("POST", "/tolerance"): tolerance_batch,
+    ("POST", "/delivered"): delivered_batch,
+}
+
+
+# -------------------------------------------------------------------------
+# Servidor HTTP asíncrono
+# -------------------------------------------------------------------------
+async def dispatch(method: str, path: str, body: bytes):
+    """
+    Resuelve una petición y devuelve (status, payload).
+    """
+    handler = ROUTES.get((method, path))
+    if handler is None:
+        if any(p == path for _, p in ROUTES):
+            return 405, {"error": f"method {method} not allowed"}
+        return 404, {"error": f"unknown path '{path}'"}
+    try:
+        payload = json.loads(body) if body else None
+        # El cálculo (NumPy) se ejecuta en un hilo para no bloquear otras conexiones
+        return 200, await asyncio.to_thread(handler, payload)
+    except (ValueError, TypeError, KeyError) as exc:
+        return 400, {"error": str(exc)}
+    except Exception as exc:  # Un fallo del cálculo no debe cerrar la conexión sin respuesta
+        return 500, {"error": f"{type(exc).__name__}: {exc}"}
+
+
+async def _handle_connection(reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, target, version = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY:
+                status, payload = 413, {"error": "payload too large"}
+                keep_alive = False
+            else:
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await dispatch(method, target.split("?", 1)[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+            data = json.dumps(payload).encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass  # Petición mal formada o cliente desconectado
+    finally:
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8765):
+    """
+    Arranca el servidor y lo mantiene activo.
+    """
+    server = await asyncio.start_server(_handle_connection, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="radcomp.api", description="Local batch HTTP/JSON API for RadComp.")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default 8765)")
+    args = parser.parse_args(argv)
+    print(f"RadComp API listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,188 @@
+"""
+Caché de resultados compartida por todas las sesiones del proceso.
+
+Muchos usuarios evalúan los mismos esquemas estándar (45 Gy / 25 fx, 30 Gy / 10 fx,
+regímenes SBRT habituales) sobre los mismos órganos; st.session_state no se comparte
+entre sesiones, así que cada una recalculaba y reconstruía las figuras. Aquí cada
+caché es un LRU acotado con caducidad (TTL) indexado por las entradas normalizadas
+(45 y 45.0 son la misma clave, los floats se redondean a 1e-9) y con contadores de
+aciertos, fallos, expulsiones y caducados.
+
+Configuración por variables de entorno:
+    RADCOMP_CACHE_SIZE=1024     entradas máximas por caché (0 = desactivada)
+    RADCOMP_CACHE_TTL=3600      segundos de vida de cada entrada (0 = sin caducidad)
+
+Uso:
+    @shared_cache("schedule")
+    def schedule_biology(total_dose, fractions, ab, use_lql=False):
+        ...
+
+    schedule_biology.cache.stats()  # {"hits", "misses", "evictions", "expirations", "size", "hit_rate"}
+
+Los valores se devuelven sin copiar: no deben modificarse (las figuras y arrays cacheados
+se comparten entre sesiones). Los contadores también se publican en radcomp.metrics
+(cache_<nombre>_hits / cache_<nombre>_misses) cuando la medición está activada.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from numbers import Integral, Real
+
+import numpy as np
+
+from radcomp import metrics
+
+DEFAULT_SIZE = int(os.environ.get("RADCOMP_CACHE_SIZE", "1024"))
+DEFAULT_TTL = float(os.environ.get("RADCOMP_CACHE_TTL", "3600"))
+KEY_DECIMALS = 9  # Redondeo de los floats de la clave (absorbe el ruido de coma flotante)
+
+_registry = {}  # nombre -> ResultCache
+_registry_lock = threading.Lock()
+
+
+def normalize(value):
+    """
+    Forma canónica y hashable de unas entradas: números como float redondeado (bool aparte),
+    secuencias y arrays como tuplas y dicts como tuplas ordenadas de pares.
+    """
+    if value is None or isinstance(value, (str, bool, np.bool_)):
+        return bool(value) if isinstance(value, np.bool_) else value
+    if isinstance(value, (Integral, Real)):
+        value = round(float(value), KEY_DECIMALS)
+        return 0.0 if value == 0 else value  # -0.0 y 0.0 son la misma clave
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(normalize(v) for v in (value.tolist() if isinstance(value, np.ndarray) else value))
+    hash(value)  # TypeError para entradas no hashables sin forma canónica
+    return value
+
+
+class ResultCache:
+    """
+    LRU acotado con TTL y contadores, seguro entre hilos (una sesión de Streamlit por hilo).
+    El cálculo de un fallo se hace fuera del cerrojo: dos sesiones que fallen a la vez en la
+    misma clave calculan ambas y la segunda sobrescribe el mismo resultado.
+    """
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_SIZE, ttl: float = DEFAULT_TTL):
+        self.name = name
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self._data = OrderedDict()  # clave -> (caducidad, valor)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key, default=None):
+        """
+        Valor de `key` (normalizada) o `default`; cuenta el acierto o el fallo.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < now:
+                del self._data[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        metrics.count(f"cache_{self.name}_{'misses' if entry is None else 'hits'}")
+        return default if entry is None else entry[1]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, compute):
+        """
+        Valor cacheado de `key` o, si falta o ha caducado, compute() (que se guarda).
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def get_cache(name: str, maxsize: int = DEFAULT_SIZE, ttl: float = DEFAULT_TTL):
+    """
+    Caché compartida `name` del proceso (se crea la primera vez).
+    """
+    with _registry_lock:
+        cache = _registry.get(name)
+        if cache is None:
+            cache = _registry[name] = ResultCache(name, maxsize, ttl)
+        return cache
+
+
+def shared_cache(name: str, maxsize: int = DEFAULT_SIZE, ttl: float = DEFAULT_TTL):
+    """
+    Decorador: cachea la función en la caché compartida `name` con la clave normalizada
+    de sus argumentos. La caché queda accesible como `función.cache`.
+    """
+    def decorator(function):
+        cache = get_cache(name, maxsize, ttl)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = normalize((args, kwargs))
+            return cache.get_or_set(key, lambda: function(*args, **kwargs))
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """
+    Contadores de todas las cachés compartidas: {nombre: stats}.
+    """
+    with _registry_lock:
+        caches = list(_registry.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def clear():
+    """
+    Vacía todas las cachés compartidas y reinicia sus contadores.
+    """
+    with _registry_lock:
+        caches = list(_registry.values())
+    for cache in caches:
+        cache.clear()
@@ -0,0 +1,129 @@
+"""
+Figuras Plotly de la app con plantilla y layout cacheados.
+
+La plantilla completa "plotly_white" ocupa ~6.5 KB en cada figura serializada y su
+validación domina el tiempo de construcción; Streamlit aplica además su propio tema
+sobre la plantilla. Aquí se usa una plantilla compacta con el mismo aspecto y un layout
+por tipo de gráfico construido una sola vez: en cada rerun solo se crean las trazas.
+
+La comparación de escenarios usa una traza por magnitud (no una por escenario) y, con
+muchos escenarios, trazas WebGL (Scattergl) con arrays NumPy (codificados en binario).
+"""
+from functools import lru_cache
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Lo que se ve de "plotly_white" (fondo, rejilla, fuente, colores, hover)
+_AXIS = dict(gridcolor="#EBF0F8", linecolor="#EBF0F8", zerolinecolor="#EBF0F8", zerolinewidth=2,
+             ticks="", automargin=True)
+CHART_TEMPLATE = go.layout.Template(layout=dict(
+    plot_bgcolor="white",
+    paper_bgcolor="white",
+    font=dict(color="#2a3f5f"),
+    colorway=["#636efa", "#EF553B", "#00cc96", "#ab63fa", "#FFA15A", "#19d3f3", "#FF6692", "#B6E880"],
+    hovermode="closest",
+    xaxis=_AXIS,
+    yaxis=_AXIS,
+))
+
+LEGEND = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+MARGIN = dict(l=20, r=20, t=60, b=20)
+
+# Hasta este número de escenarios se usan barras; por encima, marcadores WebGL
+SCENARIO_BAR_MAX = 40
+
+
+@lru_cache(maxsize=8)
+def bar_layout(barmode: str, y_title: str):
+    """
+    Layout del gráfico BED / EQD2 (uno por modo de barras y título del eje).
+    """
+    return go.Layout(
+        barmode=barmode, template=CHART_TEMPLATE, legend=LEGEND, yaxis_title=y_title, margin=MARGIN, height=450,
+    )
+
+
+def dose_bar_figure(series, barmode: str, y_title: str):
+    """
+    Barras BED / EQD2: series es una lista de (etiqueta, [BED, EQD2], color).
+    """
+    return go.Figure(
+        data=[
+            dict(type="bar", x=["BED (Gy)", "EQD2 (Gy)"], y=values, name=label, marker=dict(color=color),
+                 text=[f"{v:.1f}" for v in values], textposition="auto")
+            for label, values, color in series
+        ],
+        layout=bar_layout(barmode, y_title),
+    )
+
+
+@lru_cache(maxsize=8)
+def scenario_layout(webgl: bool, limit=None, limit_label: str = ""):
+    """
+    Layout de la comparación de escenarios, con la línea del límite EQD2 si existe.
+    """
+    shapes, annotations = (), ()
+    if limit is not None:
+        shapes = (dict(type="line", xref="paper", x0=0, x1=1, y0=limit, y1=limit,
+                       line=dict(color="#d62728", width=2, dash="dash")),)
+        annotations = (dict(xref="paper", x=1, y=limit, text=limit_label, showarrow=False,
+                            xanchor="right", yanchor="bottom", font=dict(color="#d62728")),)
+    return go.Layout(
+        barmode="group", template=CHART_TEMPLATE, legend=LEGEND, margin=MARGIN, height=450,
+        yaxis_title="Dose (Gy)",
+        xaxis=dict(title="Scenario", type="category", showticklabels=not webgl),
+        shapes=shapes, annotations=annotations,
+    )
+
+
+def scenario_figure(labels, bed, eqd2, limit=None, limit_label: str = ""):
+    """
+    BED y EQD2 de muchos esquemas en un solo gráfico: dos trazas en total.
+    Con más de SCENARIO_BAR_MAX escenarios se usan marcadores Scattergl (WebGL).
+    """
+    labels = list(labels)
+    bed = np.asarray(bed, dtype=np.float64)
+    eqd2 = np.asarray(eqd2, dtype=np.float64)
+    webgl = len(labels) > SCENARIO_BAR_MAX
+    hover = "%{x}<br>%{fullData.name}: %{y:.2f} Gy<extra></extra>"
+    if webgl:
+        data = [
+            dict(type="scattergl", mode="markers", x=labels, y=values, name=name,
+                 marker=dict(color=color, size=6), hovertemplate=hover)
+            for name, values, color in (("BED", bed, "#1f77b4"), ("EQD2", eqd2, "#ff7f0e"))
+        ]
+    else:
+        data = [
+            dict(type="bar", x=labels, y=values, name=name, marker=dict(color=color), hovertemplate=hover)
+            for name, values, color in (("BED", bed, "#1f77b4"), ("EQD2", eqd2, "#ff7f0e"))
+        ]
+    return go.Figure(data=data, layout=scenario_layout(webgl, limit, limit_label))
+
+
+@lru_cache(maxsize=1)
+def frontier_layout():
+    """
+    Layout de la frontera del optimizador de RT2 (dosis por número de fracciones).
+    """
+    return go.Layout(
+        template=CHART_TEMPLATE, legend=LEGEND, margin=MARGIN, height=400,
+        xaxis_title="RT2 fractions", yaxis_title="Dose (Gy)", hovermode="x unified",
+    )
+
+
+def frontier_figure(fractions, total_dose, target_eqd2, best=None):
+    """
+    Dosis total máxima de RT2 y EQD2 del blanco para cada número de fracciones, con el óptimo marcado.
+    """
+    fractions = np.asarray(fractions)
+    data = [
+        dict(type="scatter", mode="lines+markers", x=fractions, y=np.asarray(values, dtype=np.float64),
+             name=name, line=dict(color=color), hovertemplate="%{y:.2f} Gy")
+        for name, values, color in (("Max RT2 total dose", total_dose, "#1f77b4"),
+                                    ("Target EQD2", target_eqd2, "#ff7f0e"))
+    ]
+    if best is not None:
+        data.append(dict(type="scatter", mode="markers", x=[fractions[best]], y=[float(target_eqd2[best])],
+                         name="Best", marker=dict(color="#d62728", size=14, symbol="star"), hoverinfo="skip"))
+    return go.Figure(data=data, layout=frontier_layout())
@@ -0,0 +1,141 @@
+"""
+CLI por lotes de RadComp.
+Lee escenarios (CSV) desde un archivo o stdin fila por fila y escribe BED/EQD2,
+dosis acumulada y veredicto de tolerancia en stdout, con memoria constante.
+
+Uso:
+    python -m radcomp scenarios.csv > results.csv
+    cat scenarios.csv | python -m radcomp
+"""
+import argparse
+import csv
+import sys
+
+from radcomp.engine import (
+    clinical_data,
+    overlap_penalty,
+    biology_calculation,
+    recovery_factor,
+    eqd2_from_bed,
+    cumulative_bed,
+    tolerance_verdict,
+)
+
+RESULT_FIELDS = [
+    "ab",
+    "bed_a", "eqd2_a", "dose_per_fraction_a",
+    "bed_b", "eqd2_b", "dose_per_fraction_b",
+    "effective_bed_a", "bed_cumulative", "eqd2_cumulative",
+    "limit", "limit_type", "ratio", "verdict",
+]
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+
+
+def _float(row, key, default=None):
+    value = (row.get(key) or "").strip()
+    if value == "":
+        if default is None:
+            raise ValueError(f"missing value for '{key}'")
+        return default
+    return float(value)
+
+
+def _flag(row, key):
+    return (row.get(key) or "").strip().lower() in TRUE_VALUES
+
+
+def evaluate_row(row: dict):
+    """
+    Evalúa un escenario (dict de strings, como lo entrega csv.DictReader).
+    Columnas: organ, ab, total_dose_a, fractions_a, lql_a, total_dose_b, fractions_b, lql_b,
+    interval_months (vacío = sin recuperación), overlap, overlap_application.
+    Devuelve un dict con los campos de RESULT_FIELDS.
+    """
+    organ = (row.get("organ") or "").strip()
+    if organ and organ not in clinical_data:
+        raise ValueError(f"unknown organ '{organ}'")
+    reference = clinical_data.get(organ, {"ab": None, "limit": None, "limit_type": "None"})
+
+    ab = _float(row, "ab", reference["ab"])
+    total_dose_a = _float(row, "total_dose_a")
+    fractions_a = _float(row, "fractions_a")
+    total_dose_b = _float(row, "total_dose_b", 0.0)
+    fractions_b = _float(row, "fractions_b", 1.0)
+    if not ab > 0:
+        raise ValueError(f"'ab' must be > 0, got {ab}")
+    for key, fractions in (("fractions_a", fractions_a), ("fractions_b", fractions_b)):
+        if not fractions >= 1:
+            raise ValueError(f"'{key}' must be ≥ 1, got {fractions}")
+
+    overlap = (row.get("overlap") or "None").strip()
+    if overlap not in overlap_penalty:
+        raise ValueError(f"unknown overlap '{overlap}'")
+    overlap_application = (row.get("overlap_application") or "cumulative").strip()
+    if overlap_application not in ("cumulative", "rt1_only"):
+        raise ValueError(f"unknown overlap_application '{overlap_application}'")
+
+    interval = (row.get("interval_months") or "").strip()
+    rec = recovery_factor(float(interval)) if interval else 0.0
+
+    bed_a, eqd2_a, d_a = biology_calculation(total_dose_a, fractions_a, ab, _flag(row, "lql_a"))
+    bed_b, eqd2_b, d_b = biology_calculation(total_dose_b, fractions_b, ab, _flag(row, "lql_b"))
+
+    has_overlap_risk = total_dose_a > 0 and total_dose_b > 0
+    effective_bed_a, bed_cumulative = cumulative_bed(
+        bed_a, bed_b, rec, overlap, overlap_application, has_overlap_risk
+    )
+    eqd2_cumulative = eqd2_from_bed(bed_cumulative, ab)
+    ratio, verdict = tolerance_verdict(eqd2_cumulative, reference["limit"])
+
+    return {
+        "ab": ab,
+        "bed_a": bed_a, "eqd2_a": eqd2_a, "dose_per_fraction_a": d_a,
+        "bed_b": bed_b, "eqd2_b": eqd2_b, "dose_per_fraction_b": d_b,
+        "effective_bed_a": effective_bed_a,
+        "bed_cumulative": bed_cumulative,
+        "eqd2_cumulative": eqd2_cumulative,
+        "limit": reference["limit"],
+        "limit_type": reference["limit_type"],
+        "ratio": ratio,
+        "verdict": verdict,
+    }
+
+
+def run(infile, outfile, delimiter=","):
+    """
+    Procesa el CSV fila por fila; las columnas de entrada se copian a la salida
+    seguidas de los resultados.
+    """
+    reader = csv.DictReader(infile, delimiter=delimiter)
+    fieldnames = list(reader.fieldnames or [])
+    fieldnames += [f for f in RESULT_FIELDS if f not in fieldnames]
+    writer = csv.DictWriter(outfile, fieldnames=fieldnames, delimiter=delimiter, lineterminator="\n")
+    writer.writeheader()
+
+    for row in reader:
+        try:
+            row.update(evaluate_row(row))
+        except ValueError as exc:
+            raise ValueError(f"line {reader.line_num}: {exc}") from None
+        writer.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="radcomp",
+        description="Batch BED/EQD2 and re-irradiation evaluation of CSV scenario rows.",
+    )
+    parser.add_argument("input", nargs="?", default="-", help="Scenario CSV file ('-' for stdin, default)")
+    parser.add_argument("--delimiter", default=",", help="CSV field delimiter (default ',')")
+    args = parser.parse_args(argv)
+
+    infile = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf-8")
+    try:
+        run(infile, sys.stdout, args.delimiter)
+    except ValueError as exc:
+        parser.exit(2, f"radcomp: error: {exc}\n")
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+    return 0
@@ -0,0 +1,252 @@
+"""
+Base de datos externa y versionada de restricciones clínicas (α/β y límites dosis-volumen).
+
+El archivo JSON (radcomp/data/constraints.json, esquema en constraints.schema.json) se lee
+y valida una sola vez por proceso y se indexa por (órgano, limit_type, fracciones) para
+consultas en tiempo constante. Cada institución puede usar su propia tabla con la
+variable de entorno RADCOMP_CONSTRAINTS=ruta.json o con load_database(ruta).
+
+Restricciones con "fractions": null → límites en EQD2 (fraccionamiento convencional).
+Restricciones con "fractions": N   → límites en dosis física para N fracciones (p. ej. TG-101).
+
+Uso:
+    python -m radcomp.constraints                      # resumen de la base por defecto
+    python -m radcomp.constraints tabla.json --organ "Spinal Cord" --fractions 5
+"""
+import argparse
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+SCHEMA_VERSION = 1
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_PATH = DATA_DIR / "constraints.json"
+ENV_VAR = "RADCOMP_CONSTRAINTS"
+
+LIMIT_TYPE = re.compile(r"^(Dmax|Dmean|Surrogate|V[0-9]+(\.[0-9]+)?)$")
+_ORGAN_KEYS = {"ab", "source", "constraints"}
+_ORGAN_OPTIONAL_KEYS = ("repair_half_time", "repopulation", "ntcp", "tcp")
+_REPOPULATION_KEYS = {"alpha", "tk", "tpot"}
+# Parámetros de resultado: LKB (n, m, TD50) para OARs y logístico (TCD50, γ50, a) para blancos
+_OUTCOME_KEYS = {"ntcp": {"n", "m", "td50"}, "tcp": {"tcd50", "gamma50", "a"}}
+_OUTCOME_OPTIONAL_KEYS = {"endpoint", "source"}
+_CONSTRAINT_KEYS = {"limit_type", "limit", "volume_limit", "volume_unit", "fractions", "endpoint", "source"}
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate(data):
+    """
+    Comprueba que `data` cumple el esquema (sin dependencias externas).
+    Lanza ValueError indicando la ruta del primer error.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("database must be a JSON object")
+    if data.get("schema_version") != SCHEMA_VERSION:
+        raise ValueError(f"unsupported schema_version {data.get('schema_version')!r} (expected {SCHEMA_VERSION})")
+    if not isinstance(data.get("version"), str) or not data["version"]:
+        raise ValueError("'version' must be a non-empty string")
+    unknown = set(data) - {"schema_version", "version", "name", "organs"}
+    if unknown:
+        raise ValueError(f"unknown top-level keys: {sorted(unknown)}")
+    organs = data.get("organs")
+    if not isinstance(organs, dict) or not organs:
+        raise ValueError("'organs' must be a non-empty object")
+
+    for name, organ in organs.items():
+        where = f"organs[{name!r}]"
+        if not isinstance(organ, dict) or not _ORGAN_KEYS <= set(organ) <= _ORGAN_KEYS.union(_ORGAN_OPTIONAL_KEYS):
+            raise ValueError(
+                f"{where}: expected the keys {sorted(_ORGAN_KEYS)} (optional {sorted(_ORGAN_OPTIONAL_KEYS)})"
+            )
+        if not _number(organ["ab"]) or organ["ab"] <= 0:
+            raise ValueError(f"{where}.ab: must be a number > 0")
+        if "repair_half_time" in organ and (not _number(organ["repair_half_time"]) or organ["repair_half_time"] <= 0):
+            raise ValueError(f"{where}.repair_half_time: must be a number > 0 (hours)")
+        if "repopulation" in organ:
+            repopulation = organ["repopulation"]
+            if not isinstance(repopulation, dict) or set(repopulation) != _REPOPULATION_KEYS:
+                raise ValueError(f"{where}.repopulation: expected exactly the keys {sorted(_REPOPULATION_KEYS)}")
+            if not all(_number(v) for v in repopulation.values()) or repopulation["tk"] < 0 \
+                    or repopulation["alpha"] <= 0 or repopulation["tpot"] <= 0:
+                raise ValueError(f"{where}.repopulation: alpha and tpot must be > 0, tk ≥ 0")
+        for key, required in _OUTCOME_KEYS.items():
+            if key not in organ:
+                continue
+            model = organ[key]
+            if not isinstance(model, dict) or not required <= set(model) <= required | _OUTCOME_OPTIONAL_KEYS:
+                raise ValueError(
+                    f"{where}.{key}: expected the keys {sorted(required)} (optional {sorted(_OUTCOME_OPTIONAL_KEYS)})"
+                )
+            if not all(_number(model[k]) for k in required) or not all(
+                isinstance(model.get(k, ""), str) for k in _OUTCOME_OPTIONAL_KEYS
+            ):
+                raise ValueError(f"{where}.{key}: parameters must be numbers, endpoint/source strings")
+        if "ntcp" in organ and not all(organ["ntcp"][k] > 0 for k in ("n", "m", "td50")):
+            raise ValueError(f"{where}.ntcp: n, m and td50 must be > 0")
+        if "tcp" in organ and not (organ["tcp"]["tcd50"] > 0 and organ["tcp"]["gamma50"] > 0 and organ["tcp"]["a"] < 0):
+            raise ValueError(f"{where}.tcp: tcd50 and gamma50 must be > 0, a < 0")
+        if not isinstance(organ["source"], str):
+            raise ValueError(f"{where}.source: must be a string")
+        if not isinstance(organ["constraints"], list):
+            raise ValueError(f"{where}.constraints: must be a list")
+
+        for i, constraint in enumerate(organ["constraints"]):
+            where_c = f"{where}.constraints[{i}]"
+            if not isinstance(constraint, dict):
+                raise ValueError(f"{where_c}: must be an object")
+            missing = {"limit_type", "limit", "fractions"} - set(constraint)
+            unknown = set(constraint) - _CONSTRAINT_KEYS
+            if missing or unknown:
+                raise ValueError(f"{where_c}: missing {sorted(missing)} / unknown {sorted(unknown)} keys")
+            if not isinstance(constraint["limit_type"], str) or not LIMIT_TYPE.match(constraint["limit_type"]):
+                raise ValueError(f"{where_c}.limit_type: invalid value {constraint['limit_type']!r}")
+            if not _number(constraint["limit"]) or constraint["limit"] <= 0:
+                raise ValueError(f"{where_c}.limit: must be a number > 0")
+            fractions = constraint["fractions"]
+            if fractions is not None and (not isinstance(fractions, int) or isinstance(fractions, bool) or fractions < 1):
+                raise ValueError(f"{where_c}.fractions: must be null or an integer ≥ 1")
+            if constraint["limit_type"].startswith("V"):
+                if not _number(constraint.get("volume_limit")) or constraint["volume_limit"] <= 0:
+                    raise ValueError(f"{where_c}.volume_limit: required (number > 0) for Vx constraints")
+            if constraint.get("volume_unit", "%") not in ("%", "cc"):
+                raise ValueError(f"{where_c}.volume_unit: must be '%' or 'cc'")
+    return data
+
+
+class ConstraintDatabase:
+    """
+    Base de restricciones indexada. Las consultas son búsquedas en un dict
+    (organ, limit_type | None, fractions) → tupla de restricciones.
+    """
+
+    def __init__(self, data: dict):
+        validate(data)
+        self.version = data["version"]
+        self.name = data.get("name", "")
+        self.organs = {}
+        self._index = {}
+        self._count = 0
+
+        for name, organ in data["organs"].items():
+            constraints = tuple(
+                {**c, "organ": name, **({"volume_unit": c.get("volume_unit", "%")} if "volume_limit" in c else {})}
+                for c in organ["constraints"]
+            )
+            self.organs[name] = {"ab": float(organ["ab"]), "source": organ["source"], "constraints": constraints}
+            self.organs[name].update({key: organ[key] for key in _ORGAN_OPTIONAL_KEYS if key in organ})
+            self._count += len(constraints)
+            for c in constraints:
+                for key in ((name, c["limit_type"], c["fractions"]), (name, None, c["fractions"])):
+                    self._index.setdefault(key, []).append(c)
+        self._index = {key: tuple(values) for key, values in self._index.items()}
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, organ):
+        return organ in self.organs
+
+    def lookup(self, organ: str, limit_type: str = None, fractions: int = None):
+        """
+        Restricciones de un órgano, opcionalmente filtradas por limit_type.
+        fractions=None devuelve los límites EQD2 (convencionales); fractions=N los
+        límites en dosis física específicos de N fracciones.
+        """
+        if organ not in self.organs:
+            raise KeyError(f"unknown organ '{organ}'")
+        return self._index.get((organ, limit_type, fractions), ())
+
+    def regimes(self, organ: str):
+        """
+        Números de fracciones con límites específicos para el órgano (None = EQD2).
+        """
+        found = {c["fractions"] for c in self.organs[organ]["constraints"]}
+        return sorted(found, key=lambda n: (n is not None, n or 0))
+
+    def default(self, organ: str):
+        """
+        Restricción por defecto del órgano (primer límite EQD2) o None.
+        """
+        conventional = self.lookup(organ)
+        return conventional[0] if conventional else None
+
+    def clinical_data(self):
+        """
+        Vista con el formato histórico de clinical_data: α/β, fuente y el límite por defecto
+        (más repair_half_time / repopulation / ntcp / tcp si la tabla los define).
+        """
+        data = {}
+        for name, organ in self.organs.items():
+            default = self.default(name)
+            entry = {
+                "ab": organ["ab"],
+                "source": organ["source"],
+                "limit": default["limit"] if default else None,
+                "limit_type": default["limit_type"] if default else "None",
+            }
+            if default and "volume_limit" in default:
+                entry["volume_limit"] = default["volume_limit"]
+                entry["volume_unit"] = default.get("volume_unit", "%")
+            entry.update({key: organ[key] for key in _ORGAN_OPTIONAL_KEYS if key in organ})
+            data[name] = entry
+        return data
+
+
+def database_path(path=None):
+    """
+    Ruta efectiva: argumento, variable RADCOMP_CONSTRAINTS o la tabla incluida.
+    """
+    return Path(path or os.environ.get(ENV_VAR) or DEFAULT_PATH).resolve()
+
+
+@lru_cache(maxsize=8)
+def _load(path: Path):
+    with open(path, encoding="utf-8") as f:
+        return ConstraintDatabase(json.load(f))
+
+
+def load_database(path=None):
+    """
+    Carga (una vez por proceso y ruta) la base de restricciones.
+    """
+    return _load(database_path(path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="radcomp.constraints",
+        description="Validate and query a RadComp clinical constraint database.",
+    )
+    parser.add_argument("path", nargs="?", help=f"Database JSON (default: ${ENV_VAR} or the bundled table)")
+    parser.add_argument("--organ", help="List the constraints of this organ")
+    parser.add_argument("--limit-type", help="Filter by limit type (e.g. Dmax, Dmean, V20)")
+    parser.add_argument("--fractions", type=int, help="Physical-dose limits for this number of fractions")
+    args = parser.parse_args(argv)
+
+    try:
+        db = load_database(args.path)
+        if args.organ:
+            rows = db.lookup(args.organ, args.limit_type, args.fractions)
+    except (OSError, ValueError) as exc:
+        parser.exit(2, f"radcomp.constraints: error: {exc}\n")
+    except KeyError as exc:
+        parser.exit(2, f"radcomp.constraints: error: {exc.args[0]}\n")
+
+    if not args.organ:
+        print(f"{db.name} v{db.version}: {len(db.organs)} organs, {len(db)} constraints")
+        return 0
+    regime = "EQD2" if args.fractions is None else f"{args.fractions} fx (physical dose)"
+    print(f"{args.organ} (α/β = {db.organs[args.organ]['ab']}), {regime}:")
+    for c in rows:
+        volume = f" ≤ {c['volume_limit']} {c['volume_unit']}" if "volume_limit" in c else ""
+        print(f"  {c['limit_type']:>9s} {c['limit']:>6} Gy{volume}  {c.get('endpoint', '')} [{c.get('source', '')}]")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
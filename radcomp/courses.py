@@ -0,0 +1,188 @@
+"""
+Acumulación de re-irradiación para N cursos de tratamiento.
+Generaliza el cálculo RT1 + RT2 de main.py a una lista ordenada de cursos:
+la recuperación se aplica en cada intervalo y la penalización por solapamiento
+en cada par consecutivo (curso previo acumulado -> curso nuevo).
+
+Con dos cursos el resultado es idéntico a cumulative_bed.
+"""
+from radcomp.engine import biology_calculation, cumulative_bed, eqd2_from_bed, overlap_penalty, recovery_factor
+from radcomp.vectorized import biology_calculation_batch
+
+DAYS_PER_MONTH = 365.25 / 12
+
+
+def months_between(start, end):
+    """
+    Meses (decimales) entre dos fechas.
+    """
+    return (end - start).days / DAYS_PER_MONTH
+
+
+def course_interval(previous: dict, course: dict):
+    """
+    Intervalo en meses entre dos cursos: por fechas si ambos la tienen,
+    si no el campo "interval_months" del curso.
+    """
+    if course.get("date") is not None and previous.get("date") is not None:
+        return months_between(previous["date"], course["date"])
+    return course.get("interval_months", 0)
+
+
+class CourseHistory:
+    """
+    Historia ordenada de cursos con recálculo incremental.
+
+    Cada curso es un dict con "total_dose", "fractions" y opcionalmente "use_lql",
+    "date" (datetime.date) o "interval_months" (desde el curso anterior) y
+    "overlap" ("None"/"Partial"/"High", solapamiento con el acumulado previo),
+    "g" (factor G de reparación incompleta) y "repopulation" (BED perdido por
+    repoblación), ambos de radcomp.repair.
+    "model" y "model_params" eligen un modelo del registro radcomp.models
+    (sustituyen a "use_lql").
+
+    Al editar el curso k solo se recalculan su BED y los acumulados k..N.
+    """
+
+    def __init__(self, ab: float, recovery=recovery_factor, overlap_application: str = "cumulative"):
+        self.ab = ab
+        self.recovery = recovery  # None = sin recuperación (suma completa de BED)
+        self.overlap_application = overlap_application
+        self.courses = []
+        self.bed = []         # BED de cada curso
+        self.eqd2 = []        # EQD2 de cada curso
+        self.dose_per_fraction = []
+        self.rec = []         # Recuperación aplicada al acumulado previo al llegar al curso k
+        self.cumulative = []  # BED acumulado tras el curso k
+        self._factors = []    # (a_k, b_k): S_k = a_k * S_(k-1) + b_k * BED_k
+        self._dirty = 0       # Primer índice pendiente de recalcular
+
+    # ------------------------------------------------------------------
+    # Edición
+    # ------------------------------------------------------------------
+    def _invalidate(self, index: int):
+        self._dirty = min(self._dirty, index)
+
+    def set_params(self, ab=None, recovery=..., overlap_application=None):
+        """
+        Cambia parámetros globales; si cambian, se recalcula toda la historia.
+        """
+        if ab is not None and ab != self.ab:
+            self.ab = ab
+            self._invalidate(0)
+        if recovery is not ... and recovery is not self.recovery:
+            self.recovery = recovery
+            self._invalidate(0)
+        if overlap_application is not None and overlap_application != self.overlap_application:
+            self.overlap_application = overlap_application
+            self._invalidate(0)
+
+    def append(self, course: dict):
+        self.courses.append(dict(course))
+        self._invalidate(len(self.courses) - 1)
+
+    def update(self, index: int, **changes):
+        self.courses[index].update(changes)
+        self._invalidate(index)
+
+    def remove(self, index: int):
+        del self.courses[index]
+        self._invalidate(index)
+
+    def sync(self, courses: list):
+        """
+        Reemplaza la lista de cursos recalculando solo desde el primer curso distinto.
+        Pensado para la UI, que reconstruye la lista completa en cada rerun.
+        """
+        first_change = next(
+            (i for i, (old, new) in enumerate(zip(self.courses, courses)) if old != new),
+            min(len(self.courses), len(courses)),
+        )
+        if first_change < len(self.courses) or len(courses) != len(self.courses):
+            self.courses = [dict(c) for c in courses]
+            self._invalidate(first_change)
+
+    # ------------------------------------------------------------------
+    # Cálculo
+    # ------------------------------------------------------------------
+    def _recompute(self):
+        start = self._dirty
+        n = len(self.courses)
+        if start >= n and len(self.cumulative) == n:
+            return
+
+        for values in (self.bed, self.eqd2, self.dose_per_fraction, self.rec, self.cumulative, self._factors):
+            del values[start:]
+
+        for k in range(start, n):
+            course = self.courses[k]
+            if course.get("model"):
+                # Modelo del registro (radcomp.models) con sus parámetros
+                bed, eqd2, d = (float(v) for v in biology_calculation_batch(
+                    course["total_dose"], course["fractions"], self.ab, g=course.get("g", 1.0),
+                    model=course["model"], params=course.get("model_params"),
+                ))
+            else:
+                bed, eqd2, d = biology_calculation(
+                    course["total_dose"], course["fractions"], self.ab, course.get("use_lql", False), course.get("g", 1.0)
+                )
+            if course.get("repopulation"):
+                bed = max(bed - course["repopulation"], 0.0)
+                eqd2 = eqd2_from_bed(bed, self.ab)
+            self.bed.append(bed)
+            self.eqd2.append(eqd2)
+            self.dose_per_fraction.append(d)
+
+            if k == 0:
+                self.rec.append(0.0)
+                self.cumulative.append(bed)
+                self._factors.append((0.0, 1.0))
+                continue
+
+            rec = self.recovery(course_interval(self.courses[k - 1], course)) if self.recovery else 0.0
+            overlap = course.get("overlap", "None")
+            # Solo existe riesgo por solapamiento si el acumulado previo y el curso nuevo tienen dosis
+            has_overlap_risk = self.cumulative[k - 1] > 0 and course["total_dose"] > 0
+            _, cumulative = cumulative_bed(
+                self.cumulative[k - 1], bed, rec, overlap, self.overlap_application, has_overlap_risk
+            )
+            self.rec.append(rec)
+            self.cumulative.append(cumulative)
+
+            penalty = 1 + overlap_penalty[overlap] if overlap != "None" and has_overlap_risk else 1.0
+            if self.overlap_application == "cumulative":
+                self._factors.append(((1 - rec) * penalty, penalty))
+            else:
+                self._factors.append(((1 - rec) * penalty, 1.0))
+
+        self._dirty = n
+
+    @property
+    def total_bed(self):
+        self._recompute()
+        return self.cumulative[-1] if self.cumulative else 0.0
+
+    @property
+    def total_eqd2(self):
+        return eqd2_from_bed(self.total_bed, self.ab)
+
+    def running_bed(self):
+        """
+        BED acumulado tras cada curso.
+        """
+        self._recompute()
+        return list(self.cumulative)
+
+    def contributions(self):
+        """
+        Parte del BED total que aporta cada curso (tras recuperación y penalizaciones
+        posteriores). La suma es igual a total_bed; se usa para el gráfico apilado.
+        """
+        self._recompute()
+        result = [0.0] * len(self.courses)
+        carry = 1.0
+        for k in range(len(self.courses) - 1, -1, -1):
+            a, b = self._factors[k]
+            result[k] = self.bed[k] * b * carry
+            carry *= a
+        return result
@@ -0,0 +1,240 @@
+"""
+BED fracción a fracción a partir de registros de tratamiento administrado (exportaciones
+del sistema de registro y verificación).
+
+biology_calculation supone N fracciones iguales de total_dose / fractions; los cursos reales
+tienen sobreimpresiones, replanificaciones, fracciones perdidas o compensadas y tamaños de
+fracción mixtos. Aquí cada fila es una fracción administrada: su BED se calcula con LQ/LQL
+con su propia dosis y se suma por paciente y curso. La entrada se lee por bloques y cada
+bloque se reduce a sumas por grupo vectorizadas (factorize + bincount / ufunc.at); los
+parciales de todos los bloques se combinan con la misma reducción, así que un curso puede
+quedar repartido entre bloques y la memoria depende del número de cursos, no de fracciones.
+
+Columnas de entrada (CSV o Parquet, una fila por fracción):
+    patient           identificador del paciente (obligatorio)
+    course            identificador del curso (por defecto "1")
+    dose              dosis física de la fracción en Gy (0 = fracción no administrada)
+    organ | ab        órgano de clinical_data y/o α/β explícito (uno de los dos)
+    lql               corrección LQL de esa fracción (1/true/yes)
+    date              fecha de administración (opcional): da el tiempo total del curso y,
+                      si el órgano tiene parámetros de repoblación, la pérdida de BED
+
+Uso:
+    python -m radcomp.delivery records.csv [-o courses.csv] [--chunk-rows 500000]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from radcomp.cohort import _ORGAN_AB, _check, _flag, _numeric, _row, _text, read_chunks
+from radcomp.engine import clinical_data
+from radcomp.plan import check_schedule, tissue_columns
+from radcomp.repair import apply_repopulation, repopulation_bed
+from radcomp.vectorized import biology_calculation_batch
+
+CHUNK_ROWS = 500_000
+DAY = pd.Timedelta(days=1)
+EPOCH = pd.Timestamp(0)
+
+# Reducción de cada columna parcial al combinar grupos
+_SUM_COLUMNS = ("fractions", "lql_fractions", "total_dose", "bed")
+_MIN_COLUMNS = ("ab_min", "first_day")
+_MAX_COLUMNS = ("ab_max", "max_dose", "last_day")
+
+RESULT_FIELDS = [
+    "patient", "course", "organ", "ab", "fractions", "total_dose",
+    "mean_dose_per_fraction", "max_dose_per_fraction",
+    "bed", "eqd2", "uniform_bed", "uniform_eqd2",
+    "start_date", "end_date", "overall_time", "repopulation_bed",
+]
+
+
+def _reduce(patient, course, organ, columns: dict):
+    """
+    Reduce las columnas por (patient, course) con sumas / mínimos / máximos vectorizados.
+    El órgano de cada grupo es el de su primera fila. Devuelve el DataFrame de parciales.
+    """
+    # Clave entera (paciente, curso): evita construir tuplas de cadenas
+    patient_codes, patients = pd.factorize(patient)
+    course_codes, courses = pd.factorize(course)
+    codes, keys = pd.factorize(patient_codes.astype(np.int64) * len(courses) + course_codes)
+    n = len(keys)
+    # factorize numera los grupos por orden de aparición: el primer índice de cada código
+    first = np.unique(codes, return_index=True)[1]
+    reduced = {
+        "patient": np.asarray(patients)[keys // len(courses)],
+        "course": np.asarray(courses)[keys % len(courses)],
+        "organ": np.asarray(organ)[first],
+    }
+    for name, values in columns.items():
+        if name in _SUM_COLUMNS:
+            reduced[name] = np.bincount(codes, weights=values, minlength=n)
+        else:
+            out = np.full(n, np.nan)  # fmin / fmax ignoran NaN (fracciones sin fecha)
+            (np.fmin if name in _MIN_COLUMNS else np.fmax).at(out, codes, values)
+            reduced[name] = out
+    return pd.DataFrame(reduced)
+
+
+def aggregate_chunk(chunk: pd.DataFrame):
+    """
+    BED de cada fracción del bloque (LQ/LQL con su dosis) y parciales por paciente y curso.
+    Los errores indican el número de registro según el índice del bloque.
+    """
+    if "patient" not in chunk:
+        raise ValueError("missing column 'patient'")
+    patient = _text(chunk, "patient", "")
+    if (patient == "").any():
+        raise ValueError(f"row {_row(chunk, (patient == '').to_numpy())}: missing value for 'patient'")
+    course = _text(chunk, "course", "1")
+    organ = _text(chunk, "organ", "")
+    _check(chunk, organ, set(clinical_data) | {""}, "organ")
+    ab_override = _numeric(chunk, "ab", np.nan)
+    ab = np.where(np.isnan(ab_override), organ.map(_ORGAN_AB).to_numpy(dtype=np.float64), ab_override)
+    if np.isnan(ab).any():
+        raise ValueError(f"row {_row(chunk, np.isnan(ab))}: needs 'ab' or 'organ'")
+    check_schedule({"ab": ab}, locate=lambda mask: f"row {_row(chunk, mask)}")
+
+    dose = _numeric(chunk, "dose")
+    if (dose < 0).any():
+        raise ValueError(f"row {_row(chunk, dose < 0)}: 'dose' must be ≥ 0")
+    lql = _flag(chunk, "lql")
+    if "date" in chunk:
+        dates = pd.to_datetime(chunk["date"], errors="coerce")
+        invalid = dates.isna().to_numpy() & chunk["date"].notna().to_numpy()
+        if invalid.any():
+            raise ValueError(f"row {_row(chunk, invalid)}: invalid date '{chunk['date'].iloc[np.flatnonzero(invalid)[0]]}'")
+        day = ((dates - EPOCH) / DAY).to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        day = np.full(len(chunk), np.nan)
+
+    # Cada fracción es un "curso" de una fracción: LQ/LQL con su propia dosis
+    bed, _, _ = biology_calculation_batch(dose, 1.0, ab, lql)
+    delivered = (dose > 0).astype(np.float64)
+    return _reduce(patient.to_numpy(), course.to_numpy(), organ.to_numpy(), {
+        "fractions": delivered,
+        "lql_fractions": lql * delivered,
+        "total_dose": dose,
+        "bed": bed,
+        "max_dose": dose,
+        "ab_min": ab,
+        "ab_max": ab,
+        "first_day": day,
+        "last_day": day,
+    })
+
+
+def combine(partials):
+    """
+    Combina parciales de varios bloques (el mismo curso puede aparecer en varios).
+    """
+    frame = pd.concat(partials, ignore_index=True)
+    columns = {name: frame[name].to_numpy() for name in _SUM_COLUMNS + _MIN_COLUMNS + _MAX_COLUMNS}
+    return _reduce(frame["patient"].to_numpy(), frame["course"].to_numpy(), frame["organ"].to_numpy(), columns)
+
+
+def finalize(partial: pd.DataFrame):
+    """
+    Resultados por curso a partir de los parciales combinados: BED/EQD2 fracción a fracción,
+    el BED del esquema uniforme equivalente (misma dosis total y número de fracciones) y,
+    con fechas, el tiempo total y la pérdida por repoblación del órgano.
+    """
+    mixed = ~np.isclose(partial["ab_min"].to_numpy(), partial["ab_max"].to_numpy())
+    if mixed.any():
+        i = np.flatnonzero(mixed)[0]
+        raise ValueError(f"patient {partial['patient'].iloc[i]!r} course {partial['course'].iloc[i]!r}: "
+                         "fractions with different α/β values")
+
+    ab = partial["ab_min"].to_numpy()
+    fractions = partial["fractions"].to_numpy()
+    total_dose = partial["total_dose"].to_numpy()
+    overall_time = partial["last_day"].to_numpy() - partial["first_day"].to_numpy()
+
+    _, alpha, tk, tpot = tissue_columns([o or None for o in partial["organ"]])
+    loss = np.where(np.isnan(overall_time), 0.0, repopulation_bed(np.nan_to_num(overall_time), alpha, tk, tpot))
+    bed, eqd2 = apply_repopulation(partial["bed"].to_numpy(), ab, loss)
+    uniform_bed, _, _ = biology_calculation_batch(total_dose, fractions, ab, partial["lql_fractions"].to_numpy() > 0)
+    uniform_bed, uniform_eqd2 = apply_repopulation(uniform_bed, ab, loss)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_dose = np.where(fractions > 0, total_dose / fractions, 0.0)
+    return pd.DataFrame({
+        "patient": partial["patient"],
+        "course": partial["course"],
+        "organ": partial["organ"],
+        "ab": ab,
+        "fractions": fractions.astype(np.int64),
+        "total_dose": total_dose,
+        "mean_dose_per_fraction": mean_dose,
+        "max_dose_per_fraction": partial["max_dose"].to_numpy(),
+        "bed": bed,
+        "eqd2": eqd2,
+        "uniform_bed": uniform_bed,
+        "uniform_eqd2": uniform_eqd2,
+        "start_date": EPOCH + pd.to_timedelta(partial["first_day"], unit="D"),
+        "end_date": EPOCH + pd.to_timedelta(partial["last_day"], unit="D"),
+        "overall_time": overall_time,
+        "repopulation_bed": loss,
+    })
+
+
+def aggregate_frame(frame: pd.DataFrame):
+    """
+    Resultados por curso de un DataFrame de fracciones que cabe en memoria.
+    """
+    return finalize(aggregate_chunk(frame))
+
+
+def aggregate_records(path, chunk_rows: int = CHUNK_ROWS, delimiter: str = ",", log=None):
+    """
+    Lee los registros por bloques y devuelve los resultados por paciente y curso.
+    En memoria solo hay un bloque y los parciales (una fila por curso).
+    """
+    started = time.perf_counter()
+    partial = None
+    rows = 0
+    for index, chunk in enumerate(read_chunks(path, chunk_rows, delimiter)):
+        current = aggregate_chunk(chunk)
+        partial = current if partial is None else combine([partial, current])
+        rows += len(chunk)
+        if log:
+            log(f"chunk {index} done ({rows} fractions, {len(partial)} courses, "
+                f"{time.perf_counter() - started:.1f} s)")
+    if partial is None:
+        raise ValueError(f"{path}: no fraction records")
+    return finalize(partial)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="radcomp.delivery",
+        description="Fraction-by-fraction BED/EQD2 per patient and course from delivered treatment records.",
+    )
+    parser.add_argument("input", help="Fraction records (.csv or .parquet), one row per delivered fraction")
+    parser.add_argument("--output", "-o", help="Output file (.csv or .parquet; default: CSV to stdout)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help=f"Rows per chunk (default {CHUNK_ROWS})")
+    parser.add_argument("--delimiter", default=",", help="CSV field delimiter (default ',')")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Do not log progress to stderr")
+    args = parser.parse_args(argv)
+
+    try:
+        results = aggregate_records(
+            args.input, args.chunk_rows, args.delimiter,
+            log=None if args.quiet else lambda message: print(message, file=sys.stderr),
+        )
+        if args.output is None:
+            results.to_csv(sys.stdout, index=False, lineterminator="\n")
+        elif str(args.output).lower().endswith((".parquet", ".pq")):
+            results.to_parquet(args.output, index=False)
+        else:
+            results.to_csv(args.output, index=False)
+    except (OSError, ValueError) as exc:
+        parser.exit(2, f"radcomp.delivery: error: {exc}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
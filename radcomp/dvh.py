@@ -0,0 +1,201 @@
+"""
+Evaluación de restricciones clínicas a partir de DVHs convertidos a EQD2.
+Cada bin de dosis física se convierte a EQD2 (LQ/LQL) y se calcula la métrica que
+corresponde al limit_type del órgano: Dmean, D0.03cc (Dmax / Surrogate) o Vx.
+
+Formato CSV (formato largo, un bin por fila, volumen en cc):
+    structure,dose,volume
+    Spinal Cord,0.0,12.4
+    ...
+
+Uso:
+    python -m radcomp.dvh plan_dvh.csv --fractions 25 [--cumulative] [--map "Cord PRV=Spinal Cord"]
+"""
+import argparse
+import csv
+import re
+import sys
+
+import numpy as np
+
+from radcomp.engine import clinical_data, tolerance_verdict
+from radcomp.vectorized import biology_calculation_batch
+
+NEAR_MAX_CC = 0.03  # Volumen para la dosis "casi máxima" D0.03cc
+
+RESULT_FIELDS = [
+    "structure", "organ", "ab", "limit_type", "metric", "value", "limit",
+    "ratio", "verdict", "eqd2_mean", "eqd2_near_max",
+]
+
+
+def load_dvh_csv(path, delimiter=","):
+    """
+    Lee un CSV de DVHs en formato largo (structure, dose, volume).
+    Devuelve un dict structure -> (dose, volume) con los bins ordenados por dosis.
+    """
+    rows = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter=delimiter):
+            rows.setdefault(row["structure"].strip(), []).append((float(row["dose"]), float(row["volume"])))
+
+    dvhs = {}
+    for structure, bins in rows.items():
+        data = np.array(bins, dtype=np.float64)
+        data = data[np.argsort(data[:, 0], kind="stable")]
+        dvhs[structure] = (data[:, 0], data[:, 1])
+    return dvhs
+
+
+def _stack(dvhs: dict, cumulative: bool):
+    """
+    Empaqueta los DVHs en matrices (estructuras x bins) rellenas con volumen 0.
+    Los DVHs acumulados se pasan a diferenciales: dv_i = V_i - V_(i+1).
+    """
+    n_bins = max(len(dose) for dose, _ in dvhs.values())
+    dose = np.zeros((len(dvhs), n_bins))
+    dv = np.zeros((len(dvhs), n_bins))
+    for i, (d, v) in enumerate(dvhs.values()):
+        dose[i, :len(d)] = d
+        dose[i, len(d):] = d[-1] if len(d) else 0.0
+        if cumulative:
+            dv[i, :len(v)] = v - np.append(v[1:], 0.0)
+        else:
+            dv[i, :len(v)] = v
+    return dose, dv
+
+
+def _limit_metric(limit_type: str):
+    """
+    Métrica de DVH asociada a cada limit_type.
+    """
+    if limit_type == "Dmean":
+        return "Dmean"
+    if limit_type in ("Dmax", "Surrogate"):
+        return f"D{NEAR_MAX_CC}cc"
+    if re.fullmatch(r"V\d+(\.\d+)?", limit_type):
+        return limit_type
+    return None
+
+
+def convert_dvhs(dvhs: dict, fractions: int, use_lql: bool = False, cumulative: bool = False,
+                 organ_map: dict = None, ab: dict = None):
+    """
+    Empaqueta los DVHs y convierte cada bin a EQD2 en una sola llamada vectorizada.
+    Devuelve (structures, organs, ab_values, eqd2, dv) con eqd2 y dv de forma (estructuras x bins).
+    """
+    organ_map = organ_map or {}
+    ab = ab or {}
+    structures = list(dvhs)
+    organs = [organ_map.get(s, s) for s in structures]
+    for structure, organ in zip(structures, organs):
+        if organ not in clinical_data:
+            raise ValueError(f"structure '{structure}' has no clinical_data entry (use organ_map)")
+
+    ab_values = np.array([ab.get(s, clinical_data[o]["ab"]) for s, o in zip(structures, organs)])
+    dose, dv = _stack(dvhs, cumulative)
+
+    # EQD2 de cada bin (el EQD2 es monótono en la dosis, el orden de los bins se conserva)
+    _, eqd2, _ = biology_calculation_batch(dose, fractions, ab_values[:, None], use_lql)
+    return structures, organs, ab_values, eqd2, dv
+
+
+def evaluate_dvh_constraints(dvhs: dict, fractions: int, use_lql: bool = False,
+                             cumulative: bool = False, organ_map: dict = None, ab: dict = None):
+    """
+    Evalúa todas las estructuras de un plan en una sola pasada vectorizada.
+
+    dvhs: dict structure -> (dose, volume) con dosis física total (Gy) y volumen en cc.
+    organ_map: dict structure -> órgano de clinical_data (por defecto el mismo nombre).
+    ab: dict structure -> α/β para sobrescribir el valor de clinical_data.
+
+    Dmean → EQD2 medio; Dmax/Surrogate → D0.03cc en EQD2;
+    Vx → volumen con EQD2 ≥ x Gy (en % o en cc según "volume_unit") comparado con "volume_limit".
+    Devuelve una lista de dicts (una fila por estructura) con los campos de RESULT_FIELDS.
+    """
+    structures, organs, ab_values, eqd2, dv = convert_dvhs(dvhs, fractions, use_lql, cumulative, organ_map, ab)
+
+    total = dv.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eqd2_mean = (eqd2 * dv).sum(axis=1) / total
+
+    # D0.03cc: mayor EQD2 cuyo volumen acumulado (≥ ese bin) es ≥ 0.03 cc
+    above = np.cumsum(dv[:, ::-1], axis=1)[:, ::-1]
+    rows = np.arange(len(structures))
+    idx = (above >= NEAR_MAX_CC).sum(axis=1) - 1
+    # Si el volumen total es < 0.03 cc se usa el bin más alto con volumen
+    last = dv.shape[1] - 1 - np.argmax(dv[:, ::-1] > 0, axis=1)
+    near_max = eqd2[rows, np.where(idx >= 0, idx, last)]
+
+    results = []
+    for i, (structure, organ) in enumerate(zip(structures, organs)):
+        entry = clinical_data[organ]
+        metric = _limit_metric(entry["limit_type"])
+        limit = entry["limit"]
+
+        if metric == "Dmean":
+            value = eqd2_mean[i]
+        elif metric is None or metric.startswith("D"):
+            value = near_max[i]
+        else:
+            x = float(metric[1:])
+            value = dv[i, eqd2[i] >= x].sum()  # cc
+            if entry.get("volume_unit", "%") == "%":
+                value = 100.0 * value / total[i] if total[i] > 0 else 0.0
+            limit = entry.get("volume_limit")
+
+        ratio, verdict = tolerance_verdict(float(value), limit) if metric else (None, None)
+        results.append({
+            "structure": structure,
+            "organ": organ,
+            "ab": float(ab_values[i]),
+            "limit_type": entry["limit_type"],
+            "metric": metric,
+            "value": float(value) if metric else None,
+            "limit": limit if metric else None,
+            "ratio": ratio,
+            "verdict": verdict,
+            "eqd2_mean": float(eqd2_mean[i]),
+            "eqd2_near_max": float(near_max[i]),
+        })
+    return results
+
+
+def _pair(text):
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{text}'")
+    return key.strip(), value.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="radcomp.dvh",
+        description="EQD2 DVH constraint evaluation (Dmean, D0.03cc, Vx) against clinical_data limits.",
+    )
+    parser.add_argument("dvh", help="Long-format DVH CSV (structure, dose, volume in cc)")
+    parser.add_argument("--fractions", type=int, required=True, help="Number of fractions")
+    parser.add_argument("--cumulative", action="store_true", help="Volumes are cumulative (default: differential)")
+    parser.add_argument("--lql", action="store_true", help="Apply the LQL correction (Astrahan 2008)")
+    parser.add_argument("--map", type=_pair, action="append", default=[],
+                        help="STRUCTURE=ORGAN mapping to clinical_data (repeatable)")
+    parser.add_argument("--ab", type=_pair, action="append", default=[],
+                        help="STRUCTURE=AB alpha/beta override (repeatable)")
+    args = parser.parse_args(argv)
+
+    try:
+        results = evaluate_dvh_constraints(
+            load_dvh_csv(args.dvh), args.fractions, use_lql=args.lql, cumulative=args.cumulative,
+            organ_map=dict(args.map), ab={k: float(v) for k, v in args.ab},
+        )
+    except (ValueError, KeyError, OSError) as exc:
+        parser.exit(2, f"radcomp.dvh: error: {exc}\n")
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=RESULT_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+"""
+Motor de cálculo de RadComp (sin Streamlit ni Plotly).
+Contiene la base de datos clínica y las funciones escalares usadas por main.py y por la CLI.
+"""
+from radcomp.constraints import load_database
+
+# 2. International Clinical Database (QUANTEC & Global References)
+# ===============================================================
+# Las restricciones viven en radcomp/data/constraints.json (versionado, con esquema);
+# ver radcomp.constraints. clinical_data conserva el formato histórico por órgano:
+# α/β, fuente y el límite por defecto.
+#
+# Valores para variable limit type
+# ===================================================================
+# "Dmax"          → dosis máxima puntual
+# "Dmean"         → dosis media
+# "Vx"            → volumen que recibe ≥ x Gy
+# "Surrogate"     → aproximación BED/EQD2 de una métrica no BED
+# "None"          → no aplica (α/β only)
+#
+# "volume_limit" (opcional, solo Vx) → % máximo de volumen que puede recibir ≥ x Gy
+# ====================================================================
+
+clinical_data = load_database().clinical_data()
+
+# variable de penalizacion para tener en cuenta la superposicion de zonas de dosis
+overlap_penalty = {
+    "None": 0.0,
+    "Partial": 0.15,
+    "High": 0.30
+}
+
+
+# -------------------------------------------------------------------------
+# Helper functions
+# -------------------------------------------------------------------------
+def biology_calculation(total_dose: float, fractions: int, ab: float, use_lql: bool = False, g: float = 1.0):
+    """
+    Calcula BED y EQD2 con validación de seguridad.
+    Soporta corrección LQL (Astrahan 2008) para dosis altas si use_lql=True.
+    g es el factor de Lea-Catcheside de reparación incompleta durante la fracción
+    (1.0 = fracción instantánea); multiplica solo los términos cuadráticos.
+    """
+    if fractions <= 0 or ab <= 0:
+        return 0.0, 0.0, 0.0
+
+    d = total_dose / fractions  # Dosis por fracción
+
+    # --- MODELO LQL (Linear-Quadratic-Linear) ---
+    # Astrahan (2008): El umbral de transición (dT) es 2 * (alpha/beta)
+    dt = 2 * ab
+
+    if use_lql and d > dt:
+        # Corrección para altas dosis (SBRT/SRS)
+        # Parte A: Contribución hasta el umbral (Curva LQ)
+        term_hq = dt * (1 + (g * (dt / ab)))
+
+        # Parte B: Contribución lineal más allá del umbral
+        term_lin = (d - dt) * (1 + (g * ((2 * dt) / ab)))
+
+        # BED por fracción sumando ambas partes
+        bed_per_frac = term_hq + term_lin
+        bed = bed_per_frac * fractions
+    else:
+        # --- MODELO LQ ESTÁNDAR (Clásico) ---
+        bed = total_dose * (1 + (g * (d / ab)))
+
+    # Cálculo de EQD2 (Normalizado a 2Gy por fracción)
+    # Se usa la fórmula estándar derivada del BED calculado
+    eqd2 = bed / (1 + (2 / ab))
+
+    return bed, eqd2, d
+
+
+def recovery_factor(months):
+    if months < 6:
+        return 0.0
+    elif months < 12:
+        return 0.25
+    elif months < 24:
+        return 0.50
+    else:
+        return 0.65
+
+
+def eqd2_from_bed(bed: float, ab: float):
+    """
+    Convierte BED a EQD2 (normalizado a 2 Gy por fracción).
+    """
+    return bed / (1 + (2 / ab))
+
+
+def cumulative_bed(bed_a: float, bed_b: float, rec: float = 0.0, overlap: str = "None",
+                   overlap_application: str = "cumulative", has_overlap_risk: bool = True):
+    """
+    BED acumulado de re-irradiación (RT1 + RT2).
+    Aplica la recuperación biológica a RT1 y la penalización por solapamiento
+    ("cumulative" penaliza la suma, "rt1_only" solo el remanente de RT1).
+    Devuelve (effective_bed_a, bed_cumulative).
+    """
+    effective_bed_a = bed_a * (1 - rec)
+
+    # Solo existe riesgo biológico por solapamiento si AMBAS dosis son > 0
+    if overlap != "None" and has_overlap_risk:
+        penalty_factor = 1 + overlap_penalty[overlap]
+
+        if overlap_application == "cumulative":
+            # Modelo conservador: penaliza la suma total
+            bed_cumulative = (effective_bed_a + bed_b) * penalty_factor
+        else:
+            # Modelo estándar: penaliza solo la dosis remanente de RT1
+            bed_cumulative = (effective_bed_a * penalty_factor) + bed_b
+    else:
+        # Si una dosis es 0 o el usuario eligió "None", no se aplica penalización
+        bed_cumulative = effective_bed_a + bed_b
+
+    return effective_bed_a, bed_cumulative
+
+
+def tolerance_verdict(eqd2_cumulative: float, limit):
+    """
+    Compara el EQD2 acumulado con el límite de referencia.
+    Devuelve (ratio, verdict) con verdict en "within" (< 0.9), "borderline" (< 1.0) o "above".
+    Si no hay límite devuelve (None, None).
+    """
+    if limit is None:
+        return None, None
+
+    ratio = eqd2_cumulative / limit
+    if ratio < 0.9:
+        return ratio, "within"
+    elif ratio < 1.0:
+        return ratio, "borderline"
+    else:
+        return ratio, "above"
@@ -0,0 +1,37 @@
+"""
+Mallas precalculadas de EQD2 sobre (dosis por fracción, número de fracciones).
+Se calculan vectorizadas y se guardan en caché por (α/β, modelo, resolución).
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from radcomp.vectorized import biology_calculation_batch
+
+
+@lru_cache(maxsize=64)
+def eqd2_grid(ab: float, use_lql: bool = False, d_max: float = 20.0, n_max: int = 40, d_points: int = 160):
+    """
+    EQD2 para d en (0, d_max] (d_points valores) y N = 1..n_max.
+    Devuelve (d_values, n_values, eqd2) con eqd2 de forma (n_max, d_points),
+    en float32 para reducir el tamaño enviado al navegador. Arrays de solo lectura.
+    """
+    d_values = np.linspace(d_max / d_points, d_max, d_points)
+    n_values = np.arange(1, n_max + 1)
+    _, eqd2, _ = biology_calculation_batch(
+        d_values[None, :] * n_values[:, None], n_values[:, None], ab, use_lql
+    )
+    eqd2 = eqd2.astype(np.float32)
+
+    for values in (d_values, n_values, eqd2):
+        values.setflags(write=False)  # Resultado compartido por la caché
+    return d_values, n_values, eqd2
+
+
+def grid_d_max(*doses_per_fraction, minimum: float = 20.0, step: float = 5.0):
+    """
+    Límite del eje de dosis por fracción: cubre los esquemas actuales y se redondea
+    a múltiplos de `step` para reutilizar la caché al mover las entradas.
+    """
+    d = max([minimum, *doses_per_fraction])
+    return float(np.ceil(d * 1.2 / step) * step)
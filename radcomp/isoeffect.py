@@ -0,0 +1,77 @@
+"""
+Solución inversa de isoefecto: dosis total que, en N fracciones, produce un BED/EQD2 objetivo.
+Usa las mismas reglas LQ/LQL que biology_calculation.
+
+LQ:   BED/N = d (1 + d / ab)                 → d = 2 (BED/N) / (1 + sqrt(1 + 4 BED / (N ab)))
+LQL:  BED/N = 3 dT + 5 (d - dT), si d > dT   → d = dT + (BED/N - 3 dT) / 5
+      (con dT = 2 ab, dT / ab = 2 y 2 dT / ab = 4, por lo que el tramo LQL es lineal en d)
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from radcomp.vectorized import biology_calculation_batch
+
+MAX_FRACTIONS = 40
+
+
+def dose_per_fraction_for_bed(target_bed, fractions, ab, use_lql=False):
+    """
+    Dosis por fracción que produce target_bed en `fractions` fracciones (vectorizado, forma cerrada).
+    Devuelve 0.0 donde target_bed <= 0, fractions <= 0 o ab <= 0.
+    """
+    target_bed = np.asarray(target_bed, dtype=np.float64)
+    fractions = np.asarray(fractions, dtype=np.float64)
+    ab = np.asarray(ab, dtype=np.float64)
+    use_lql = np.asarray(use_lql, dtype=bool)
+    valid = (target_bed > 0) & (fractions > 0) & (ab > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bed_per_fraction = target_bed / fractions
+
+        # --- MODELO LQ: raíz positiva de d^2 / ab + d - BED/N = 0 (forma estable) ---
+        d = 2 * bed_per_fraction / (1 + np.sqrt(1 + 4 * bed_per_fraction / ab))
+
+        # --- MODELO LQL: tramo lineal cuando el BED por fracción supera el de d = dT ---
+        dt = 2 * ab
+        bed_at_dt = dt * (1 + (dt / ab))
+        d_lql = dt + (bed_per_fraction - bed_at_dt) / (1 + ((2 * dt) / ab))
+        d = np.where(use_lql & (bed_per_fraction > bed_at_dt), d_lql, d)
+
+    return np.where(valid, d, 0.0)
+
+
+@lru_cache(maxsize=256)
+def _table(target_bed: float, ab: float, use_lql: bool, max_fractions: int):
+    fractions = np.arange(1, max_fractions + 1, dtype=np.float64)
+    d = dose_per_fraction_for_bed(target_bed, fractions, ab, use_lql)
+    total_dose = d * fractions
+    # BED/EQD2 recalculados con el modelo directo para comprobar el isoefecto
+    bed, eqd2, _ = biology_calculation_batch(total_dose, fractions, ab, use_lql)
+    lql_region = use_lql & (d > 2 * ab)
+
+    columns = (fractions.astype(np.int64), d, total_dose, bed, eqd2, lql_region)
+    for values in columns:
+        values.setflags(write=False)  # Resultado compartido por la caché
+    return columns
+
+
+def fractionation_table(target: float, ab: float, use_lql: bool = False, target_type: str = "EQD2",
+                        max_fractions: int = MAX_FRACTIONS):
+    """
+    Tabla isoefectiva para 1..max_fractions fracciones.
+    target es un EQD2 (por defecto) o un BED (target_type="BED") en Gy.
+    Se calcula una sola vez por (objetivo, α/β, modelo) y se guarda en caché.
+
+    Devuelve un dict de arrays: fractions, dose_per_fraction, total_dose, bed, eqd2, lql_region.
+    """
+    if target_type == "EQD2":
+        target_bed = target * (1 + (2 / ab)) if ab > 0 else 0.0
+    elif target_type == "BED":
+        target_bed = target
+    else:
+        raise ValueError(f"unknown target_type '{target_type}'")
+
+    columns = _table(float(target_bed), float(ab), bool(use_lql), int(max_fractions))
+    keys = ("fractions", "dose_per_fraction", "total_dose", "bed", "eqd2", "lql_region")
+    return dict(zip(keys, columns))
@@ -0,0 +1,220 @@
+"""
+Instrumentación de tiempos por sección y por rerun de la página.
+
+Se activa con variables de entorno (desactivada, cada llamada es prácticamente gratuita):
+    RADCOMP_METRICS=1               activa la medición
+    RADCOMP_METRICS_FILE=path       exporta a archivo (.json o texto Prometheus), como máximo cada 5 s
+                                    y una última vez al salir
+    RADCOMP_METRICS_PORT=9464       sirve /metrics (Prometheus) y /metrics.json en localhost
+
+Uso:
+    with metrics.section("figure"):
+        ...
+    started = metrics.start()
+    ...
+    metrics.stop("rerun", started)
+"""
+import atexit
+import bisect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext, suppress
+
+ENABLED = os.environ.get("RADCOMP_METRICS", "").lower() in {"1", "true", "yes", "on"}
+EXPORT_FILE = os.environ.get("RADCOMP_METRICS_FILE")
+EXPORT_INTERVAL = 5.0  # Segundos mínimos entre escrituras del archivo
+
+# Límites superiores (s) de los buckets del histograma
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_export_lock = threading.Lock()  # Aparte de _lock: export() llama a snapshot()
+_timings = {}   # name -> {"count", "sum", "max", "buckets"}
+_counters = {}  # name -> int
+_last_export = 0.0
+
+
+def _record(name: str, seconds: float):
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = _timings[name] = {"count": 0, "sum": 0.0, "max": 0.0, "buckets": [0] * (len(BUCKETS) + 1)}
+        stats["count"] += 1
+        stats["sum"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+
+class _Section:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def section(name: str):
+    """
+    Context manager que mide una sección (no hace nada si la medición está desactivada).
+    """
+    return _Section(name) if ENABLED else _NOOP
+
+
+def start():
+    """
+    Marca de inicio para bloques largos; None si la medición está desactivada.
+    """
+    return time.perf_counter() if ENABLED else None
+
+
+def stop(name: str, started):
+    """
+    Registra la duración desde `start()` y exporta si corresponde.
+    """
+    if started is None:
+        return
+    _record(name, time.perf_counter() - started)
+    if EXPORT_FILE:
+        _export_file()
+
+
+def _export_file(force: bool = False):
+    # Un fallo de la exportación no debe llegar a la página: se informa por stderr
+    try:
+        export(EXPORT_FILE, force)
+    except OSError as exc:
+        print(f"radcomp.metrics: export to {EXPORT_FILE} failed: {exc}", file=sys.stderr)
+
+
+def count(name: str, n: int = 1):
+    """
+    Incrementa un contador (p. ej. sesiones nuevas).
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot():
+    """
+    Copia de las métricas actuales como dict serializable.
+    """
+    with _lock:
+        timings = {
+            name: {**stats, "buckets": list(stats["buckets"])} for name, stats in _timings.items()
+        }
+        counters = dict(_counters)
+    return {"bucket_bounds": list(BUCKETS), "timings": timings, "counters": counters}
+
+
+def prometheus_text():
+    """
+    Métricas en formato de exposición de texto de Prometheus.
+    """
+    data = snapshot()
+    lines = [
+        "# HELP radcomp_section_seconds Duration of instrumented page sections and reruns.",
+        "# TYPE radcomp_section_seconds histogram",
+    ]
+    for name, stats in sorted(data["timings"].items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS, stats["buckets"]):
+            cumulative += n
+            lines.append(f'radcomp_section_seconds_bucket{{section="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'radcomp_section_seconds_bucket{{section="{name}",le="+Inf"}} {stats["count"]}')
+        lines.append(f'radcomp_section_seconds_sum{{section="{name}"}} {stats["sum"]}')
+        lines.append(f'radcomp_section_seconds_count{{section="{name}"}} {stats["count"]}')
+    lines.append("# HELP radcomp_section_seconds_max Slowest observed duration per section.")
+    lines.append("# TYPE radcomp_section_seconds_max gauge")
+    for name, stats in sorted(data["timings"].items()):
+        lines.append(f'radcomp_section_seconds_max{{section="{name}"}} {stats["max"]}')
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"# TYPE radcomp_{name}_total counter")
+        lines.append(f"radcomp_{name}_total {value}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path: str, force: bool = False):
+    """
+    Escribe las métricas en `path` (JSON si termina en .json, si no texto Prometheus).
+    Sin force, como máximo una escritura cada EXPORT_INTERVAL segundos. Las sesiones
+    exportan de una en una y cada escritura usa su propio temporal.
+    """
+    global _last_export
+    with _export_lock:
+        now = time.monotonic()
+        if not force and now - _last_export < EXPORT_INTERVAL:
+            return
+        _last_export = now
+
+        text = json.dumps(snapshot(), indent=2) if str(path).endswith(".json") else prometheus_text()
+        directory, name = os.path.split(os.path.abspath(path))
+        f = tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=directory, prefix=f".{name}.", suffix=".tmp", delete=False
+        )
+        try:
+            with f:
+                f.write(text)
+            os.replace(f.name, path)  # Escritura atómica para el lector externo
+        except OSError:
+            with suppress(FileNotFoundError):  # El temporal no debe quedar en el directorio
+                os.unlink(f.name)
+            raise
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """
+    Sirve /metrics (Prometheus) y /metrics.json en un hilo de fondo.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = prometheus_text(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass  # Sin registro de cada petición
+
+        def log_error(self, format, *args):
+            print(f"radcomp.metrics: {self.address_string()}: {format % args}", file=sys.stderr)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="radcomp-metrics", daemon=True).start()
+    return server
+
+
+# El módulo se importa una vez por proceso: el servidor se arranca una sola vez
+if ENABLED and os.environ.get("RADCOMP_METRICS_PORT"):
+    try:
+        serve(int(os.environ["RADCOMP_METRICS_PORT"]))
+    except OSError as exc:  # Puerto ocupado (p. ej. otro proceso ya expone las métricas)
+        print(f"radcomp.metrics: cannot serve on port {os.environ['RADCOMP_METRICS_PORT']}: {exc}", file=sys.stderr)
+
+# La limitación a una escritura cada EXPORT_INTERVAL puede dejar fuera los últimos reruns
+if ENABLED and EXPORT_FILE:
+    atexit.register(_export_file, True)
@@ -0,0 +1,233 @@
+"""
+Registro de modelos radiobiológicos de dosis-efecto con núcleos BED vectorizados.
+
+Cada modelo aporta el esquema de sus parámetros y un núcleo
+kernel(total_dose, fractions, d, ab, g, **params) -> (BED, región, α/β del EQD2) con el BED
+total donde el modelo se aparta de LQ con el α/β del tejido (región booleana; None = en ningún
+punto) y el α/β con el que se normaliza su EQD2 (None = el del tejido). La base LQ se calcula
+una sola vez y cada modelo solo sustituye sus elementos (LQL y LQ-L, su tramo de dosis altas;
+un modelo con curva propia, como USC, devuelve región = True). Todos los caminos por lotes (biology_calculation_batch) despachan
+a través del registro por código de modelo por elemento: no hay ramas de Python por modelo
+en el cálculo y varios modelos se evalúan sobre los mismos arrays en una sola pasada.
+
+Modelos incluidos (g = factor G de reparación incompleta, solo en los términos cuadráticos):
+    "lq"    LQ estándar                       BED = D (1 + g d / ab)
+    "lql"   LQL de Astrahan (2008)            lineal por encima de dT = 2 α/β (tangente a LQ)
+    "lq_l"  LQ-L (Guerrero y Li 2004)         como LQL con una dosis de transición dT propia del tejido
+    "usc"   Universal Survival Curve (Park 2008): LQ hasta D_T = 2 Dq / (1 − α D0) y, por encima,
+            curva multidiana lineal  BED/fracción = (d − Dq) / (α D0). Es una curva propia: su
+            parte LQ usa el α/β que fijan sus parámetros, (α/β)_USC = 4 α D0 Dq / (1 − α D0)²
+            (tangente en D_T), también para el EQD2; el α/β del tejido no interviene
+
+Se pueden registrar modelos propios con register_bed_model.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+BEDModel = namedtuple("BEDModel", ["kernel", "params", "label"])
+
+
+def _param(value, default):
+    # None o NaN = valor por defecto del modelo (p. ej. dT = 2 α/β)
+    if value is None:
+        return default
+    value = np.asarray(value, dtype=np.float64)
+    return np.where(np.isnan(value), default, value) if np.isnan(value).any() else value
+
+
+def _instant(g):
+    return np.ndim(g) == 0 and g == 1.0  # Caso habitual: sin multiplicaciones extra
+
+
+def lq_bed(total_dose, fractions, d, ab, g):
+    """
+    LQ estándar: BED = D (1 + g d / ab). Es la base común de todos los modelos.
+    """
+    bed = np.divide(d, ab, out=np.empty(d.shape))
+    if not _instant(g):
+        bed *= g
+    bed += 1
+    bed *= total_dose
+    return bed
+
+
+def lql_kernel(total_dose, fractions, d, ab, g, dt=None):
+    """
+    Continuación lineal tangente a LQ por encima de la dosis de transición dT
+    (Astrahan 2008 con dT = 2 α/β; LQ-L con dT del tejido).
+    """
+    dt = _param(dt, 2 * ab)
+    linear = np.greater(d, dt, out=np.empty(d.shape, dtype=bool))
+    if not linear.any():
+        return None, None, None
+    term_hq = dt * (1 + (g * (dt / ab)))
+    bed_lql = np.subtract(d, dt, out=np.empty(d.shape))
+    bed_lql *= 1 + (g * ((2 * dt) / ab))
+    bed_lql += term_hq
+    bed_lql *= fractions
+    return bed_lql, linear, None
+
+
+def usc_alpha_beta(alpha=0.33, d0=1.25, dq=1.8):
+    """
+    α/β de la parte LQ de la USC: β = (1 − α D0)² / (4 D0 Dq) hace la curva continua y
+    tangente en D_T (≈ 8.6 Gy con los valores por defecto de NSCLC).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 4 * alpha * d0 * dq / (1 - alpha * d0) ** 2
+
+
+def usc_kernel(total_dose, fractions, d, ab, g, alpha=None, d0=None, dq=None):
+    """
+    Universal Survival Curve (Park et al. 2008): LQ con (α/β)_USC hasta D_T = 2 Dq / (1 − α D0)
+    y BED/fracción = (d − Dq) / (α D0) por encima (valores por defecto: NSCLC, D_T ≈ 6.2 Gy).
+    Con α D0 ≥ 1 no hay tramo lineal y la curva es LQ con ese α/β.
+    """
+    alpha, d0, dq = _param(alpha, 0.33), _param(d0, 1.25), _param(dq, 1.8)
+    ab_usc = usc_alpha_beta(alpha, d0, dq)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ab_lq = np.where(alpha * d0 < 1, ab_usc, np.inf)  # Sin tramo lineal → sin término cuadrático
+        bed = lq_bed(total_dose, fractions, d, ab_lq, g)
+        linear = (d >= 2 * dq / (1 - alpha * d0)) & (alpha * d0 < 1)
+        if linear.any():
+            np.copyto(bed, fractions * (d - dq) / (alpha * d0), where=linear)
+    return bed, True, ab_lq
+
+
+# Esquema de parámetros: nombre -> (valor por defecto o None = derivado de α/β, unidad, descripción)
+BED_MODELS = {
+    "lq": BEDModel(None, {}, "LQ (standard)"),
+    "lql": BEDModel(lql_kernel, {}, "LQL (Astrahan 2008, dT = 2·α/β)"),
+    "lq_l": BEDModel(
+        lql_kernel,
+        {"dt": (None, "Gy", "Transition dose per fraction (empty = 2·α/β)")},
+        "LQ-L (tissue transition dose)",
+    ),
+    "usc": BEDModel(
+        usc_kernel,
+        {
+            "alpha": (0.33, "Gy⁻¹", "α of the LQ part"),
+            "d0": (1.25, "Gy", "D0 of the multi-target curve"),
+            "dq": (1.8, "Gy", "Quasi-threshold dose Dq"),
+        },
+        "USC (Park 2008)",
+    ),
+}
+# Los códigos 0 y 1 son LQ y LQL: use_lql (bool) es directamente el código de modelo
+LQ, LQL = 0, 1
+
+
+def register_bed_model(name: str, kernel, params: dict = None, label: str = None):
+    """
+    Registra un modelo propio: kernel(total_dose, fractions, d, ab, g, **params) ->
+    (BED, región, α/β del EQD2 o None), vectorizado. params es el esquema {nombre: (por defecto, unidad, descripción)}.
+    """
+    BED_MODELS[name] = BEDModel(kernel, dict(params or {}), label or name)
+
+
+def get_bed_model(name: str):
+    try:
+        return BED_MODELS[name]
+    except KeyError:
+        raise ValueError(f"unknown BED model '{name}'") from None
+
+
+def model_code(name: str):
+    """
+    Código entero de un modelo (posición en el registro).
+    """
+    get_bed_model(name)
+    return list(BED_MODELS).index(name)
+
+
+def model_codes(model):
+    """
+    Códigos de modelo por elemento: nombre, array de nombres, array de códigos o booleanos de LQL.
+    """
+    if isinstance(model, str):
+        return np.intp(model_code(model))
+    model = np.asarray(model)
+    if model.dtype == bool:
+        return model  # use_lql: False = LQ (0), True = LQL (1)
+    if model.dtype.kind in "iu":
+        return model.astype(np.intp)
+    names, inverse = np.unique(model, return_inverse=True)
+    return np.array([model_code(str(n)) for n in names], dtype=np.intp)[inverse].reshape(model.shape)
+
+
+def _members(codes):
+    """
+    (código, elementos) de cada modelo distinto de LQ presente; elementos = True si son todos.
+    Los booleanos de LQL se usan tal cual como máscara (sin conversión ni recuento).
+    """
+    if codes.ndim == 0:
+        return [] if codes == LQ else [(int(codes), True)]
+    if codes.dtype == bool:
+        return [(LQL, codes)] if codes.any() else []
+    present = np.flatnonzero(np.bincount(codes.ravel(), minlength=2))
+    return [(int(code), codes == code) for code in present if code != LQ]
+
+
+def bed_batch(total_dose, fractions, ab, model=LQ, g=1.0, params=None):
+    """
+    BED, EQD2 y dosis por fracción (arrays) con el modelo de cada elemento.
+    model es un nombre, un código, o un array de nombres/códigos/booleanos de LQL (broadcastable);
+    params = {nombre: valor o array} se pasa a los modelos que declaran ese parámetro.
+    Con fractions <= 0 o ab <= 0 el resultado es 0.0, como en biology_calculation.
+    """
+    total_dose = np.asarray(total_dose, dtype=np.float64)
+    fractions = np.asarray(fractions, dtype=np.float64)
+    ab = np.asarray(ab, dtype=np.float64)
+    codes = model_codes(model)
+    g = np.asarray(g, dtype=np.float64)
+    shape = np.broadcast_shapes(total_dose.shape, fractions.shape, ab.shape, codes.shape, g.shape)
+    params = params or {}
+
+    # Misma semántica que el escalar: solo se descarta si fractions <= 0 o ab <= 0 (NaN no se descarta)
+    invalid = (fractions <= 0) | (ab <= 0)
+    kernels = list(BED_MODELS.values())
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = np.divide(total_dose, fractions, out=np.empty(shape))  # Dosis por fracción
+        bed = lq_bed(total_dose, fractions, d, ab, g)
+
+        # Tramo propio de cada modelo presente, copiado solo en sus elementos
+        own_ab = []
+        for code, members in _members(codes):
+            entry = kernels[code]
+            values, region, model_ab = entry.kernel(
+                total_dose, fractions, d, ab, g, **{k: params[k] for k in entry.params if k in params}
+            )
+            if region is not None:
+                np.copyto(bed, values, where=region if members is True else region & members)
+            if model_ab is not None:
+                own_ab.append((members, model_ab))
+
+        # EQD2 normalizado a 2 Gy por fracción (con el α/β propio de los modelos que lo fijan)
+        eqd2_ab = ab
+        if own_ab:
+            eqd2_ab = np.broadcast_to(ab, shape).copy()
+            for members, model_ab in own_ab:
+                np.copyto(eqd2_ab, model_ab, where=members)
+        eqd2 = np.divide(bed, 1 + (2 / eqd2_ab), out=np.empty(shape))
+
+    if invalid.any():
+        invalid = np.broadcast_to(invalid, shape)
+        for values in (bed, eqd2, d):
+            np.copyto(values, 0.0, where=invalid)
+
+    return bed, eqd2, d
+
+
+def compare_models(total_dose, fractions, ab, models=None, g=1.0, params=None):
+    """
+    BED y EQD2 de varios modelos (por defecto todos los registrados) sobre los mismos arrays,
+    en una sola llamada: los modelos se apilan en un eje nuevo de códigos.
+    params = {parámetro: valor} se pasa a los modelos que lo declaran. Devuelve {modelo: (BED, EQD2)}.
+    """
+    models = list(models or BED_MODELS)
+    ndim = max(np.ndim(total_dose), np.ndim(fractions), np.ndim(ab), np.ndim(g))
+    codes = np.array([model_code(name) for name in models], dtype=np.intp).reshape((-1,) + (1,) * ndim)
+    bed, eqd2, _ = bed_batch(total_dose, fractions, ab, codes, g, params)
+    return {name: (bed[i], eqd2[i]) for i, name in enumerate(models)}
@@ -0,0 +1,139 @@
+"""
+Optimizador del esquema de RT2: dosis total y número de fracciones que maximizan el EQD2
+del volumen blanco manteniendo el EQD2 acumulado de todos los OARs por debajo de su límite.
+
+Cada OAR recibe en RT2 una fracción fija de la prescripción (`dose_ratio`, p. ej. la dosis
+de su métrica dividida por la del blanco en el plan) con las mismas fracciones. Para cada
+N el presupuesto de BED que le queda a cada OAR tras RT1 (recuperación y solapamiento
+incluidos) se invierte en forma cerrada LQ/LQL (radcomp.isoeffect), de modo que no hace
+falta recorrer la dosis: D_max(N) = min_OAR d_max(N) · N / dose_ratio. Como el BED del
+blanco crece con la dosis, el óptimo para cada N está en esa frontera, y el esquema
+recomendado es el de mayor EQD2 del blanco entre todas las N. La frontera se verifica
+después con la evaluación vectorizada de plan (todas las restricciones a la vez).
+
+Presupuesto de BED en RT2 (L = límite en BED, B1 = BED de RT1, rec = recuperación, p = penalización):
+    cumulative:  (B1 (1 − rec) + B2) (1 + p) ≤ L  →  B2 ≤ L / (1 + p) − B1 (1 − rec)
+    rt1_only:    B1 (1 − rec) (1 + p) + B2 ≤ L     →  B2 ≤ L − B1 (1 − rec) (1 + p)
+
+Cada OAR es un dict como en radcomp.plan ("organ" | "ab", "total_dose_a", "fractions_a",
+"lql_a", "lql_b", "interval_months", "overlap", "overlap_application") más "dose_ratio"
+(por defecto 1.0) y, opcionalmente, "limit" (EQD2 en Gy; por defecto el del órgano).
+RT2 se considera sin correcciones temporales (G = 1, sin repoblación).
+"""
+import numpy as np
+
+from radcomp.isoeffect import MAX_FRACTIONS, dose_per_fraction_for_bed
+from radcomp.plan import (
+    ab_column,
+    evaluate_arrays,
+    item_column,
+    item_time_corrections,
+    limit_column,
+    overlap_columns,
+)
+from radcomp.recovery import get_model
+from radcomp.vectorized import biology_calculation_batch
+
+# Tolerancia relativa de la verificación (redondeo de coma flotante en la inversión)
+FEASIBILITY_TOLERANCE = 1e-9
+
+
+def _oar_columns(items, overlap_application):
+    """
+    Columnas de los OARs: (ab, organs, límite EQD2, penalización, rt1_only).
+    """
+    ab, organs = ab_column(items)
+    limit = item_column(items, "limit", np.nan)
+    limit = np.where(np.isnan(limit), limit_column(organs), limit)
+    penalty, rt1_only = overlap_columns(items, overlap_application)
+    return ab, organs, limit, penalty, rt1_only
+
+
+def optimize_rt2(items: list, target_ab: float, target_lql: bool = False, max_fractions: int = MAX_FRACTIONS,
+                 recovery_model: str = "step", overlap_application: str = "cumulative",
+                 max_dose_per_fraction: float = None, dose_step: float = None):
+    """
+    Frontera factible de RT2 para 1..max_fractions fracciones y esquema de mayor EQD2 del blanco.
+    max_dose_per_fraction limita la dosis por fracción de la prescripción y dose_step redondea la
+    dosis total hacia abajo (p. ej. 0.1 Gy). Los OARs sin límite no restringen el esquema.
+
+    Devuelve un dict de arrays por número de fracciones (fractions, total_dose, dose_per_fraction,
+    target_bed, target_eqd2, binding = índice del OAR limitante o −1, feasible), las matrices
+    (OAR × fracciones) eqd2_cumulative y ratio de la verificación, y best (índice o None).
+    """
+    if not items:
+        raise ValueError("at least one OAR is required")
+    if target_ab <= 0:
+        raise ValueError("target_ab must be > 0")
+    if max_fractions < 1:
+        raise ValueError("max_fractions must be ≥ 1")
+
+    ab, organs, limit, penalty, rt1_only = _oar_columns(items, overlap_application)
+    dose_ratio = item_column(items, "dose_ratio", 1.0)
+    if np.any(dose_ratio < 0):
+        raise ValueError("dose_ratio must be ≥ 0")
+    total_dose_a = item_column(items, "total_dose_a")
+    fractions_a = item_column(items, "fractions_a")
+    lql_a = item_column(items, "lql_a", False, bool)
+    lql_b = item_column(items, "lql_b", False, bool)
+    months = item_column(items, "interval_months", np.nan)
+    g_a, repopulation_a = item_time_corrections(items, organs, "_a")
+
+    # --- PRESUPUESTO DE BED DE CADA OAR (columna por OAR) ---
+    bed_a = evaluate_arrays(ab, limit, total_dose_a, fractions_a, lql_a, g_a=g_a,
+                            repopulation_a=repopulation_a)["bed_a"]
+    rec = np.where(np.isnan(months), 0.0, get_model(recovery_model)(months))
+    effective_bed_a = bed_a * (1 - rec)
+    # Solo hay penalización si RT1 y RT2 llegan al OAR (igual que cumulative_bed)
+    p = np.where((total_dose_a > 0) & (dose_ratio > 0), penalty, 0.0)
+    limit_bed = limit * (1 + (2 / ab))
+    budget = np.where(rt1_only, limit_bed - effective_bed_a * (1 + p), limit_bed / (1 + p) - effective_bed_a)
+    # Sin límite o sin dosis en RT2 el OAR no acota la prescripción (se comprueba al verificar)
+    unbounded = np.isnan(limit) | (dose_ratio == 0)
+
+    # --- FRONTERA: dosis máxima por OAR y número de fracciones (OAR × N) ---
+    fractions = np.arange(1, int(max_fractions) + 1, dtype=np.float64)
+    d_oar = dose_per_fraction_for_bed(budget[:, None], fractions[None, :], ab[:, None], lql_b[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):  # dose_ratio = 0 (también 0/0): OAR sin límite
+        d_max = np.where(unbounded[:, None], np.inf, d_oar / dose_ratio[:, None])
+    binding = np.where(np.all(unbounded), -1, np.argmin(d_max, axis=0))
+    d = d_max.min(axis=0)
+    if max_dose_per_fraction is not None:
+        capped = d > max_dose_per_fraction
+        d = np.minimum(d, max_dose_per_fraction)
+        binding = np.where(capped, -1, binding)
+    if np.isinf(d).any():
+        raise ValueError("no OAR limits the RT2 dose: set max_dose_per_fraction")
+    total_dose = d * fractions
+    if dose_step:
+        total_dose = np.floor(total_dose / dose_step + FEASIBILITY_TOLERANCE) * dose_step
+    d = total_dose / fractions
+
+    target_bed, target_eqd2, _ = biology_calculation_batch(total_dose, fractions, target_ab, target_lql)
+
+    # --- VERIFICACIÓN: todas las restricciones para todas las N en una llamada ---
+    check = evaluate_arrays(
+        ab[:, None], limit[:, None], total_dose_a[:, None], fractions_a[:, None], lql_a[:, None],
+        dose_ratio[:, None] * total_dose[None, :], fractions[None, :], lql_b[:, None], months[:, None],
+        penalty[:, None], rt1_only[:, None], recovery_model,
+        g_a=np.asarray(g_a)[..., None], repopulation_a=np.asarray(repopulation_a)[..., None],
+    )
+    ratio = check["ratio"]
+    feasible = (total_dose > 0) & np.all(np.isnan(ratio) | (ratio <= 1 + FEASIBILITY_TOLERANCE), axis=0)
+
+    best = None
+    if feasible.any():
+        best = int(np.argmax(np.where(feasible, target_eqd2, -np.inf)))
+    return {
+        "fractions": fractions.astype(np.int64),
+        "total_dose": total_dose,
+        "dose_per_fraction": d,
+        "target_bed": target_bed,
+        "target_eqd2": target_eqd2,
+        "binding": binding.astype(np.int64),
+        "feasible": feasible,
+        "eqd2_cumulative": check["eqd2_cumulative"],
+        "ratio": ratio,
+        "organ": organs,
+        "best": best,
+    }
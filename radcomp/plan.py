@@ -0,0 +1,205 @@
+"""
+Evaluación de un plan completo (todos los OARs y volúmenes blanco) en una sola pasada.
+Cada estructura tiene su órgano de referencia (α/β y límite de clinical_data), sus dosis
+RT1 / RT2 y, en re-irradiación, su intervalo y solapamiento. El cálculo de BED/EQD2,
+acumulado y veredicto se vectoriza sobre todas las estructuras a la vez.
+
+Cada estructura es un dict con:
+    "organ" | "ab", "total_dose_a", "fractions_a", "lql_a",
+    "total_dose_b", "fractions_b", "lql_b" (opcionales: sin RT2 el acumulado es RT1),
+    "interval_months" (None = sin recuperación), "overlap", "overlap_application"
+y, para las correcciones temporales (radcomp.repair), opcionalmente:
+    "beam_on_time_a|b" (min), "segments_a|b", "gap_a|b" (min), "overall_time_a|b" (días),
+    "repair_half_time" (h; por defecto el del órgano)
+"""
+import numpy as np
+
+from radcomp.engine import clinical_data, overlap_penalty
+from radcomp.recovery import get_model
+from radcomp.repair import DEFAULT_HALF_TIME, apply_repopulation, time_corrections
+from radcomp.vectorized import (
+    biology_calculation_batch,
+    cumulative_bed_batch,
+    tolerance_ratio_batch,
+)
+
+VERDICTS = {-1: None, 0: "within", 1: "borderline", 2: "above"}
+
+
+def item_column(items, key, default=None, dtype=np.float64):
+    """
+    Columna `key` de una lista de dicts como array; `default` sustituye a los valores ausentes.
+    """
+    try:
+        values = [item[key] if item.get(key) is not None else default for item in items]
+    except AttributeError:
+        raise ValueError("every item must be an object") from None
+    if any(v is None for v in values):
+        raise ValueError(f"missing value for '{key}'")
+    return np.array(values, dtype=dtype)
+
+
+def organ_column(items):
+    organs = [item.get("organ") for item in items]
+    for organ in organs:
+        if organ is not None and organ not in clinical_data:
+            raise ValueError(f"unknown organ '{organ}'")
+    return organs
+
+
+def ab_column(items):
+    """
+    α/β de cada estructura: "ab" explícito o el de su órgano. Devuelve (ab, organs).
+    """
+    organs = organ_column(items)
+    values = [
+        item.get("ab") if item.get("ab") is not None else (clinical_data[o]["ab"] if o else None)
+        for item, o in zip(items, organs)
+    ]
+    if any(v is None for v in values):
+        raise ValueError("each item needs 'ab' or 'organ'")
+    return np.array(values, dtype=np.float64), organs
+
+
+def limit_column(organs):
+    """
+    Límite de cada órgano (NaN = sin límite).
+    """
+    return np.array(
+        [clinical_data[o]["limit"] if o and clinical_data[o]["limit"] is not None else np.nan for o in organs],
+        dtype=np.float64,
+    )
+
+
+def overlap_columns(items, overlap_application: str = "cumulative"):
+    """
+    Penalización por solapamiento y rt1_only de cada estructura; overlap_application es el
+    valor por defecto para las que no lo indican. Devuelve (penalty, rt1_only).
+    """
+    overlaps = [item.get("overlap") or "None" for item in items]
+    applications = [item.get("overlap_application") or overlap_application for item in items]
+    for overlap, application in zip(overlaps, applications):
+        if overlap not in overlap_penalty:
+            raise ValueError(f"unknown overlap '{overlap}'")
+        if application not in ("cumulative", "rt1_only"):
+            raise ValueError(f"unknown overlap_application '{application}'")
+    return (
+        np.array([overlap_penalty[o] for o in overlaps], dtype=np.float64),
+        np.array([a == "rt1_only" for a in applications]),
+    )
+
+
+def check_schedule(columns: dict, locate=None):
+    """
+    Rechaza α/β ≤ 0 y números de fracciones < 1 (la división por α/β o por fracciones daría
+    BED y EQD2 sin sentido). `columns` asocia el nombre de cada columna ("ab" o de fracciones)
+    a su array o escalar; locate(mask) describe el primer elemento inválido en el mensaje
+    (por defecto "items[i]").
+    """
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        rule, invalid = ("> 0", ~(values > 0)) if name == "ab" else ("≥ 1", ~(values >= 1))
+        if invalid.any():
+            where = locate(invalid) if locate else f"items[{np.flatnonzero(invalid)[0]}]"
+            raise ValueError(f"{where}: '{name}' must be {rule}")
+
+
+def tissue_columns(organs):
+    """
+    Parámetros temporales de cada órgano: (semiperiodo de reparación, α, Tk, Tpot).
+    Sin órgano → DEFAULT_HALF_TIME; sin repoblación → NaN.
+    """
+    half_time = [clinical_data[o].get("repair_half_time", DEFAULT_HALF_TIME) if o else DEFAULT_HALF_TIME
+                 for o in organs]
+    repopulation = [(clinical_data[o].get("repopulation") if o else None) or {} for o in organs]
+    return (
+        np.array(half_time, dtype=np.float64),
+        *(np.array([r.get(key, np.nan) for r in repopulation], dtype=np.float64) for key in ("alpha", "tk", "tpot")),
+    )
+
+
+def evaluate_arrays(ab, limit, total_dose_a, fractions_a, lql_a=False, total_dose_b=0.0, fractions_b=1.0,
+                    lql_b=False, interval_months=np.nan, penalty=0.0, rt1_only=False,
+                    recovery_model: str = "step", g_a=1.0, g_b=1.0, repopulation_a=0.0, repopulation_b=0.0):
+    """
+    Núcleo columnar de la evaluación (arrays NumPy, un elemento por estructura o curso).
+    interval_months = NaN → sin recuperación; limit = NaN → sin límite.
+    penalty es overlap_penalty[overlap] y rt1_only indica overlap_application == "rt1_only".
+    g_a / g_b son los factores G y repopulation_a / repopulation_b el BED perdido por
+    repoblación de cada curso (radcomp.repair.time_corrections).
+    α/β ≤ 0 o fracciones < 1 → ValueError (check_schedule).
+    """
+    ab = np.asarray(ab, dtype=np.float64)
+    check_schedule({"ab": ab, "fractions_a": fractions_a, "fractions_b": fractions_b})
+    total_dose_a = np.asarray(total_dose_a, dtype=np.float64)
+    total_dose_b = np.asarray(total_dose_b, dtype=np.float64)
+    bed_a, eqd2_a, d_a = biology_calculation_batch(total_dose_a, fractions_a, ab, lql_a, g_a)
+    bed_b, eqd2_b, d_b = biology_calculation_batch(total_dose_b, fractions_b, ab, lql_b, g_b)
+    if np.any(repopulation_a):
+        bed_a, eqd2_a = apply_repopulation(bed_a, ab, repopulation_a)
+    if np.any(repopulation_b):
+        bed_b, eqd2_b = apply_repopulation(bed_b, ab, repopulation_b)
+
+    months = np.asarray(interval_months, dtype=np.float64)
+    rec = np.where(np.isnan(months), 0.0, get_model(recovery_model)(months))
+
+    # Solo existe riesgo por solapamiento si ambas dosis son > 0 (igual que cumulative_bed)
+    effective_bed_a, bed_cumulative = cumulative_bed_batch(
+        bed_a, bed_b, rec, penalty, rt1_only, (total_dose_a > 0) & (total_dose_b > 0)
+    )
+    eqd2_cumulative = bed_cumulative / (1 + (2 / ab))
+    ratio, code = tolerance_ratio_batch(eqd2_cumulative, limit)
+    return {
+        "ab": ab,
+        "limit": np.asarray(limit, dtype=np.float64),
+        "bed_a": bed_a, "eqd2_a": eqd2_a, "dose_per_fraction_a": d_a,
+        "bed_b": bed_b, "eqd2_b": eqd2_b, "dose_per_fraction_b": d_b,
+        "rec": rec,
+        "effective_bed_a": effective_bed_a,
+        "bed_cumulative": bed_cumulative,
+        "eqd2_cumulative": eqd2_cumulative,
+        "ratio": ratio,
+        "code": code,
+    }
+
+
+def item_time_corrections(items, organs, suffix: str = ""):
+    """
+    Factor G y BED perdido por repoblación de cada estructura a partir de las claves
+    beam_on_time{suffix}, segments{suffix}, gap{suffix}, overall_time{suffix} y repair_half_time.
+    """
+    half_time, alpha, tk, tpot = tissue_columns(organs)
+    override = item_column(items, "repair_half_time", np.nan)
+    return time_corrections(
+        item_column(items, f"beam_on_time{suffix}", 0.0), np.where(np.isnan(override), half_time, override),
+        item_column(items, f"segments{suffix}", 1, np.intp), item_column(items, f"gap{suffix}", 0.0),
+        item_column(items, f"overall_time{suffix}", 0.0), alpha, tk, tpot,
+    )
+
+
+def evaluate_plan(items: list, recovery_model: str = "step", overlap_application: str = "cumulative"):
+    """
+    BED/EQD2 de RT1 y RT2, acumulado de re-irradiación y veredicto para todas las
+    estructuras en una sola llamada vectorizada. overlap_application es el valor por
+    defecto para las estructuras que no lo indican.
+
+    Devuelve un dict de columnas (arrays NumPy; "organ" y "verdict" como listas).
+    """
+    ab, organs = ab_column(items)
+    penalty, rt1_only = overlap_columns(items, overlap_application)
+
+    g_a, repopulation_a = item_time_corrections(items, organs, "_a")
+    g_b, repopulation_b = item_time_corrections(items, organs, "_b")
+
+    result = evaluate_arrays(
+        ab, limit_column(organs),
+        item_column(items, "total_dose_a"), item_column(items, "fractions_a"),
+        item_column(items, "lql_a", False, bool),
+        item_column(items, "total_dose_b", 0.0), item_column(items, "fractions_b", 1.0),
+        item_column(items, "lql_b", False, bool),
+        item_column(items, "interval_months", np.nan),
+        penalty, rt1_only, recovery_model, g_a, g_b, repopulation_a, repopulation_b,
+    )
+    result["organ"] = organs
+    result["verdict"] = [VERDICTS[c] for c in result.pop("code").tolist()]
+    return result
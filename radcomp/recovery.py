@@ -0,0 +1,103 @@
+"""
+Modelos de recuperación biológica entre cursos de irradiación.
+Cada modelo recibe el intervalo en meses (escalar o array) y devuelve la fracción
+del BED previo que se considera recuperada, evaluada con NumPy sin ramas en Python.
+
+Modelos incluidos:
+    "step"         escalonado 0 / 25 / 50 / 65 % (recovery_factor, satura a los 24 meses)
+    "linear"       interpolación lineal entre los mismos puntos de apoyo (continuo)
+    "exponential"  65 % · (1 − 2^(−t / 6 meses)), aproximación asintótica continua
+
+Se pueden registrar modelos propios con register_model / piecewise_linear / exponential.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from radcomp.vectorized import recovery_factor_batch
+
+MAX_RECOVERY = 0.65
+
+# Puntos de apoyo (meses, recuperación) de los valores publicados usados por el modelo escalonado
+LINEAR_KNOTS = ((0.0, 0.0), (6.0, 0.25), (12.0, 0.50), (24.0, MAX_RECOVERY))
+
+
+def _result(values):
+    # 0-d → escalar NumPy (float), para poder usar los modelos en el cálculo escalar
+    return values[()]
+
+
+def step(months):
+    """
+    Modelo escalonado original (idéntico a recovery_factor).
+    """
+    return _result(recovery_factor_batch(months))
+
+
+def piecewise_linear(knots=LINEAR_KNOTS):
+    """
+    Modelo por interpolación lineal de (meses, recuperación); constante fuera del rango.
+    """
+    knot_months = np.array([k[0] for k in knots], dtype=np.float64)
+    knot_values = np.array([k[1] for k in knots], dtype=np.float64)
+    if np.any(np.diff(knot_months) <= 0):
+        raise ValueError("knot months must be strictly increasing")
+
+    def model(months):
+        return _result(np.interp(np.asarray(months, dtype=np.float64), knot_months, knot_values))
+    return model
+
+
+def exponential(max_recovery: float = MAX_RECOVERY, half_time: float = 6.0):
+    """
+    Modelo exponencial: max_recovery · (1 − 2^(−t / half_time)); 0 para t ≤ 0.
+    """
+    if half_time <= 0:
+        raise ValueError("half_time must be > 0")
+
+    def model(months):
+        months = np.maximum(np.asarray(months, dtype=np.float64), 0.0)
+        return _result(max_recovery * -np.expm1(-np.log(2) * months / half_time))
+    return model
+
+
+RECOVERY_MODELS = {
+    "step": step,
+    "linear": piecewise_linear(),
+    "exponential": exponential(),
+}
+
+MODEL_LABELS = {
+    "step": "Step (0 / 25 / 50 / 65 %)",
+    "linear": "Piecewise-linear",
+    "exponential": "Exponential (T½ = 6 months)",
+}
+
+
+def register_model(name: str, model, label: str = None):
+    """
+    Registra un modelo propio (callable vectorizado meses → recuperación).
+    """
+    RECOVERY_MODELS[name] = model
+    MODEL_LABELS[name] = label or name
+    recovery_curve.cache_clear()
+
+
+def get_model(name: str):
+    try:
+        return RECOVERY_MODELS[name]
+    except KeyError:
+        raise ValueError(f"unknown recovery model '{name}'") from None
+
+
+@lru_cache(maxsize=16)
+def recovery_curve(name: str, months_max: float = 60.0, points: int = 241):
+    """
+    Curva de recuperación de un modelo en [0, months_max] para el gráfico.
+    Devuelve (months, recovery) de solo lectura.
+    """
+    months = np.linspace(0.0, months_max, points)
+    recovery = np.asarray(get_model(name)(months), dtype=np.float64)
+    for values in (months, recovery):
+        values.setflags(write=False)  # Resultado compartido por la caché
+    return months, recovery
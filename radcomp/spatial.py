@@ -0,0 +1,356 @@
+"""
+Re-irradiación espacial: acumulación de EQD2 voxel a voxel a partir de las matrices de
+dosis de RT1 y RT2 (mismo sistema de referencia) y las máscaras de las estructuras.
+
+En lugar de la penalización categórica por solapamiento (overlap_penalty), el BED de RT1
+se reduce con la recuperación del intervalo en cada vóxel y se suma al de RT2; el
+solapamiento de alta dosis se mide directamente como el porcentaje de vóxeles de la
+estructura en los que ambos cursos superan un umbral de EQD2.
+
+Las máscaras se guardan compactas (StructureMask): bits empaquetados (1 bit por vóxel)
+o índices planos ordenados, según lo que ocupe menos. Las matrices se leen mapeadas en
+memoria y se procesan por bloques en un pool de procesos; cada bloque recibe solo su
+trozo de cada máscara y devuelve estadísticas parciales por estructura.
+
+Uso:
+    python -m radcomp.spatial rt1.npy rt2.npy --fractions-a 35 --fractions-b 10 \\
+        --labels structures.npy --structure 1="Spinal Cord" --structure 2=Parotid_L \\
+        --map Parotid_L="Parotid Glands" --mask PTV=ptv_mask.npy \\
+        --interval-months 18 --voxel-size 2.5 2.5 2.5
+"""
+import argparse
+import csv
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from radcomp.dvh import NEAR_MAX_CC, _limit_metric
+from radcomp.engine import clinical_data, tolerance_verdict
+from radcomp.recovery import get_model
+from radcomp.vectorized import biology_calculation_batch
+from radcomp.voxel import CHUNK_VOXELS, _open_grid
+
+# Umbral de alta dosis por defecto: fracción del límite EQD2 del órgano, en cada curso
+HIGH_DOSE_FRACTION = 0.5
+
+RESULT_FIELDS = [
+    "structure", "organ", "ab", "voxels", "volume_cc", "rec",
+    "eqd2_mean", "eqd2_max", "eqd2_near_max",
+    "metric", "value", "limit", "ratio", "verdict",
+    "high_dose", "overlap_percent",
+]
+
+
+# -------------------------------------------------------------------------
+# Máscaras compactas
+# -------------------------------------------------------------------------
+class StructureMask:
+    """
+    Máscara booleana de una estructura sobre la matriz aplanada (orden C).
+    Guarda bits empaquetados (size / 8 bytes) o índices planos ordenados
+    (4-8 bytes por vóxel), la representación más pequeña.
+    """
+
+    __slots__ = ("shape", "size", "count", "bits", "indices")
+
+    def __init__(self, shape, count: int, bits=None, indices=None):
+        self.shape = tuple(shape)
+        self.size = math.prod(self.shape)
+        self.count = count
+        self.bits = bits
+        self.indices = indices
+
+    @property
+    def kind(self):
+        return "indices" if self.indices is not None else "bits"
+
+    @property
+    def nbytes(self):
+        return (self.indices if self.indices is not None else self.bits).nbytes
+
+    @staticmethod
+    def _index_dtype(size):
+        return np.int32 if size <= np.iinfo(np.int32).max else np.int64
+
+    @classmethod
+    def from_array(cls, mask, chunk_voxels: int = CHUNK_VOXELS):
+        """
+        Empaqueta una máscara (array o .npy mapeado, cualquier tipo: ≠ 0 = dentro) por bloques.
+        """
+        return cls.from_labels(mask, {None: None}, chunk_voxels)[None]
+
+    @classmethod
+    def from_labels(cls, labels, names: dict, chunk_voxels: int = CHUNK_VOXELS):
+        """
+        Máscaras de varias estructuras a partir de una matriz de etiquetas enteras en una
+        sola pasada por bloques. names: dict nombre -> etiqueta (None = cualquier valor ≠ 0).
+        """
+        chunk_voxels -= chunk_voxels % 8  # Bloques alineados a byte: los bits se concatenan
+        flat = labels.reshape(-1)
+        dtype = cls._index_dtype(flat.size)
+        bits = {name: [] for name in names}
+        indices = {name: [] for name in names}
+        counts = dict.fromkeys(names, 0)
+        for start in range(0, flat.size, chunk_voxels):
+            chunk = np.asarray(flat[start:start + chunk_voxels])
+            for name, label in names.items():
+                inside = chunk != 0 if label is None else chunk == label
+                bits[name].append(np.packbits(inside))
+                counts[name] += int(np.count_nonzero(inside))
+                if indices[name] is not None:
+                    # Se deja de guardar índices en cuanto ocupan más que los bits
+                    if counts[name] * np.dtype(dtype).itemsize > (flat.size + 7) // 8:
+                        indices[name] = None
+                    else:
+                        indices[name].append((np.flatnonzero(inside) + start).astype(dtype))
+        masks = {}
+        for name in names:
+            if indices[name] is not None:
+                values = np.concatenate(indices[name] or [np.empty(0, dtype)])
+                masks[name] = cls(labels.shape, counts[name], indices=values)
+            else:
+                masks[name] = cls(labels.shape, counts[name], bits=np.concatenate(bits[name]))
+        return masks
+
+    def part(self, start: int, stop: int):
+        """
+        Trozo compacto de la máscara para el rango plano [start, stop) (start múltiplo de 8).
+        """
+        if self.indices is not None:
+            lo, hi = np.searchsorted(self.indices, (start, stop))
+            return "indices", self.indices[lo:hi] - start
+        return "bits", self.bits[start // 8:(stop + 7) // 8]
+
+    @staticmethod
+    def decode(part, length: int):
+        """
+        Índices locales (dentro del bloque) de los vóxeles de la estructura.
+        """
+        kind, values = part
+        if kind == "indices":
+            return values.astype(np.intp)
+        return np.flatnonzero(np.unpackbits(values, count=length))
+
+
+# -------------------------------------------------------------------------
+# Acumulación por bloques
+# -------------------------------------------------------------------------
+def _accumulate_chunk(job):
+    """
+    Estadísticas parciales de EQD2 acumulado de un bloque para cada estructura.
+    Se ejecuta en los procesos del pool: cada uno reabre las matrices mapeadas.
+    """
+    start, stop = job["start"], job["stop"]
+    dose_a = _open_grid(job["dose_a"], job["shape"], job["dtype"]).reshape(-1)[start:stop]
+    dose_b = _open_grid(job["dose_b"], job["shape"], job["dtype"]).reshape(-1)[start:stop]
+
+    stats = []
+    for s in job["structures"]:
+        idx = StructureMask.decode(s["part"], stop - start)
+        if not idx.size:
+            stats.append(None)
+            continue
+        ab = s["ab"]
+        bed_a, eqd2_a, _ = biology_calculation_batch(dose_a[idx], job["fractions_a"], ab, job["lql_a"])
+        bed_b, eqd2_b, _ = biology_calculation_batch(dose_b[idx], job["fractions_b"], ab, job["lql_b"])
+        eqd2 = (bed_a * (1 - job["rec"]) + bed_b) / (1 + (2 / ab))
+
+        k = s["near_max_voxels"]
+        top = eqd2 if eqd2.size <= k else np.partition(eqd2, eqd2.size - k)[-k:]
+        stats.append({
+            "count": idx.size,
+            "sum": float(eqd2.sum()),
+            "max": float(eqd2.max()),
+            "top": top,
+            "above": int((eqd2 >= s["vx"]).sum()) if s["vx"] is not None else 0,
+            "overlap": int(((eqd2_a >= s["high_dose"]) & (eqd2_b >= s["high_dose"])).sum())
+            if s["high_dose"] is not None else 0,
+        })
+    return stats
+
+
+def accumulate_reirradiation(dose_a, dose_b, fractions_a: int, fractions_b: int, masks: dict,
+                             organ_map: dict = None, ab: dict = None, lql_a: bool = False, lql_b: bool = False,
+                             interval_months=None, recovery_model: str = "step", voxel_volume: float = None,
+                             high_dose: float = None, shape=None, dtype="float32", workers=None,
+                             chunk_voxels: int = CHUNK_VOXELS):
+    """
+    EQD2 acumulado voxel a voxel: EQD2 = (BED_RT1 · (1 − rec) + BED_RT2) / (1 + 2/(α/β)).
+
+    dose_a / dose_b: matrices de dosis física total (Gy) de RT1 y RT2 (.npy o crudas con shape).
+    masks: dict estructura -> StructureMask; organ_map y ab como en evaluate_dvh_constraints.
+    interval_months: None = sin recuperación. voxel_volume (cc) permite D0.03cc y volúmenes.
+    high_dose: umbral de EQD2 (Gy, por curso) para medir el solapamiento; por defecto
+    HIGH_DOSE_FRACTION × límite del órgano (sin límite → sin medida).
+
+    Devuelve una lista de dicts (una fila por estructura) con los campos de RESULT_FIELDS.
+    """
+    organ_map = organ_map or {}
+    ab = ab or {}
+    grid_a = _open_grid(dose_a, shape, dtype)
+    grid_b = _open_grid(dose_b, shape, dtype)
+    if grid_a.shape != grid_b.shape:
+        raise ValueError(f"dose grids do not share a frame: {grid_a.shape} vs {grid_b.shape}")
+    for name, mask in masks.items():
+        if mask.shape != grid_a.shape:
+            raise ValueError(f"mask '{name}' does not match the dose grid shape {grid_a.shape}")
+
+    rec = 0.0 if interval_months is None else float(get_model(recovery_model)(interval_months))
+    near_max_voxels = max(1, math.ceil(NEAR_MAX_CC / voxel_volume - 1e-9)) if voxel_volume else 1
+
+    structures = []
+    for name in masks:
+        organ = organ_map.get(name, name)
+        if organ not in clinical_data:
+            raise ValueError(f"structure '{name}' has no clinical_data entry (use organ_map)")
+        entry = clinical_data[organ]
+        metric = _limit_metric(entry["limit_type"])
+        if metric and metric.startswith("V") and entry.get("volume_unit") == "cc" and not voxel_volume:
+            raise ValueError(f"structure '{name}': the {metric} limit is in cc and needs the voxel size")
+        threshold = high_dose
+        if threshold is None and entry["limit"] is not None:
+            threshold = HIGH_DOSE_FRACTION * entry["limit"]
+        structures.append({
+            "name": name, "organ": organ, "entry": entry, "metric": metric,
+            "ab": float(ab.get(name, entry["ab"])),
+            "vx": float(metric[1:]) if metric and metric.startswith("V") else None,
+            "high_dose": threshold,
+            "near_max_voxels": near_max_voxels,
+        })
+
+    chunk_voxels -= chunk_voxels % 8  # Alineado a byte para los trozos de bits
+    base = {
+        "dose_a": dose_a, "dose_b": dose_b, "shape": grid_a.shape, "dtype": grid_a.dtype,
+        "fractions_a": fractions_a, "fractions_b": fractions_b, "lql_a": lql_a, "lql_b": lql_b, "rec": rec,
+    }
+    fields = ("ab", "vx", "high_dose", "near_max_voxels")
+    jobs = [
+        {
+            **base, "start": start, "stop": min(start + chunk_voxels, grid_a.size),
+            "structures": [
+                {"part": masks[s["name"]].part(start, min(start + chunk_voxels, grid_a.size)),
+                 **{key: s[key] for key in fields}}
+                for s in structures
+            ],
+        }
+        for start in range(0, grid_a.size, chunk_voxels)
+    ]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        partials = list(map(_accumulate_chunk, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(_accumulate_chunk, jobs))
+
+    results = []
+    for i, s in enumerate(structures):
+        parts = [p[i] for p in partials if p[i] is not None]
+        count = sum(p["count"] for p in parts)
+        entry, metric, limit = s["entry"], s["metric"], s["entry"]["limit"]
+        row = {
+            "structure": s["name"], "organ": s["organ"], "ab": s["ab"], "voxels": count,
+            "volume_cc": count * voxel_volume if voxel_volume else None, "rec": rec,
+            "eqd2_mean": None, "eqd2_max": None, "eqd2_near_max": None,
+            "metric": metric, "value": None, "limit": limit if metric else None,
+            "ratio": None, "verdict": None,
+            "high_dose": s["high_dose"], "overlap_percent": None,
+        }
+        if count:
+            top = np.concatenate([p["top"] for p in parts])
+            k = min(near_max_voxels, top.size)
+            row["eqd2_mean"] = sum(p["sum"] for p in parts) / count
+            row["eqd2_max"] = max(p["max"] for p in parts)
+            row["eqd2_near_max"] = float(np.partition(top, top.size - k)[top.size - k])
+            if s["high_dose"] is not None:
+                row["overlap_percent"] = 100.0 * sum(p["overlap"] for p in parts) / count
+
+            if metric == "Dmean":
+                row["value"] = row["eqd2_mean"]
+            elif metric and metric.startswith("D"):
+                row["value"] = row["eqd2_near_max"]
+            elif metric:
+                above = sum(p["above"] for p in parts)
+                row["value"] = above * voxel_volume if entry.get("volume_unit") == "cc" else 100.0 * above / count
+                row["limit"] = limit = entry.get("volume_limit")
+            if metric:
+                row["ratio"], row["verdict"] = tolerance_verdict(row["value"], limit)
+        results.append(row)
+    return results
+
+
+def _pair(text):
+    key, sep, value = text.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{text}'")
+    return key.strip(), value.strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="radcomp.spatial",
+        description="Voxel-wise cumulative EQD2 of two dose grids (RT1 + RT2) with per-structure metrics.",
+    )
+    parser.add_argument("dose_a", help="RT1 physical dose grid in Gy (.npy, or raw with --shape)")
+    parser.add_argument("dose_b", help="RT2 physical dose grid in Gy, same frame as RT1")
+    parser.add_argument("--fractions-a", type=int, required=True, help="Number of fractions of RT1")
+    parser.add_argument("--fractions-b", type=int, required=True, help="Number of fractions of RT2")
+    parser.add_argument("--lql-a", action="store_true", help="Apply the LQL correction to RT1")
+    parser.add_argument("--lql-b", action="store_true", help="Apply the LQL correction to RT2")
+    parser.add_argument("--shape", type=int, nargs="+", help="Grid shape for raw input")
+    parser.add_argument("--dtype", default="float32", help="Raw input dtype (default float32)")
+    parser.add_argument("--labels", help="Integer structure label grid (.npy)")
+    parser.add_argument("--structure", type=_pair, action="append", default=[],
+                        help="LABEL=NAME structure of the label grid (repeatable)")
+    parser.add_argument("--mask", type=_pair, action="append", default=[],
+                        help="NAME=MASK.npy binary structure mask (repeatable)")
+    parser.add_argument("--map", type=_pair, action="append", default=[],
+                        help="STRUCTURE=ORGAN mapping to clinical_data (repeatable)")
+    parser.add_argument("--ab", type=_pair, action="append", default=[],
+                        help="STRUCTURE=AB alpha/beta override (repeatable)")
+    parser.add_argument("--interval-months", type=float, help="Time between RT1 and RT2 (default: no recovery)")
+    parser.add_argument("--recovery-model", default="step", help="Recovery model (default: step)")
+    parser.add_argument("--voxel-size", type=float, nargs=3, metavar=("DX", "DY", "DZ"),
+                        help="Voxel size in mm (enables volumes and D0.03cc)")
+    parser.add_argument("--high-dose", type=float,
+                        help=f"EQD2 overlap threshold in Gy (default: {HIGH_DOSE_FRACTION:g} x organ limit)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-voxels", type=int, default=CHUNK_VOXELS, help="Voxels per chunk")
+    args = parser.parse_args(argv)
+
+    try:
+        masks = {}
+        if args.structure:
+            if not args.labels:
+                raise ValueError("--structure requires --labels")
+            labels = np.load(args.labels, mmap_mode="r")
+            masks.update(StructureMask.from_labels(
+                labels, {name: int(label) for label, name in args.structure}, args.chunk_voxels
+            ))
+        for name, path in args.mask:
+            masks[name] = StructureMask.from_array(np.load(path, mmap_mode="r"), args.chunk_voxels)
+        if not masks:
+            raise ValueError("no structures given (use --structure with --labels, or --mask)")
+        results = accumulate_reirradiation(
+            args.dose_a, args.dose_b, args.fractions_a, args.fractions_b, masks,
+            organ_map=dict(args.map), ab={k: float(v) for k, v in args.ab},
+            lql_a=args.lql_a, lql_b=args.lql_b, interval_months=args.interval_months,
+            recovery_model=args.recovery_model,
+            voxel_volume=math.prod(args.voxel_size) / 1000 if args.voxel_size else None,
+            high_dose=args.high_dose, shape=args.shape, dtype=args.dtype,
+            workers=args.workers, chunk_voxels=args.chunk_voxels,
+        )
+    except (ValueError, KeyError, OSError) as exc:
+        parser.exit(2, f"radcomp.spatial: error: {exc}\n")
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=RESULT_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
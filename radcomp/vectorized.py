@@ -0,0 +1,67 @@
+"""
+Versiones vectorizadas (NumPy) de los cálculos escalares de radcomp.engine: BED/EQD2,
+recuperación, acumulado de re-irradiación y veredicto de tolerancia. Aceptan arrays o
+escalares broadcastables y dan, elemento a elemento, los mismos resultados que las
+funciones escalares; así radcomp.engine puede seguir sin depender de NumPy.
+"""
+import numpy as np
+
+from radcomp.models import bed_batch
+
+
+# -------------------------------------------------------------------------
+# Batch (vectorized) calculations
+# -------------------------------------------------------------------------
+def biology_calculation_batch(total_dose, fractions, ab, use_lql=False, g=1.0, model=None, params=None):
+    """
+    Versión vectorizada de biology_calculation.
+    Acepta arrays (o escalares broadcastables) de dosis total, fracciones, α/β, LQL y
+    factor G de reparación incompleta (1.0 = fracción instantánea).
+    Devuelve arrays (BED, EQD2, dosis por fracción) idénticos a la versión escalar,
+    incluida la validación fractions <= 0 or ab <= 0 (resultado 0.0).
+    El cálculo despacha por el registro de modelos (radcomp.models): use_lql es el código
+    LQ / LQL de cada elemento y `model` (nombre, código o array) lo sustituye, con sus `params`.
+    """
+    return bed_batch(total_dose, fractions, ab, use_lql if model is None else model, g, params)
+
+
+def recovery_factor_batch(months):
+    """
+    Versión vectorizada de recovery_factor (modelo escalonado 0 / 25 / 50 / 65 %).
+    """
+    months = np.asarray(months, dtype=np.float64)
+    return np.select([months < 6, months < 12, months < 24], [0.0, 0.25, 0.50], 0.65)
+
+
+def cumulative_bed_batch(bed_a, bed_b, rec=0.0, penalty=0.0, rt1_only=False, has_overlap_risk=True):
+    """
+    Versión vectorizada de cumulative_bed.
+    penalty es la fracción de penalización (overlap_penalty[overlap], 0.0 = sin solapamiento)
+    y rt1_only indica overlap_application == "rt1_only".
+    Devuelve (effective_bed_a, bed_cumulative), idénticos a la versión escalar.
+    """
+    bed_a = np.asarray(bed_a, dtype=np.float64)
+    bed_b = np.asarray(bed_b, dtype=np.float64)
+    effective_bed_a = bed_a * (1 - np.asarray(rec, dtype=np.float64))
+
+    # Sin riesgo de solapamiento (alguna dosis = 0) no se penaliza; x * 1.0 == x es exacto,
+    # así que el caso sin penalización no necesita una rama aparte
+    penalty_factor = 1 + np.where(has_overlap_risk, penalty, 0.0)
+    bed_cumulative = np.where(
+        rt1_only,
+        (effective_bed_a * penalty_factor) + bed_b,  # Modelo estándar: solo el remanente de RT1
+        (effective_bed_a + bed_b) * penalty_factor,  # Modelo conservador: la suma total
+    )
+    return effective_bed_a, bed_cumulative
+
+
+def tolerance_ratio_batch(eqd2, limit):
+    """
+    Versión vectorizada de tolerance_verdict.
+    limit = NaN significa "sin límite". Devuelve (ratio, code) con code
+    0 = within (< 0.9), 1 = borderline (< 1.0), 2 = above, -1 = sin límite.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.asarray(eqd2, dtype=np.float64) / np.asarray(limit, dtype=np.float64)
+    code = np.select([np.isnan(ratio), ratio < 0.9, ratio < 1.0], [-1, 0, 1], 2)
+    return ratio, code
@@ -0,0 +1,181 @@
+"""
+Conversión voxel a voxel de matrices de dosis física 3D a BED y EQD2.
+La matriz se lee mapeada en memoria (.npy o float32 crudo) y se procesa por bloques
+en un pool de procesos, con las mismas reglas LQ/LQL que biology_calculation.
+
+Uso:
+    python -m radcomp.voxel dose.npy --fractions 5 --ab 3 --bed bed.npy --eqd2 eqd2.npy
+    python -m radcomp.voxel dose.raw --shape 300 512 512 --fractions 5 \\
+        --labels structures.npy --structure-ab 1="Spinal Cord" --structure-ab 2=10 \\
+        --eqd2 eqd2.npy
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from radcomp.engine import clinical_data
+from radcomp.vectorized import biology_calculation_batch
+
+# Vóxeles por bloque (2M vóxeles ≈ 16 MB por array float64 temporal)
+CHUNK_VOXELS = 1 << 21
+
+
+def _open_grid(path, shape=None, dtype="float32"):
+    """
+    Abre una matriz en modo solo lectura sin cargarla en RAM.
+    Los .npy llevan su propia forma y tipo; los archivos crudos necesitan shape.
+    """
+    if str(path).endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if shape is None:
+        raise ValueError(f"shape is required for raw grid '{path}'")
+    return np.memmap(path, dtype=dtype, mode="r", shape=tuple(shape))
+
+
+def _ab_lookup(structure_ab: dict):
+    """
+    Tabla de consulta etiqueta -> α/β. Los valores pueden ser números o nombres
+    de órgano de clinical_data. Las etiquetas sin valor quedan en NaN.
+    """
+    if min(structure_ab) < 0:
+        raise ValueError(f"label {min(structure_ab)}: structure labels must be ≥ 0")
+    lut = np.full(max(structure_ab) + 1, np.nan)
+    for label, value in structure_ab.items():
+        lut[label] = clinical_data[value]["ab"] if isinstance(value, str) else float(value)
+    return lut
+
+
+def _convert_chunk(job):
+    """
+    Convierte el rango plano [start, stop) y escribe el resultado en los .npy de salida.
+    Se ejecuta en los procesos del pool: cada uno reabre los archivos mapeados.
+    """
+    start, stop = job["start"], job["stop"]
+    dose = _open_grid(job["dose"], job["shape"], job["dtype"]).reshape(-1)[start:stop]
+
+    if job["ab_map"] is not None:
+        ab = np.load(job["ab_map"], mmap_mode="r").reshape(-1)[start:stop]
+    elif job["labels"] is not None:
+        labels = np.load(job["labels"], mmap_mode="r").reshape(-1)[start:stop]
+        lut = job["lut"]
+        # Una etiqueta negativa indexaría la tabla desde el final (α/β de otra estructura)
+        if labels.min(initial=0) < 0:
+            raise ValueError(f"label {int(labels.min())} is negative")
+        if labels.max(initial=0) >= lut.size:
+            raise ValueError(f"label {int(labels.max())} has no alpha/beta value")
+        ab = lut[labels]
+        if np.isnan(ab).any():
+            missing = np.unique(labels[np.isnan(ab)])
+            raise ValueError(f"labels {missing.tolist()} have no alpha/beta value")
+    else:
+        ab = job["ab"]
+
+    bed, eqd2, _ = biology_calculation_batch(dose, job["fractions"], ab, job["use_lql"])
+
+    for key, values in (("bed", bed), ("eqd2", eqd2)):
+        if job[key] is not None:
+            out = np.load(job[key], mmap_mode="r+")
+            out.reshape(-1)[start:stop] = values
+            out.flush()
+    return stop - start
+
+
+def convert_dose_grid(dose, fractions, ab=None, bed=None, eqd2=None, use_lql=False,
+                      ab_map=None, labels=None, structure_ab=None, shape=None,
+                      dtype="float32", workers=None, chunk_voxels=CHUNK_VOXELS):
+    """
+    Convierte una matriz de dosis física total (Gy) a BED y/o EQD2 voxel a voxel.
+
+    El α/β se define con uno de:
+      - ab: valor único para toda la matriz.
+      - ab_map: .npy con un α/β por vóxel (misma forma que la dosis).
+      - labels + structure_ab: .npy de etiquetas enteras y dict etiqueta -> α/β
+        (número o nombre de órgano de clinical_data).
+
+    bed / eqd2 son rutas .npy de salida (float32); se escriben por bloques.
+    Devuelve el número de vóxeles procesados.
+    """
+    if bed is None and eqd2 is None:
+        raise ValueError("at least one output (bed or eqd2) is required")
+    if sum(x is not None for x in (ab, ab_map, labels)) != 1:
+        raise ValueError("exactly one of ab, ab_map or labels must be given")
+    if labels is not None and not structure_ab:
+        raise ValueError("structure_ab is required with labels")
+
+    grid = _open_grid(dose, shape, dtype)
+    for path in (ab_map, labels):
+        if path is not None and np.load(path, mmap_mode="r").shape != grid.shape:
+            raise ValueError(f"'{path}' does not match the dose grid shape {grid.shape}")
+    if labels is not None and not np.issubdtype(np.load(labels, mmap_mode="r").dtype, np.integer):
+        raise ValueError(f"'{labels}' must contain integer labels")
+
+    # Salidas creadas vacías en disco; los procesos escriben cada bloque en su sitio
+    for path in (bed, eqd2):
+        if path is not None:
+            np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=grid.shape)
+
+    base = {
+        "dose": dose, "shape": grid.shape, "dtype": grid.dtype,
+        "fractions": fractions, "use_lql": use_lql,
+        "ab": ab, "ab_map": ab_map, "labels": labels,
+        "lut": _ab_lookup(structure_ab) if labels is not None else None,
+        "bed": bed, "eqd2": eqd2,
+    }
+    jobs = [
+        {**base, "start": start, "stop": min(start + chunk_voxels, grid.size)}
+        for start in range(0, grid.size, chunk_voxels)
+    ]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        return sum(map(_convert_chunk, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_convert_chunk, jobs))
+
+
+def _structure_ab(text):
+    label, _, value = text.partition("=")
+    try:
+        return int(label), (float(value) if value not in clinical_data else value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected LABEL=AB or LABEL=ORGAN, got '{text}'")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="radcomp.voxel",
+        description="Voxel-wise BED/EQD2 conversion of a physical dose grid (.npy or raw).",
+    )
+    parser.add_argument("dose", help="Physical dose grid in Gy (.npy, or raw with --shape)")
+    parser.add_argument("--fractions", type=int, required=True, help="Number of fractions")
+    parser.add_argument("--shape", type=int, nargs="+", help="Grid shape for raw input")
+    parser.add_argument("--dtype", default="float32", help="Raw input dtype (default float32)")
+    parser.add_argument("--ab", type=float, help="Single alpha/beta for the whole grid")
+    parser.add_argument("--ab-map", help="Per-voxel alpha/beta map (.npy)")
+    parser.add_argument("--labels", help="Integer structure label grid (.npy)")
+    parser.add_argument("--structure-ab", type=_structure_ab, action="append", default=[],
+                        help="LABEL=AB or LABEL=ORGAN (repeatable, used with --labels)")
+    parser.add_argument("--lql", action="store_true", help="Apply the LQL correction (Astrahan 2008)")
+    parser.add_argument("--bed", help="Output BED grid (.npy)")
+    parser.add_argument("--eqd2", help="Output EQD2 grid (.npy)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-voxels", type=int, default=CHUNK_VOXELS, help="Voxels per chunk")
+    args = parser.parse_args(argv)
+
+    try:
+        n = convert_dose_grid(
+            args.dose, args.fractions, ab=args.ab, bed=args.bed, eqd2=args.eqd2,
+            use_lql=args.lql, ab_map=args.ab_map, labels=args.labels,
+            structure_ab=dict(args.structure_ab), shape=args.shape, dtype=args.dtype,
+            workers=args.workers, chunk_voxels=args.chunk_voxels,
+        )
+    except (ValueError, OSError) as exc:
+        parser.exit(2, f"radcomp.voxel: error: {exc}\n")
+    print(f"{n} voxels converted")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+"""
+Comprobaciones de los núcleos numéricos frente a la versión escalar y de las entradas
+inválidas (α/β ≤ 0, fracciones < 1, etiquetas negativas).
+
+Uso:
+    python -m pytest -q
+"""
+import asyncio
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from radcomp import api
+from radcomp.cohort import evaluate_chunk
+from radcomp.delivery import aggregate_frame
+from radcomp.engine import biology_calculation
+from radcomp.models import bed_batch, usc_alpha_beta
+from radcomp.ntcp import geud, lkb_ntcp, logistic_tcp
+from radcomp.plan import evaluate_plan
+from radcomp.repair import g_factor, g_factor_exact
+from radcomp.vectorized import biology_calculation_batch
+from radcomp.voxel import convert_dose_grid
+
+DOSES = (0.0, 2.0, 20.0, 45.0, 60.0)
+FRACTIONS = (0, 1, 3, 5, 25)
+AB = (-3.0, 0.0, 1.5, 3.0, 10.0)
+
+
+def _grid():
+    return np.array(list(itertools.product(DOSES, FRACTIONS, AB, (False, True), (1.0, 0.8))), dtype=object)
+
+
+# -------------------------------------------------------------------------
+# BED/EQD2 por lotes y registro de modelos
+# -------------------------------------------------------------------------
+def test_batch_matches_scalar():
+    grid = _grid()
+    bed, eqd2, d = biology_calculation_batch(
+        grid[:, 0].astype(float), grid[:, 1].astype(float), grid[:, 2].astype(float),
+        grid[:, 3].astype(bool), grid[:, 4].astype(float),
+    )
+    expected = np.array([biology_calculation(*row) for row in grid.tolist()])
+    np.testing.assert_array_equal(np.column_stack([bed, eqd2, d]), expected)
+
+
+def test_model_names_match_use_lql():
+    dose, fractions, ab = np.array([30.0, 54.0, 60.0]), np.array([10.0, 3.0, 8.0]), np.array([3.0, 10.0, 2.0])
+    for name, use_lql in (("lq", False), ("lql", True), ("lq_l", True)):
+        np.testing.assert_array_equal(
+            bed_batch(dose, fractions, ab, name)[0], biology_calculation_batch(dose, fractions, ab, use_lql)[0]
+        )
+
+
+def test_usc_is_continuous_at_transition_dose():
+    alpha, d0, dq = 0.3, 1.4, 2.0
+    transition = 2 * dq / (1 - alpha * d0)
+    d = transition + np.array([-1e-9, 1e-9])
+    bed, eqd2, _ = bed_batch(d, 1.0, 3.0, "usc", params={"alpha": alpha, "d0": d0, "dq": dq})
+    assert bed[0] == pytest.approx(bed[1], rel=1e-8)
+    # El EQD2 usa el α/β de la propia curva, no el del órgano
+    assert eqd2[0] == pytest.approx(bed[0] / (1 + 2 / usc_alpha_beta(alpha, d0, dq)))
+
+
+# -------------------------------------------------------------------------
+# Reparación incompleta, gEUD y NTCP/TCP
+# -------------------------------------------------------------------------
+def test_g_factor():
+    assert g_factor(0.0, 1.5) == pytest.approx(1.0)
+    g = g_factor_exact(np.array([1.0, 10.0, 60.0]), 1.5)
+    assert np.all(np.diff(g) < 0) and np.all((g > 0) & (g < 1))
+    t = np.linspace(0.0, 120.0, 25)
+    np.testing.assert_allclose(g_factor(t, 0.5, 6, 1.0), g_factor_exact(t, 0.5, 6, 1.0), atol=1e-4)
+
+
+def test_geud_and_outcome_models():
+    eqd2 = np.array([[20.0, 20.0, 20.0], [10.0, 30.0, 50.0]])
+    dv = np.array([[1.0, 2.0, 3.0], [1.0, 1.0, 2.0]])
+    np.testing.assert_allclose(geud(eqd2, dv, 5.0)[0], 20.0)  # Dosis uniforme → gEUD = dosis
+    assert geud(eqd2, dv, 1.0)[1] == pytest.approx(35.0)  # a = 1 → dosis media
+    assert lkb_ntcp(46.0, 46.0, 0.18) == pytest.approx(0.5, abs=1e-6)
+    assert logistic_tcp(60.0, 60.0, 2.0) == pytest.approx(0.5)
+
+
+def test_delivery_uniform_course_matches_scalar():
+    result = aggregate_frame(pd.DataFrame({"patient": "p1", "dose": [3.0] * 10, "ab": 3.0}))
+    bed, eqd2, _ = biology_calculation(30.0, 10, 3.0)
+    assert result["bed"].iloc[0] == pytest.approx(bed)
+    assert result["uniform_eqd2"].iloc[0] == pytest.approx(eqd2)
+
+
+# -------------------------------------------------------------------------
+# Entradas inválidas
+# -------------------------------------------------------------------------
+HEART = {"organ": "Heart", "total_dose_a": 80.0, "fractions_a": 40, "total_dose_b": 20.0, "fractions_b": 10}
+INVALID = [({"ab": 0.0}, "'ab' must be > 0"), ({"ab": -3.0}, "'ab' must be > 0"),
+           ({"fractions_a": 0}, "'fractions_a' must be ≥ 1"), ({"fractions_b": 0}, "'fractions_b' must be ≥ 1")]
+
+
+@pytest.mark.parametrize("override, message", INVALID)
+def test_plan_rejects_invalid_schedule(override, message):
+    with pytest.raises(ValueError, match=f"items\\[1\\]: {message}"):
+        evaluate_plan([HEART, {**HEART, **override}])
+
+
+@pytest.mark.parametrize("override, message", INVALID)
+def test_cohort_rejects_invalid_schedule(override, message):
+    with pytest.raises(ValueError, match=f"row 2: {message}"):
+        evaluate_chunk(pd.DataFrame([HEART, {**HEART, **override}]))
+
+
+def _post(path, items):
+    return asyncio.run(api.dispatch("POST", path, json.dumps({"items": items}).encode()))
+
+
+@pytest.mark.parametrize("item", [
+    {"total_dose": 80.0, "fractions": 40, "ab": 0.0},
+    {"total_dose": 80.0, "fractions": 0, "organ": "Heart"},
+])
+def test_api_bed_rejects_invalid_schedule(item):
+    assert _post("/bed", [item])[0] == 400
+
+
+def test_api_reirradiation_rejects_invalid_schedule():
+    assert _post("/reirradiation", [{**HEART, "ab": -3.0}])[0] == 400
+
+
+def test_api_returns_null_for_non_finite_values():
+    with np.errstate(over="ignore"):
+        status, payload = _post("/bed", [{"total_dose": 1e308, "fractions": 1, "ab": 1e-300}])
+    assert status == 200 and payload["bed"] == [None]
+    json.dumps(payload, allow_nan=False)
+
+
+@pytest.mark.parametrize("ab", [0.0, -3.0])
+def test_delivery_rejects_invalid_ab(ab):
+    with pytest.raises(ValueError, match="row 1: 'ab' must be > 0"):
+        aggregate_frame(pd.DataFrame({"patient": "p1", "dose": [2.0, 2.0, 2.0], "ab": ab}))
+
+
+@pytest.mark.parametrize("labels, message", [
+    (np.array([[-1, 1], [1, 2]]), "label -1 is negative"),
+    (np.array([[1.0, 1.0], [1.0, 2.0]]), "must contain integer labels"),
+])
+def test_voxel_rejects_invalid_labels(tmp_path, labels, message):
+    np.save(tmp_path / "dose.npy", np.full((2, 2), 10.0, dtype=np.float32))
+    np.save(tmp_path / "labels.npy", labels)
+    with pytest.raises(ValueError, match=message):
+        convert_dose_grid(tmp_path / "dose.npy", 5, eqd2=str(tmp_path / "eqd2.npy"),
+                          labels=str(tmp_path / "labels.npy"), structure_ab={1: 3.0, 2: 10.0}, workers=1)